@@ -0,0 +1,59 @@
+import asyncio
+import contextvars
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+from django.http import HttpRequest, HttpResponse
+from rest_framework.permissions import SAFE_METHODS
+
+db_executor = ThreadPoolExecutor(
+    max_workers=settings.ASYNC_DB_THREADS,
+    thread_name_prefix='async-db',
+)
+
+
+def _call_view(
+    view: Callable, request: HttpRequest, *args: any, **kwargs: any,
+) -> HttpResponse:
+    """Выполняет синхронное представление в потоке пула и освобождает
+    соединение с базой данных этого потока по правилам CONN_MAX_AGE.
+    """
+    try:
+        response = view(request, *args, **kwargs)
+        if hasattr(response, 'render') and callable(response.render):
+            response.render()
+        return response
+    finally:
+        close_old_connections()
+
+
+def async_read_view(view: Callable) -> Callable:
+    """Оборачивает DRF-представление в асинхронное представление Django.
+    Безопасные запросы (GET, HEAD, OPTIONS) выполняются в ограниченном
+    пуле потоков db_executor, размер которого равен бюджету соединений
+    с базой данных на воркер, поэтому медленные клиенты и ожидание базы
+    данных не блокируют цикл событий. Остальные запросы выполняются
+    так же, как в синхронном режиме.
+    """
+    sync_view = sync_to_async(view)
+
+    @functools.wraps(view)
+    async def wrapper(
+        request: HttpRequest, *args: any, **kwargs: any,
+    ) -> HttpResponse:
+        if request.method in SAFE_METHODS:
+            loop = asyncio.get_running_loop()
+            context = contextvars.copy_context()
+            return await loop.run_in_executor(
+                db_executor,
+                functools.partial(
+                    context.run, _call_view, view, request, *args, **kwargs,
+                ),
+            )
+        return await sync_view(request, *args, **kwargs)
+
+    return wrapper
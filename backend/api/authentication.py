@@ -0,0 +1,172 @@
+import copy
+import threading
+import time
+from collections import Counter, OrderedDict
+from typing import Dict, Iterable, Optional, Set, Tuple
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.translation import gettext_lazy as _
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+from rest_framework.exceptions import AuthenticationFailed
+
+from core import invalidation, metrics
+
+SHARED_KEY = 'auth-token:{}'
+TOKEN_TOPIC = 'auth-token'
+USER_TOPIC = 'auth-user'
+
+
+class TokenCache:
+    """Ограниченный LRU-кэш токен -> (пользователь, токен) с TTL.
+    Живет в памяти воркера и, если включено, дублируется в общем кэше
+    Django, чтобы промах в одном воркере не приводил к запросу в базу.
+    """
+
+    def __init__(self, max_size: int, ttl: float, shared: bool) -> None:
+        self.max_size = max_size
+        self.ttl = ttl
+        self.shared = shared
+        self._entries: OrderedDict = OrderedDict()
+        self._user_keys: Dict[int, Set[str]] = {}
+        self._lock = threading.Lock()
+        self.stats = Counter()
+
+    def get(self, key: str) -> Optional[Tuple]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires, value = entry
+                if expires > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self.stats['hits'] += 1
+                    return value
+                self._remove(key)
+        if self.shared:
+            value = cache.get(SHARED_KEY.format(key))
+            if value is not None:
+                self.stats['shared_hits'] += 1
+                self._store(key, value)
+                return value
+        self.stats['misses'] += 1
+        return None
+
+    def set(self, key: str, value: Tuple) -> None:
+        self._store(key, value)
+        if self.shared:
+            cache.set(SHARED_KEY.format(key), value, self.ttl)
+
+    def _store(self, key: str, value: Tuple) -> None:
+        with self._lock:
+            self._remove(key)
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._user_keys.setdefault(value[0].pk, set()).add(key)
+            while len(self._entries) > self.max_size:
+                self._remove(next(iter(self._entries)))
+                self.stats['evictions'] += 1
+
+    def _remove(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            user_id = entry[1][0].pk
+            keys = self._user_keys.get(user_id, set())
+            keys.discard(key)
+            if not keys:
+                self._user_keys.pop(user_id, None)
+
+    def invalidate(self, keys: Iterable[str]) -> None:
+        """Удаляет токены из локального и общего кэша и из кэшей
+        остальных воркеров.
+        """
+        keys = list(keys)
+        self.evict(keys)
+        if self.shared and keys:
+            cache.delete_many([SHARED_KEY.format(key) for key in keys])
+        invalidation.publish(TOKEN_TOPIC, keys)
+
+    def invalidate_user(self, user_id: int) -> None:
+        """Удаляет из кэшей все токены пользователя."""
+        self.evict_users([user_id])
+        if self.shared:
+            cache.delete_many(
+                [
+                    SHARED_KEY.format(key)
+                    for key in Token.objects.filter(
+                        user_id=user_id,
+                    ).values_list('key', flat=True)
+                ],
+            )
+        invalidation.publish(USER_TOPIC, [user_id])
+
+    def evict(self, keys: Optional[Iterable[str]]) -> None:
+        """Удаляет токены из кэша этого воркера, без keys - все токены."""
+        if keys is None:
+            self.clear()
+            return
+        with self._lock:
+            for key in keys:
+                self._remove(key)
+                self.stats['invalidations'] += 1
+
+    def evict_users(self, user_ids: Optional[Iterable]) -> None:
+        """Удаляет из кэша этого воркера токены пользователей user_ids."""
+        if user_ids is None:
+            self.clear()
+            return
+        with self._lock:
+            keys = [
+                key
+                for user_id in user_ids
+                for key in self._user_keys.get(int(user_id), ())
+            ]
+        self.evict(keys)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._user_keys.clear()
+
+    def get_stats(self) -> Dict[str, float]:
+        with self._lock:
+            size = len(self._entries)
+        lookups = self.stats['hits'] + self.stats['shared_hits'] + (
+            self.stats['misses']
+        )
+        return {
+            **self.stats,
+            'size': size,
+            'max_size': self.max_size,
+            'hit_rate': (
+                (self.stats['hits'] + self.stats['shared_hits']) / lookups
+                if lookups
+                else 0.0
+            ),
+        }
+
+
+token_cache = TokenCache(
+    max_size=settings.TOKEN_CACHE['MAX_SIZE'],
+    ttl=settings.TOKEN_CACHE['TTL'],
+    shared=settings.TOKEN_CACHE['SHARED'],
+)
+metrics.register('token_cache', token_cache.get_stats)
+invalidation.subscribe(TOKEN_TOPIC, token_cache.evict)
+invalidation.subscribe(USER_TOPIC, token_cache.evict_users)
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """Аутентификация по токену с кэшированием пары токен-пользователь.
+    Кэш сбрасывается сигналами при удалении токена (выход из системы),
+    сохранении пользователя (смена пароля, деактивация) и его удалении.
+    """
+
+    def authenticate_credentials(self, key: str) -> Tuple:
+        cached = token_cache.get(key)
+        if cached is None:
+            cached = super().authenticate_credentials(key)
+            token_cache.set(key, cached)
+        user, token = cached
+        if not user.is_active:
+            raise AuthenticationFailed(_('User inactive or deleted.'))
+        return copy.copy(user), token
@@ -0,0 +1,106 @@
+import gzip
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+from django.conf import settings
+
+from recipes.models import Ingredient
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+MANIFEST = 'manifest.json'
+KEEP_VERSIONS = 3
+
+_manifest: Optional[Dict] = None
+_manifest_mtime: Optional[float] = None
+
+
+def render_catalog() -> Tuple[bytes, int]:
+    """Сериализует каталог ингредиентов в компактный JSON: единицы
+    измерения вынесены в отдельный список, ингредиент записан как
+    [id, название, номер единицы измерения]. Ингредиенты упорядочены по
+    названию, поэтому одинаковый каталог дает одинаковые байты.
+    Возвращает JSON и число ингредиентов.
+    """
+    units: Dict[str, int] = {}
+    rows = []
+    for ingredient_id, name, unit in (
+        Ingredient.objects.order_by('name', 'id')
+        .values_list('id', 'name', 'measurement_unit')
+        .iterator(chunk_size=10000)
+    ):
+        rows.append([ingredient_id, name, units.setdefault(unit, len(units))])
+    data = json.dumps(
+        {'units': list(units), 'ingredients': rows},
+        ensure_ascii=False,
+        separators=(',', ':'),
+    ).encode()
+    return data, len(rows)
+
+
+def write_atomic(path: Path, data: bytes) -> None:
+    temporary = path.with_name(f'.{path.name}.tmp')
+    temporary.write_bytes(data)
+    os.replace(temporary, path)
+
+
+def build_bundle() -> Tuple[Dict, bool]:
+    """Сохраняет каталог ингредиентов в INGREDIENT_BUNDLE['DIR'] под
+    именем с хэшем содержимого вместе с копиями, сжатыми gzip и brotli
+    (если установлен модуль brotli), и обновляет manifest.json.
+    Возвращает манифест и признак того, что каталог изменился. Файлы
+    неизменяемы, поэтому nginx отдает их с Cache-Control: immutable;
+    прошлые версии хранятся для клиентов со старым манифестом.
+    """
+    directory = Path(settings.INGREDIENT_BUNDLE['DIR'])
+    directory.mkdir(parents=True, exist_ok=True)
+    data, count = render_catalog()
+    version = hashlib.sha256(data).hexdigest()[:16]
+    current = read_manifest()
+    if current and current['version'] == version:
+        return current, False
+    name = f'ingredients.{version}.json'
+    write_atomic(directory / name, data)
+    write_atomic(
+        directory / f'{name}.gz', gzip.compress(data, 9, mtime=0),
+    )
+    if brotli is not None:
+        write_atomic(directory / f'{name}.br', brotli.compress(data))
+    manifest = {
+        'version': version,
+        'url': f'{settings.INGREDIENT_BUNDLE["URL"]}{name}',
+        'count': count,
+        'size': len(data),
+    }
+    write_atomic(directory / MANIFEST, json.dumps(manifest).encode())
+    bundles = sorted(
+        directory.glob('ingredients.*.json'),
+        key=lambda path: path.stat().st_mtime,
+        reverse=True,
+    )
+    for path in bundles[KEEP_VERSIONS:]:
+        for stale in (path, Path(f'{path}.gz'), Path(f'{path}.br')):
+            stale.unlink(missing_ok=True)
+    return manifest, True
+
+
+def read_manifest() -> Optional[Dict]:
+    """Возвращает манифест текущей версии каталога. Файл перечитывается
+    только после изменения: время изменения проверяется при каждом вызове.
+    """
+    global _manifest, _manifest_mtime
+    path = Path(settings.INGREDIENT_BUNDLE['DIR']) / MANIFEST
+    try:
+        mtime = path.stat().st_mtime
+    except FileNotFoundError:
+        return None
+    if mtime != _manifest_mtime:
+        _manifest = json.loads(path.read_bytes())
+        _manifest_mtime = mtime
+    return _manifest
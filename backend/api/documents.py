@@ -0,0 +1,122 @@
+import json
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from django.db import router, transaction
+from rest_framework.request import Request
+
+from api.representations import apply_viewer_flags, recipe_fragments
+from recipes.models import RecipeDocument
+
+
+class RebuildBatch:
+    """Набор id рецептов, документы которых перестраиваются одним
+    вызовом после фиксации текущей транзакции.
+    """
+
+    def __init__(self) -> None:
+        self.recipe_ids = set()
+
+    def __call__(self) -> None:
+        rebuild_documents(self.recipe_ids)
+
+
+def dump_document(fragment: Dict) -> str:
+    return json.dumps(fragment, ensure_ascii=False, separators=(',', ':'))
+
+
+def rebuild_documents(recipe_ids: Iterable[int]) -> int:
+    """Перестраивает документы рецептов recipe_ids по текущим данным.
+    Документы удаленных рецептов удаляются. Возвращает число
+    построенных документов.
+    """
+    recipe_ids = list(recipe_ids)
+    if not recipe_ids:
+        return 0
+    documents = [
+        RecipeDocument(recipe_id=fragment['id'], data=dump_document(fragment))
+        for fragment in recipe_fragments(recipe_ids)
+    ]
+    with transaction.atomic(using=router.db_for_write(RecipeDocument)):
+        RecipeDocument.objects.filter(recipe_id__in=recipe_ids).delete()
+        RecipeDocument.objects.bulk_create(documents, ignore_conflicts=True)
+    return len(documents)
+
+
+def schedule_rebuild(recipe_ids: Iterable[int]) -> None:
+    """Удаляет устаревшие документы рецептов recipe_ids в текущей
+    транзакции и перестраивает их после ее фиксации. Все изменения одной
+    транзакции (рецепт, его тэги и ингредиенты) дают одну перестройку.
+    """
+    using = router.db_for_write(RecipeDocument)
+    connection = transaction.get_connection(using)
+    if not connection.in_atomic_block:
+        rebuild_documents(recipe_ids)
+        return
+    batch = next(
+        (
+            callback[1]
+            for callback in connection.run_on_commit
+            if isinstance(callback[1], RebuildBatch)
+        ),
+        None,
+    )
+    if batch is None:
+        batch = RebuildBatch()
+        transaction.on_commit(batch, using=using)
+    new_ids = set(recipe_ids) - batch.recipe_ids
+    if not new_ids:
+        return
+    RecipeDocument.objects.filter(recipe_id__in=new_ids).delete()
+    batch.recipe_ids.update(new_ids)
+
+
+def recipe_documents(recipe_ids: Iterable[int]) -> List[Dict]:
+    """Возвращает фрагменты рецептов из сохраненных документов в порядке
+    recipe_ids одним запросом. Недостающие документы строятся и
+    сохраняются.
+    """
+    recipe_ids = list(recipe_ids)
+    documents = {
+        recipe_id: json.loads(data)
+        for recipe_id, data in RecipeDocument.objects.filter(
+            recipe_id__in=recipe_ids,
+        ).values_list('recipe_id', 'data')
+    }
+    missing = [
+        recipe_id for recipe_id in recipe_ids if recipe_id not in documents
+    ]
+    if missing:
+        fragments = recipe_fragments(missing)
+        RecipeDocument.objects.bulk_create(
+            [
+                RecipeDocument(
+                    recipe_id=fragment['id'], data=dump_document(fragment),
+                )
+                for fragment in fragments
+            ],
+            ignore_conflicts=True,
+        )
+        documents.update((fragment['id'], fragment) for fragment in fragments)
+    return [
+        documents[recipe_id]
+        for recipe_id in recipe_ids
+        if recipe_id in documents
+    ]
+
+
+def document_representations(
+    recipe_ids: Iterable[int],
+    request: Request,
+    fields: Optional[Tuple[str]] = None,
+) -> List[Dict]:
+    """Возвращает представления рецептов, совпадающие с выводом
+    recipe_representations, собранные из сохраненных документов и полей
+    текущего пользователя.
+    """
+    fragments = recipe_documents(recipe_ids)
+    if fields:
+        fragments = [
+            {name: fragment[name] for name in fields if name in fragment}
+            for fragment in fragments
+        ]
+    return apply_viewer_flags(fragments, request, fields)
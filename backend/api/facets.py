@@ -0,0 +1,261 @@
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from django.conf import settings
+from pyroaring import BitMap, FrozenBitMap
+
+from core import invalidation
+from recipes.models import Favorite, Recipe, ShoppingCart, Tag
+
+TOPIC = 'recipe-facets'
+EMPTY = FrozenBitMap()
+
+
+class FacetEngine:
+    """Сжатые битовые множества (roaring bitmap) id рецептов в памяти
+    процесса: по одному на тэг, автора и интервал времени приготовления.
+    Фильтр по тэгам и автору и число рецептов каждого тэга и интервала
+    считаются пересечениями множеств без запросов к базе данных; размер
+    пересечения вычисляется без построения самого пересечения.
+    Обновление рецептов и подсчет фасетов выполняются под блокировкой
+    индекса, поэтому запрос не видит частично обновленные множества.
+    """
+
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.all = BitMap()
+        self.tags: Dict[int, BitMap] = defaultdict(BitMap)
+        self.buckets: List[BitMap] = [
+            BitMap()
+            for _ in range(len(settings.FACETS['COOKING_TIME_BUCKETS']) + 1)
+        ]
+        self.authors: Dict[int, BitMap] = defaultdict(BitMap)
+        self.recipes: Dict[int, Tuple[int, Tuple[int], int]] = {}
+        self.slugs: Dict[str, int] = {}
+
+    @classmethod
+    def build(cls: type) -> 'FacetEngine':
+        engine = cls()
+        engine.slugs = dict(Tag.objects.values_list('slug', 'id'))
+        engine.load(None)
+        return engine
+
+    def load(self, recipe_ids: Optional[List[int]]) -> None:
+        """Читает рецепты recipe_ids (без recipe_ids - все рецепты) и
+        заменяет их в индексе; отсутствующие в базе рецепты удаляются.
+        """
+        recipes = Recipe.objects.order_by()
+        links = Recipe.tags.through.objects.order_by()
+        if recipe_ids is not None:
+            recipes = recipes.filter(id__in=recipe_ids)
+            links = links.filter(recipe_id__in=recipe_ids)
+        tags = defaultdict(list)
+        for recipe_id, tag_id in links.values_list('recipe_id', 'tag_id'):
+            tags[recipe_id].append(tag_id)
+        rows = {
+            recipe_id: (author_id, tuple(tags[recipe_id]), bucket(minutes))
+            for recipe_id, author_id, minutes in recipes.values_list(
+                'id', 'author_id', 'cooking_time',
+            ).iterator(chunk_size=10000)
+        }
+        if recipe_ids is None:
+            self.add_all(rows)
+            return
+        with self.lock:
+            for recipe_id in recipe_ids:
+                self.remove(recipe_id)
+                if recipe_id in rows:
+                    self.add(recipe_id, rows[recipe_id])
+
+    def add_all(self, rows: Dict[int, Tuple[int, Tuple[int], int]]) -> None:
+        """Первичная загрузка: множества строятся сразу из списков id
+        всех рецептов и сжимаются.
+        """
+        tags, buckets, authors = (
+            defaultdict(list),
+            defaultdict(list),
+            defaultdict(list),
+        )
+        for recipe_id, (author_id, tag_ids, index) in rows.items():
+            authors[author_id].append(recipe_id)
+            buckets[index].append(recipe_id)
+            for tag_id in tag_ids:
+                tags[tag_id].append(recipe_id)
+        self.all = BitMap(rows)
+        for target, source in ((self.tags, tags), (self.authors, authors)):
+            for key, ids in source.items():
+                target[key] = BitMap(ids)
+        for index, ids in buckets.items():
+            self.buckets[index] = BitMap(ids)
+        for bitmap in (self.all, *self.tags.values(), *self.buckets):
+            bitmap.run_optimize()
+        self.recipes.update(rows)
+
+    def add(self, recipe_id: int, row: Tuple[int, Tuple[int], int]) -> None:
+        author_id, tag_ids, index = row
+        self.all.add(recipe_id)
+        self.buckets[index].add(recipe_id)
+        for tag_id in tag_ids:
+            self.tags[tag_id].add(recipe_id)
+        self.authors[author_id].add(recipe_id)
+        self.recipes[recipe_id] = row
+
+    def remove(self, recipe_id: int) -> None:
+        row = self.recipes.pop(recipe_id, None)
+        if row is None:
+            return
+        author_id, tag_ids, index = row
+        self.all.discard(recipe_id)
+        self.buckets[index].discard(recipe_id)
+        for tag_id in tag_ids:
+            self.tags[tag_id].discard(recipe_id)
+        self.authors[author_id].discard(recipe_id)
+
+    def facets(
+        self,
+        tags: List[str],
+        author: Optional[int] = None,
+        restrict: Optional[Iterable[int]] = None,
+    ) -> Dict:
+        """Возвращает число рецептов, подходящих под фильтр по тэгам
+        (любой из slug в tags), автору и множеству id restrict, и
+        число рецептов каждого тэга и интервала времени приготовления.
+        Число для тэга считается без фильтра по тэгам: выбор еще одного
+        тэга расширяет выдачу на это число рецептов.
+        """
+        with self.lock:
+            base = self.all
+            if author is not None:
+                base = base & self.authors.get(author, EMPTY)
+            if restrict is not None:
+                base = base & BitMap(restrict)
+            selected = base
+            if tags:
+                selected = base & BitMap.union(
+                    *(
+                        self.tags.get(self.slugs.get(slug), EMPTY)
+                        for slug in tags
+                    ),
+                )
+            return {
+                'count': len(selected),
+                'tags': {
+                    slug: base.intersection_cardinality(
+                        self.tags.get(tag_id, EMPTY),
+                    )
+                    for slug, tag_id in self.slugs.items()
+                },
+                'cooking_time': {
+                    label: selected.intersection_cardinality(
+                        self.buckets[index],
+                    )
+                    for index, label in enumerate(bucket_labels())
+                },
+            }
+
+
+def bucket(minutes: int) -> int:
+    return bisect_left(settings.FACETS['COOKING_TIME_BUCKETS'], minutes)
+
+
+def bucket_labels() -> List[str]:
+    edges = settings.FACETS['COOKING_TIME_BUCKETS']
+    labels, low = [], 1
+    for edge in edges:
+        labels.append(f'{low}-{edge}')
+        low = edge + 1
+    labels.append(f'{low}+')
+    return labels
+
+
+_engine: Optional[FacetEngine] = None
+_engine_version: Optional[Tuple] = None
+_generation = 0
+_pending: Set[int] = set()
+_lock = threading.Lock()
+_pending_lock = threading.Lock()
+
+
+def get_engine() -> FacetEngine:
+    """Возвращает индекс процесса. Индекс строится при первом запросе и
+    перестраивается после изменения тэгов и не реже раза в FACETS['TTL']
+    секунд; измененные рецепты перечитываются перед следующим запросом.
+    """
+    global _engine, _engine_version, _pending
+    version = (_generation, int(time.time() // settings.FACETS['TTL']))
+    if _engine is None or version != _engine_version:
+        with _lock:
+            if _engine is None or version != _engine_version:
+                with _pending_lock:
+                    _pending = set()
+                _engine = FacetEngine.build()
+                _engine_version = version
+    if _pending:
+        with _lock:
+            with _pending_lock:
+                recipe_ids, _pending = list(_pending), set()
+            _engine.load(recipe_ids)
+    return _engine
+
+
+def reset(keys: Optional[List[str]]) -> None:
+    """Обработчик шины сброса кэшей: запоминает измененные рецепты, без
+    keys - помечает весь индекс устаревшим.
+    """
+    global _generation
+    if keys is None:
+        _generation += 1
+        return
+    with _pending_lock:
+        _pending.update(int(key) for key in keys)
+
+
+def recipes_changed(recipe_ids: Iterable[int]) -> None:
+    """Обновляет рецепты recipe_ids в индексах всех воркеров после
+    фиксации транзакции.
+    """
+    invalidation.publish(TOPIC, recipe_ids)
+
+
+def tags_changed() -> None:
+    """Перестраивает индексы всех воркеров после изменения тэгов."""
+    invalidate()
+
+
+def invalidate() -> None:
+    """Перестраивает индексы всех воркеров после фиксации транзакции."""
+    invalidation.publish(TOPIC)
+
+
+invalidation.subscribe(TOPIC, reset)
+
+
+def recipe_facets(user: any, data: Dict) -> Dict:
+    """Фасеты списка рецептов для проверенных параметров RecipeFilter.
+    Фильтры по id и по избранному и списку покупок пользователя
+    передаются в индекс как множество id рецептов из одного запроса.
+    """
+    restrict = None
+    if data.get('ids'):
+        restrict = {int(pk) for pk in data['ids']}
+    if user.is_authenticated:
+        for param, model in (
+            ('is_favorited', Favorite),
+            ('is_in_shopping_cart', ShoppingCart),
+        ):
+            if data.get(param):
+                ids = set(
+                    model.objects.filter(user=user).values_list(
+                        'recipe_id', flat=True,
+                    ),
+                )
+                restrict = ids if restrict is None else restrict & ids
+    author = data.get('author')
+    return get_engine().facets(
+        [tag.slug for tag in data.get('tags') or ()],
+        author.id if author is not None else None,
+        restrict,
+    )
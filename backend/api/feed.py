@@ -0,0 +1,160 @@
+from typing import Iterable, List, Optional, Set
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db.models import Count, Q
+
+from recipes.models import FeedEntry, Recipe
+from users.models import Subscription
+
+User = get_user_model()
+
+HEAVY_AUTHORS_KEY = 'feed:heavy-authors'
+
+
+def follower_count(author_id: int) -> int:
+    return Subscription.objects.filter(author_id=author_id).count()
+
+
+def heavy_authors() -> Set[int]:
+    """Авторы, все рецепты которых подмешиваются в ленту при чтении:
+    число подписчиков больше половины FEED['FANOUT_LIMIT']. Так новый
+    подписчик автора, которому не копируются прошлые рецепты, видит их
+    в ленте. Результат кэшируется на FEED['HEAVY_AUTHORS_TTL'] секунд.
+    """
+    authors = cache.get(HEAVY_AUTHORS_KEY)
+    if authors is None:
+        authors = set(
+            Subscription.objects.order_by()
+            .values('author_id')
+            .annotate(followers=Count('id'))
+            .filter(followers__gt=settings.FEED['FANOUT_LIMIT'] // 2)
+            .values_list('author_id', flat=True),
+        )
+        cache.set(
+            HEAVY_AUTHORS_KEY, authors, settings.FEED['HEAVY_AUTHORS_TTL'],
+        )
+    return authors
+
+
+def fan_out(recipe_id: int, author_id: int) -> int:
+    """Добавляет новый рецепт во входящие подписчиков автора, если их
+    не больше FEED['FANOUT_LIMIT'], иначе помечает рецепт неразосланным:
+    такие рецепты подмешиваются при чтении ленты, даже когда подписчиков
+    у автора становится меньше. Возвращает число подписчиков, которым
+    разослан рецепт.
+    """
+    if follower_count(author_id) > settings.FEED['FANOUT_LIMIT']:
+        Recipe.objects.filter(pk=recipe_id).update(fanned_out=False)
+        return 0
+    entries = FeedEntry.objects.bulk_create(
+        [
+            FeedEntry(
+                user_id=user_id, recipe_id=recipe_id, author_id=author_id,
+            )
+            for user_id in Subscription.objects.filter(
+                author_id=author_id,
+            ).values_list('user_id', flat=True)
+        ],
+        batch_size=1000,
+        ignore_conflicts=True,
+    )
+    return len(entries)
+
+
+def backfill(user: User, author_ids: Iterable[int]) -> None:
+    """Добавляет во входящие пользователя последние FEED['BACKFILL']
+    рецептов каждого автора после подписки на него. Рецепты авторов с
+    большим числом подписчиков не копируются: они подмешиваются при
+    чтении ленты.
+    """
+    entries = []
+    for author_id in author_ids:
+        if follower_count(author_id) > settings.FEED['FANOUT_LIMIT']:
+            continue
+        entries.extend(
+            FeedEntry(user=user, recipe_id=recipe_id, author_id=author_id)
+            for recipe_id in Recipe.objects.filter(author_id=author_id)
+            .order_by('-id')
+            .values_list('id', flat=True)[: settings.FEED['BACKFILL']]
+        )
+    FeedEntry.objects.bulk_create(entries, ignore_conflicts=True)
+
+
+def backfill_all() -> int:
+    """Заполняет входящие всех подписчиков, как backfill при подписке,
+    для данных, загруженных в обход сигналов (import_data). Возвращает
+    число обработанных записей входящих.
+    """
+    followers = (
+        Subscription.objects.order_by()
+        .values('author_id')
+        .annotate(followers=Count('id'))
+        .filter(followers__lte=settings.FEED['FANOUT_LIMIT'])
+        .values_list('author_id', flat=True)
+    )
+    count = 0
+    for author_id in followers:
+        recipe_ids = list(
+            Recipe.objects.filter(author_id=author_id)
+            .order_by('-id')
+            .values_list('id', flat=True)[: settings.FEED['BACKFILL']],
+        )
+        entries = FeedEntry.objects.bulk_create(
+            [
+                FeedEntry(
+                    user_id=user_id, recipe_id=recipe_id, author_id=author_id,
+                )
+                for user_id in Subscription.objects.filter(
+                    author_id=author_id,
+                ).values_list('user_id', flat=True)
+                for recipe_id in recipe_ids
+            ],
+            batch_size=1000,
+            ignore_conflicts=True,
+        )
+        count += len(entries)
+    return count
+
+
+def cleanup(user: User, author_ids: Iterable[int]) -> None:
+    """Удаляет рецепты авторов из входящих пользователя после отписки."""
+    author_ids = list(author_ids)
+    if author_ids:
+        FeedEntry.objects.filter(user=user, author_id__in=author_ids).delete()
+
+
+def feed_recipe_ids(
+    user: User, before: Optional[int], limit: int,
+) -> List[int]:
+    """Возвращает до limit id рецептов ленты пользователя меньше before
+    по убыванию id: записи входящих, объединенные с неразосланными
+    рецептами подписанных авторов и всеми рецептами подписанных авторов
+    с большим числом подписчиков.
+    """
+    inbox = FeedEntry.objects.filter(user=user)
+    if before is not None:
+        inbox = inbox.filter(recipe_id__lt=before)
+    recipe_ids = set(
+        inbox.order_by('-recipe_id').values_list('recipe_id', flat=True)[
+            :limit
+        ],
+    )
+    sources = [Q(fanned_out=False)]
+    heavy = heavy_authors()
+    if heavy:
+        sources.append(Q(author_id__in=heavy))
+    for source in sources:
+        recipes = Recipe.objects.filter(
+            source,
+            author_id__in=Subscription.objects.filter(user=user).values(
+                'author_id',
+            ),
+        )
+        if before is not None:
+            recipes = recipes.filter(id__lt=before)
+        recipe_ids.update(
+            recipes.order_by('-id').values_list('id', flat=True)[:limit],
+        )
+    return sorted(recipe_ids, reverse=True)[:limit]
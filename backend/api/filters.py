@@ -1,18 +1,72 @@
 from typing import List
 
 from django.contrib.auth import get_user_model
+from django.db.models import Case, IntegerField, When
 from django.db.models.query import QuerySet
 from django_filters.rest_framework import FilterSet
 from django_filters.rest_framework.filters import (
+    BaseInFilter,
     BooleanFilter,
     ModelMultipleChoiceFilter,
+    NumberFilter,
 )
+from rest_framework.filters import OrderingFilter, SearchFilter
+from rest_framework.request import Request
 
+from api.search import search_ingredients
 from recipes.models import Recipe, Tag
 
 User = get_user_model()
 
 
+TRENDING = 'trending'
+
+
+class RecipeOrderingFilter(OrderingFilter):
+    """Сортировка рецептов с дополнительным значением ?ordering=trending:
+    рецепты с рейтингом популярности по убыванию рейтинга, затем id.
+    """
+
+    def filter_queryset(
+        self, request: Request, queryset: QuerySet, view: any,
+    ) -> QuerySet:
+        if request.query_params.get(self.ordering_param) != TRENDING:
+            return super().filter_queryset(request, queryset, view)
+        return queryset.filter(trending__isnull=False).order_by(
+            '-trending__score', '-id',
+        )
+
+
+class IngredientSearchFilter(SearchFilter):
+    """Нечеткий поиск ингредиентов по названию: совпадения по началу
+    названия, затем похожие по триграммам названия с учетом опечаток и
+    порядка слов. Возвращает до INGREDIENT_SEARCH['LIMIT'] ингредиентов
+    в порядке релевантности.
+    """
+
+    def filter_queryset(
+        self, request: Request, queryset: QuerySet, view: any,
+    ) -> QuerySet:
+        query = request.query_params.get(self.search_param, '').strip()
+        if not query:
+            return queryset
+        ids = search_ingredients(query, queryset.db)
+        return (
+            queryset.filter(id__in=ids)
+            .annotate(
+                rank=Case(
+                    *(When(id=pk, then=rank) for rank, pk in enumerate(ids)),
+                    output_field=IntegerField(),
+                ),
+            )
+            .order_by('rank')
+        )
+
+
+class NumberInFilter(BaseInFilter, NumberFilter):
+    """Фильтр по списку чисел через запятую: ?ids=1,2,3."""
+
+
 class RecipeFilter(FilterSet):
     """Кастомный класс фильтрации.
     Позволяет выполнять фильтрацию рецептов по различным параметрам, включая
@@ -24,6 +78,7 @@ class RecipeFilter(FilterSet):
         to_field_name='slug',
         queryset=Tag.objects.all(),
     )
+    ids = NumberInFilter(field_name='id')
     is_favorited = BooleanFilter(method='filter_is_favorited')
     is_in_shopping_cart = BooleanFilter(
         method='filter_is_in_shopping_cart',
@@ -0,0 +1,86 @@
+from typing import Dict, Iterable, List
+
+from django.db import transaction
+
+from api.documents import schedule_rebuild
+from core.storage import is_hashed
+from recipes.models import Recipe
+
+storage = Recipe._meta.get_field('image').storage
+
+
+def release_images(names: Iterable[str]) -> None:
+    """После фиксации транзакции удаляет файлы изображений, на которые
+    больше не ссылается ни один рецепт. Ссылки считаются по индексу
+    столбца image, поэтому счетчик ссылок не может разойтись с данными.
+    """
+    names = {name for name in names if name}
+    if not names:
+        return
+
+    def collect() -> None:
+        referenced = set(
+            Recipe.objects.filter(image__in=names).values_list(
+                'image', flat=True,
+            ),
+        )
+        for name in names - referenced:
+            storage.delete_orphan(name)
+
+    transaction.on_commit(collect)
+
+
+def rehash_image(name: str) -> Dict:
+    """Сохраняет файл name по пути его содержимого, переводит на новый
+    путь все ссылающиеся на него рецепты и удаляет старый файл.
+    Возвращает старое и новое имя файла и число рецептов.
+    """
+    if not storage.exists(name):
+        return {'name': name, 'new_name': None, 'recipes': 0}
+    with storage.open(name, 'rb') as file:
+        new_name = storage.save(name, file)
+    with transaction.atomic():
+        recipe_ids: List[int] = list(
+            Recipe.objects.select_for_update()
+            .filter(image=name)
+            .values_list('id', flat=True),
+        )
+        Recipe.objects.filter(id__in=recipe_ids).update(image=new_name)
+        schedule_rebuild(recipe_ids)
+    if not Recipe.objects.filter(image=name).exists():
+        storage.delete(name)
+    return {'name': name, 'new_name': new_name, 'recipes': len(recipe_ids)}
+
+
+def legacy_images() -> List[str]:
+    """Имена изображений рецептов, сохраненных не по пути содержимого."""
+    return [
+        name
+        for name in Recipe.objects.order_by()
+        .values_list('image', flat=True)
+        .distinct()
+        if name and not is_hashed(name)
+    ]
+
+
+def collect_orphans(directory: str) -> int:
+    """Удаляет файлы каталога directory хранилища, на которые не
+    ссылается ни один рецепт. Возвращает число удаленных файлов.
+    """
+    names = []
+    pending = [directory]
+    while pending:
+        current = pending.pop()
+        subdirectories, files = storage.listdir(current)
+        pending.extend(f'{current}/{name}' for name in subdirectories)
+        names.extend(f'{current}/{name}' for name in files)
+    referenced = set()
+    for start in range(0, len(names), 1000):
+        referenced.update(
+            Recipe.objects.filter(
+                image__in=names[start:start + 1000],
+            ).values_list('image', flat=True),
+        )
+    return sum(
+        storage.delete_orphan(name) for name in names if name not in referenced
+    )
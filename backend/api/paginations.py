@@ -1,4 +1,13 @@
-from rest_framework.pagination import PageNumberPagination
+from base64 import b64decode, b64encode
+from typing import Callable, List, Optional
+
+from django.db.models import Q, QuerySet
+from django.db.models.query import ModelIterable
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.request import Request
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
 
 
 class CustomPagination(PageNumberPagination):
@@ -6,3 +15,105 @@ class CustomPagination(PageNumberPagination):
 
     page_query_param = 'page'
     page_size_query_param = 'limit'
+    page_size = 6
+    max_page_size = 100
+
+
+class KeysetPagination(BasePagination):
+    """Базовая пагинация по ключу: следующая страница начинается после
+    ключа последнего элемента предыдущей, поэтому глубина страницы не
+    влияет на стоимость запроса, а новые записи между запросами не дают
+    пропусков и повторов внутри одного обхода. Ключ передается в
+    параметре cursor ссылки next.
+    """
+
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'limit'
+    page_size = 6
+    max_page_size = 100
+
+    def get_paginated_response(self, data: List) -> Response:
+        return Response({'next': self.get_next_link(), 'results': data})
+
+    def get_limit(self, request: Request) -> int:
+        try:
+            limit = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return max(1, min(limit, self.max_page_size))
+
+    def decode_cursor(self, request: Request) -> Optional[List[str]]:
+        value = request.query_params.get(self.cursor_query_param)
+        if not value:
+            return None
+        try:
+            return b64decode(value.encode()).decode().split(':')
+        except ValueError:
+            raise NotFound('Неверный курсор.')
+
+    def get_next_link(self) -> Optional[str]:
+        if self.next_position is None:
+            return None
+        return replace_query_param(
+            self.request.build_absolute_uri(),
+            self.cursor_query_param,
+            b64encode(
+                ':'.join(map(repr, self.next_position)).encode(),
+            ).decode(),
+        )
+
+
+class TrendingCursorPagination(KeysetPagination):
+    """Пагинация по ключу (рейтинг, id) для сортировки по популярности."""
+
+    def paginate_queryset(
+        self, queryset: QuerySet, request: Request, view: any = None,
+    ) -> List:
+        self.request = request
+        self.limit = self.get_limit(request)
+        position = self.decode_cursor(request)
+        if position is not None:
+            try:
+                score, pk = float(position[0]), int(position[1])
+            except (IndexError, ValueError):
+                raise NotFound('Неверный курсор.')
+            queryset = queryset.filter(
+                Q(trending__score__lt=score)
+                | Q(trending__score=score, id__lt=pk),
+            )
+        rows = list(
+            queryset.values_list('trending__score', 'id')[: self.limit + 1],
+        )
+        self.next_position = (
+            rows[self.limit - 1] if len(rows) > self.limit else None
+        )
+        ids = [pk for _, pk in rows[: self.limit]]
+        if queryset._iterable_class is not ModelIterable:
+            return ids
+        recipes = queryset.in_bulk(ids)
+        return [recipes[pk] for pk in ids]
+
+
+class FeedCursorPagination(KeysetPagination):
+    """Пагинация ленты подписок по убыванию id рецепта."""
+
+    def paginate_ids(
+        self,
+        fetch: Callable[[Optional[int], int], List[int]],
+        request: Request,
+    ) -> List[int]:
+        """Возвращает id рецептов страницы. fetch(before, limit)
+        возвращает до limit id меньше before по убыванию.
+        """
+        self.request = request
+        self.limit = self.get_limit(request)
+        position = self.decode_cursor(request)
+        try:
+            before = int(position[0]) if position is not None else None
+        except ValueError:
+            raise NotFound('Неверный курсор.')
+        ids = fetch(before, self.limit + 1)
+        self.next_position = (
+            (ids[self.limit - 1],) if len(ids) > self.limit else None
+        )
+        return ids[: self.limit]
@@ -0,0 +1,36 @@
+from typing import Dict, Optional
+
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils import encoders
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class FastJSONRenderer(JSONRenderer):
+    """JSON рендерер на основе orjson.
+    Сразу возвращает bytes в той же компактной UTF-8 форме, что и
+    стандартный JSONRenderer. Если orjson не установлен или клиент
+    запросил отформатированный вывод (indent), используется стандартный
+    рендерер.
+    """
+
+    def render(
+        self,
+        data: any,
+        accepted_media_type: Optional[str] = None,
+        renderer_context: Optional[Dict] = None,
+    ) -> bytes:
+        if data is None:
+            return b''
+        if orjson is None or self.get_indent(
+            accepted_media_type, renderer_context or {},
+        ):
+            return super().render(data, accepted_media_type, renderer_context)
+        return (
+            orjson.dumps(data, default=encoders.JSONEncoder().default)
+            .replace(b'\xe2\x80\xa8', b'\\u2028')
+            .replace(b'\xe2\x80\xa9', b'\\u2029')
+        )
@@ -0,0 +1,199 @@
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from django.contrib.auth import get_user_model
+from django.db.models import CharField, Value
+from rest_framework.request import Request
+
+from recipes.models import Favorite, Recipe, RecipeIngredient, ShoppingCart
+from users.models import Subscription
+
+User = get_user_model()
+
+AUTHOR_FIELDS = ('id', 'email', 'username', 'first_name', 'last_name')
+RECIPE_FIELDS = (
+    'id',
+    'author',
+    'name',
+    'image',
+    'text',
+    'ingredients',
+    'tags',
+    'cooking_time',
+    'is_favorited',
+    'is_in_shopping_cart',
+)
+RECIPE_COLUMNS = ('name', 'image', 'text', 'cooking_time')
+
+
+def recipe_fragments(
+    recipe_ids: Iterable[int], fields: Optional[Tuple[str]] = None,
+) -> List[Dict]:
+    """Строит представления рецептов без полей, зависящих от
+    пользователя (is_favorited, is_in_shopping_cart, is_subscribed),
+    в том же виде и порядке ключей, что и RecipeGetSerializer.
+    Данные читаются не более чем четырьмя запросами .values() независимо
+    от количества рецептов, без создания объектов моделей и полей
+    сериализаторов. Если задан набор полей fields, строятся только эти
+    поля, а запросы для непереданных связей не выполняются.
+    """
+    recipe_ids = list(recipe_ids)
+    if not recipe_ids:
+        return []
+    fields = fields or RECIPE_FIELDS
+    rows = {
+        row['id']: row
+        for row in Recipe.objects.filter(id__in=recipe_ids).values(
+            'id',
+            'author_id',
+            *(name for name in RECIPE_COLUMNS if name in fields),
+        )
+    }
+    authors = {}
+    if 'author' in fields:
+        authors = {
+            author['id']: author
+            for author in User.objects.filter(
+                id__in={row['author_id'] for row in rows.values()},
+            ).values(*AUTHOR_FIELDS)
+        }
+    tags = defaultdict(list)
+    if 'tags' in fields:
+        for tag in (
+            Recipe.tags.through.objects.filter(recipe_id__in=recipe_ids)
+            .order_by('-tag_id')
+            .values(
+                'recipe_id', 'tag__id', 'tag__name', 'tag__color', 'tag__slug',
+            )
+        ):
+            tags[tag['recipe_id']].append(
+                {
+                    'id': tag['tag__id'],
+                    'name': tag['tag__name'],
+                    'color': tag['tag__color'],
+                    'slug': tag['tag__slug'],
+                },
+            )
+    ingredients = defaultdict(list)
+    if 'ingredients' in fields:
+        for ingredient in (
+            RecipeIngredient.objects.filter(recipe_id__in=recipe_ids)
+            .order_by('-id')
+            .values(
+                'recipe_id',
+                'ingredient_id',
+                'ingredient__name',
+                'ingredient__measurement_unit',
+                'amount',
+            )
+        ):
+            ingredients[ingredient['recipe_id']].append(
+                {
+                    'id': ingredient['ingredient_id'],
+                    'name': ingredient['ingredient__name'],
+                    'measurement_unit': (
+                        ingredient['ingredient__measurement_unit']
+                    ),
+                    'amount': ingredient['amount'],
+                },
+            )
+    storage = Recipe._meta.get_field('image').storage
+    fragments = []
+    for recipe_id in recipe_ids:
+        row = rows.get(recipe_id)
+        if row is None:
+            continue
+        fragment = {'id': recipe_id}
+        if 'author' in fields:
+            fragment['author'] = dict(authors[row['author_id']])
+        if 'name' in fields:
+            fragment['name'] = row['name']
+        if 'image' in fields:
+            fragment['image'] = storage.url(row['image'])
+        if 'text' in fields:
+            fragment['text'] = row['text']
+        if 'ingredients' in fields:
+            fragment['ingredients'] = ingredients[recipe_id]
+        if 'tags' in fields:
+            fragment['tags'] = tags[recipe_id]
+        if 'cooking_time' in fields:
+            fragment['cooking_time'] = row['cooking_time']
+        fragments.append(fragment)
+    return fragments
+
+
+def apply_viewer_flags(
+    fragments: List[Dict],
+    request: Request,
+    fields: Optional[Tuple[str]] = None,
+) -> List[Dict]:
+    """Добавляет во фрагменты рецептов поля, зависящие от пользователя,
+    одним запросом UNION ALL по избранному, списку покупок и подпискам на
+    всю страницу. Поля, не вошедшие в набор fields, не добавляются и не
+    запрашиваются.
+    """
+    fields = fields or RECIPE_FIELDS
+    user = request.user
+    flags = defaultdict(set)
+    if user.is_authenticated and fragments:
+        recipe_ids = [fragment['id'] for fragment in fragments]
+        querysets = []
+        if 'is_favorited' in fields:
+            querysets.append(
+                Favorite.objects.filter(user=user, recipe_id__in=recipe_ids)
+                .order_by()
+                .values_list('recipe_id', Value('favorite', CharField())),
+            )
+        if 'is_in_shopping_cart' in fields:
+            querysets.append(
+                ShoppingCart.objects.filter(
+                    user=user, recipe_id__in=recipe_ids,
+                )
+                .order_by()
+                .values_list('recipe_id', Value('cart', CharField())),
+            )
+        if 'author' in fields:
+            querysets.append(
+                Subscription.objects.filter(
+                    user=user,
+                    author_id__in={
+                        fragment['author']['id'] for fragment in fragments
+                    },
+                )
+                .order_by()
+                .values_list('author_id', Value('subscription', CharField())),
+            )
+        if querysets:
+            for object_id, kind in querysets[0].union(
+                *querysets[1:], all=True,
+            ):
+                flags[kind].add(object_id)
+    favorites, carts, subscriptions = (
+        flags['favorite'],
+        flags['cart'],
+        flags['subscription'],
+    )
+    for fragment in fragments:
+        if 'author' in fields:
+            fragment['author']['is_subscribed'] = (
+                fragment['author']['id'] in subscriptions
+            )
+        if 'is_favorited' in fields:
+            fragment['is_favorited'] = fragment['id'] in favorites
+        if 'is_in_shopping_cart' in fields:
+            fragment['is_in_shopping_cart'] = fragment['id'] in carts
+    return fragments
+
+
+def recipe_representations(
+    recipe_ids: Iterable[int],
+    request: Request,
+    fields: Optional[Tuple[str]] = None,
+) -> List[Dict]:
+    """Возвращает представления рецептов, совпадающие с выводом
+    RecipeGetSerializer с тем же набором полей fields, в порядке
+    recipe_ids.
+    """
+    return apply_viewer_flags(
+        recipe_fragments(recipe_ids, fields), request, fields,
+    )
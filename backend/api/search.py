@@ -0,0 +1,217 @@
+import re
+import threading
+import time
+from bisect import bisect_left
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+from django.conf import settings
+from django.contrib.postgres.search import TrigramSimilarity
+from django.db import DatabaseError, connections, transaction
+
+from core import invalidation
+from recipes.models import Ingredient
+
+TOPIC = 'ingredient-search'
+WORD = re.compile(r'\w+')
+
+
+def normalize(text: str) -> str:
+    return ' '.join(WORD.findall(text.lower().replace('ё', 'е')))
+
+
+def trigrams(text: str) -> Set[str]:
+    """Триграммы строки по правилам pg_trgm: каждое слово дополняется
+    двумя пробелами слева и одним справа. Набор не зависит от порядка
+    слов.
+    """
+    grams = set()
+    for word in normalize(text).split():
+        padded = f'  {word} '
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+class TrigramIndex:
+    """Инвертированный индекс триграмм названий ингредиентов.
+    Для каждой триграммы хранится массив номеров ингредиентов, поэтому
+    число общих триграмм запроса со всеми ингредиентами считается
+    сложением нескольких коротких массивов без перебора каталога.
+    Сходство считается как в pg_trgm: общие триграммы, деленные на
+    объединение наборов триграмм.
+    """
+
+    def __init__(self, ingredients: Iterable[Tuple[int, str]]) -> None:
+        ids, names, sizes = [], [], []
+        postings: Dict[str, List[int]] = {}
+        for row, (ingredient_id, name) in enumerate(ingredients):
+            grams = trigrams(name)
+            ids.append(ingredient_id)
+            names.append(name)
+            sizes.append(len(grams))
+            for gram in grams:
+                postings.setdefault(gram, []).append(row)
+        self.ids = np.array(ids, dtype=np.int64)
+        self.names = names
+        self.sizes = np.array(sizes, dtype=np.int32)
+        self.postings = {
+            gram: np.array(rows, dtype=np.int32)
+            for gram, rows in postings.items()
+        }
+        self.prefixes = sorted(
+            (normalize(name), row) for row, name in enumerate(names)
+        )
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def prefix(self, query: str, limit: int) -> List[int]:
+        """Номера ингредиентов, название которых начинается с query."""
+        query = normalize(query)
+        rows = []
+        start = bisect_left(self.prefixes, (query, -1))
+        for name, row in self.prefixes[start:start + limit]:
+            if not name.startswith(query):
+                break
+            rows.append(row)
+        return rows
+
+    def search(
+        self,
+        query: str,
+        limit: int,
+        threshold: float,
+        budget: Optional[float] = None,
+    ) -> List[int]:
+        """Возвращает до limit id ингредиентов: сначала совпадения по
+        началу названия, затем остальные по убыванию сходства не ниже
+        threshold. Триграммы обрабатываются от редких к частым; если
+        обработка не уложилась в budget секунд, оставшиеся частые
+        триграммы пропускаются, и ранжирование идет по неполным счетчикам.
+        """
+        if not normalize(query):
+            return []
+        deadline = time.monotonic() + budget if budget else None
+        rows = self.prefix(query, limit)
+        grams = trigrams(query)
+        if len(rows) < limit and grams:
+            lists = sorted(
+                (
+                    self.postings[gram]
+                    for gram in grams
+                    if gram in self.postings
+                ),
+                key=len,
+            )
+            shared = np.zeros(len(self.names), dtype=np.int32)
+            for postings in lists:
+                shared[postings] += 1
+                if deadline and time.monotonic() > deadline:
+                    break
+            candidates = np.flatnonzero(shared)
+            counts = shared[candidates]
+            scores = counts / (len(grams) + self.sizes[candidates] - counts)
+            keep = scores >= threshold
+            candidates, scores = candidates[keep], scores[keep]
+            order = np.lexsort((candidates, -scores))
+            seen = set(rows)
+            for row in candidates[order[:limit + len(rows)]].tolist():
+                if row not in seen:
+                    rows.append(row)
+        return self.ids[rows[:limit]].tolist()
+
+
+_index: Optional[TrigramIndex] = None
+_index_version: Optional[Tuple] = None
+_generation = 0
+_lock = threading.Lock()
+
+
+def invalidate() -> None:
+    """Помечает индекс устаревшим во всех воркерах после фиксации
+    транзакции.
+    """
+    invalidation.publish(TOPIC)
+
+
+def reset(keys: Optional[List[str]]) -> None:
+    global _generation
+    _generation += 1
+
+
+def get_index() -> TrigramIndex:
+    """Возвращает индекс процесса. Индекс перестраивается после
+    изменения каталога ингредиентов и не реже раза в
+    INGREDIENT_SEARCH['TTL'] секунд.
+    """
+    global _index, _index_version
+    version = (
+        _generation,
+        int(time.time() // settings.INGREDIENT_SEARCH['TTL']),
+    )
+    if _index is None or version != _index_version:
+        with _lock:
+            if _index is None or version != _index_version:
+                _index = TrigramIndex(
+                    Ingredient.objects.order_by('id')
+                    .values_list('id', 'name')
+                    .iterator(chunk_size=10000),
+                )
+                _index_version = version
+    return _index
+
+
+invalidation.subscribe(TOPIC, reset)
+
+
+def postgres_search(query: str, limit: int, using: str) -> List[int]:
+    """Ищет ингредиенты через pg_trgm: совпадения по началу названия,
+    затем похожие по оператору % с GIN индексом по триграммам. Время
+    запроса ограничено statement_timeout по INGREDIENT_SEARCH['BUDGET_MS'];
+    при превышении возвращается только поиск по началу названия.
+    """
+    ingredients = Ingredient.objects.using(using)
+    prefix = list(
+        ingredients.filter(name__istartswith=query.strip())
+        .order_by('name')
+        .values_list('id', flat=True)[:limit],
+    )
+    if len(prefix) >= limit:
+        return prefix
+    try:
+        with transaction.atomic(using=using):
+            with connections[using].cursor() as cursor:
+                cursor.execute(
+                    'SET LOCAL statement_timeout = %s',
+                    [settings.INGREDIENT_SEARCH['BUDGET_MS']],
+                )
+                cursor.execute(
+                    'SET LOCAL pg_trgm.similarity_threshold = %s',
+                    [settings.INGREDIENT_SEARCH['THRESHOLD']],
+                )
+            similar = list(
+                ingredients.filter(name__trigram_similar=query)
+                .exclude(id__in=prefix)
+                .annotate(similarity=TrigramSimilarity('name', query))
+                .order_by('-similarity', 'id')
+                .values_list('id', flat=True)[: limit - len(prefix)],
+            )
+    except DatabaseError:
+        similar = []
+    return prefix + similar
+
+
+def search_ingredients(query: str, using: str = 'default') -> List[int]:
+    """Возвращает id найденных ингредиентов в порядке релевантности."""
+    config = settings.INGREDIENT_SEARCH
+    if (
+        config['BACKEND'] == 'postgres'
+        and connections[using].vendor == 'postgresql'
+    ):
+        return postgres_search(query, config['LIMIT'], using)
+    return get_index().search(
+        query,
+        config['LIMIT'],
+        config['THRESHOLD'],
+        config['BUDGET_MS'] / 1000,
+    )
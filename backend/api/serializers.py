@@ -1,14 +1,15 @@
 import base64
 from typing import Any, Dict, List, Tuple
 
+from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.core.files.base import ContentFile
 from django.db import transaction
+from django.db.models import prefetch_related_objects
 from djoser.serializers import UserCreateSerializer as DjoserCreateSerializer
 from rest_framework import serializers
 from rest_framework.exceptions import ValidationError
 from rest_framework.fields import SerializerMethodField
-from rest_framework.relations import PrimaryKeyRelatedField
 from rest_framework.validators import UniqueValidator
 
 from api.validators import check_username
@@ -31,6 +32,36 @@ class Base64ImageField(serializers.ImageField):
         return super().to_internal_value(data)
 
 
+class PrimaryKeyListField(serializers.ListField):
+    """Список id объектов queryset. В отличие от
+    PrimaryKeyRelatedField(many=True), все id проверяются одним запросом
+    IN, а ошибка перечисляет все несуществующие id сразу. Повторяющиеся
+    id отбрасываются.
+    """
+
+    child = serializers.IntegerField(min_value=1)
+
+    def __init__(self, queryset: Any, **kwargs: any) -> None:
+        self.queryset = queryset
+        super().__init__(**kwargs)
+
+    def to_internal_value(self, data: Any) -> List[Any]:
+        ids = list(dict.fromkeys(super().to_internal_value(data)))
+        objects = self.queryset.in_bulk(ids)
+        missing = [pk for pk in ids if pk not in objects]
+        if missing:
+            raise ValidationError(
+                f'Недопустимые первичные ключи '
+                f'{", ".join(map(str, missing))} - объекты не существуют.',
+            )
+        return [objects[pk] for pk in ids]
+
+    def to_representation(self, value: Any) -> List[int]:
+        if hasattr(value, 'all'):
+            value = value.all()
+        return [item.pk for item in value]
+
+
 class CustomUserCreateSerializer(DjoserCreateSerializer):
     """Сериализатор для создания пользователя."""
 
@@ -116,6 +147,16 @@ class IngredientSerializer(serializers.ModelSerializer):
         fields: Tuple[str] = ('id', 'name', 'measurement_unit')
 
 
+class BulkIdsSerializer(serializers.Serializer):
+    """Сериализатор списка id для массовых действий."""
+
+    ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=settings.BULK_MAX_ITEMS,
+    )
+
+
 class RecipeCartFavoriteSerializer(serializers.ModelSerializer):
     """Сериализатор для отображения рецептов в списке покупок и избранном."""
 
@@ -170,10 +211,7 @@ class UserSubscriptionSerializer(serializers.ModelSerializer):
 class RecipeIngredientSerializer(serializers.ModelSerializer):
     """Сериализатор для ингредиентов в рецептах."""
 
-    id = serializers.PrimaryKeyRelatedField(
-        queryset=Ingredient.objects,
-        source='ingredient.id',
-    )
+    id = serializers.IntegerField(source='ingredient.id', min_value=1)
     name = serializers.CharField(
         source='ingredient.name',
         read_only=True,
@@ -204,6 +242,16 @@ class RecipeGetSerializer(serializers.ModelSerializer):
     is_favorited = SerializerMethodField()
     is_in_shopping_cart = SerializerMethodField()
 
+    def __init__(self, *args: any, **kwargs: any) -> None:
+        """Оставляет только поля из набора fields контекста, если он
+        задан (параметр запроса fields).
+        """
+        super().__init__(*args, **kwargs)
+        fields = self.context.get('fields')
+        if fields:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
     class Meta:
         model = Recipe
         fields: Tuple[str] = (
@@ -240,7 +288,7 @@ class RecipePostOrPatchSerializer(RecipeGetSerializer):
     наследуется от serializers.ModelSerializer родителя RecipeGetSerializer.
     """
     image = Base64ImageField()
-    tags = PrimaryKeyRelatedField(many=True, queryset=Tag.objects.all())
+    tags = PrimaryKeyListField(queryset=Tag.objects.all())
     cooking_time = serializers.IntegerField(min_value=1, max_value=4320)
 
     @transaction.atomic
@@ -248,35 +296,61 @@ class RecipePostOrPatchSerializer(RecipeGetSerializer):
         """Метод для создания рецепта."""
         ingredients = validated_data.pop('recipe_ingredients')
         recipe = super().create(validated_data)
-        for ingr in ingredients:
-            ingredient = ingr['ingredient']['id']
-            amount = ingr['amount']
-            recipe.ingredients.add(
-                ingredient,
-                through_defaults={'amount': amount},
-            )
-        return recipe
+        self.save_ingredients(recipe, ingredients)
+        return self.prefetch(recipe)
 
     @transaction.atomic
     def update(self, instance: Recipe, validated_data: dict) -> Recipe:
-        """Метод для обновления рецепта."""
+        """Метод для обновления рецепта. Переданный список ингредиентов
+        заменяет прежний.
+        """
         ingredients = validated_data.pop('recipe_ingredients', None)
         recipe = super().update(instance, validated_data)
-        for ingr in ingredients:
-            ingredient = ingr['ingredient']['id']
-            amount = ingr['amount']
-            recipe.ingredients.add(
-                ingredient, through_defaults={'amount': amount},
+        if ingredients is not None:
+            recipe.recipe_ingredients.all().delete()
+            self.save_ingredients(recipe, ingredients)
+        return self.prefetch(recipe)
+
+    @staticmethod
+    def save_ingredients(recipe: Recipe, ingredients: List[Dict]) -> None:
+        """Сохраняет ингредиенты рецепта одним запросом, используя
+        объекты ингредиентов, найденные при валидации.
+        """
+        RecipeIngredient.objects.bulk_create(
+            RecipeIngredient(
+                recipe=recipe,
+                ingredient=ingr['ingredient'],
+                amount=ingr['amount'],
             )
+            for ingr in ingredients
+        )
+
+    @staticmethod
+    def prefetch(recipe: Recipe) -> Recipe:
+        """Загружает тэги и ингредиенты сохраненного рецепта для ответа
+        запросом на связь, а не отдельным запросом на каждый ингредиент.
+        """
+        prefetch_related_objects(
+            [recipe], 'tags', 'recipe_ingredients__ingredient',
+        )
         return recipe
 
     def validate_ingredients(self, ingredients: List[Dict]) -> List[Dict]:
-        """Метод для валидации ингредиентов."""
+        """Метод для валидации ингредиентов. Ингредиенты ищутся одним
+        запросом IN, в ошибке перечисляются все несуществующие id.
+        """
         ingredients_set = set(
             ingr.get('ingredient').get('id') for ingr in ingredients
         )
         if len(ingredients_set) != len(ingredients):
             raise ValidationError('Ингредиенты не должны повторяться')
+        found = Ingredient.objects.in_bulk(ingredients_set)
+        missing = sorted(ingredients_set - set(found))
+        if missing:
+            raise ValidationError(
+                f'Несуществующие ингредиенты: '
+                f'{", ".join(map(str, missing))}',
+            )
         if any(int(ingr['amount']) < 1 for ingr in ingredients):
             raise ValidationError(
                 'Количество ингредиента не может быть меньше 1',
@@ -285,4 +359,10 @@ class RecipePostOrPatchSerializer(RecipeGetSerializer):
             raise ValidationError(
                 'Количество ингредиента не может быть больше 100',
             )
-        return ingredients
+        return [
+            {
+                'ingredient': found[ingr['ingredient']['id']],
+                'amount': ingr['amount'],
+            }
+            for ingr in ingredients
+        ]
@@ -0,0 +1,264 @@
+from typing import Optional, Set
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models.signals import (
+    m2m_changed,
+    post_delete,
+    post_save,
+    pre_delete,
+    pre_save,
+)
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from api.authentication import token_cache
+from api.documents import schedule_rebuild
+from api.facets import recipes_changed, tags_changed
+from api.feed import fan_out
+from api.images import release_images
+from api.representations import AUTHOR_FIELDS
+from api.search import invalidate as invalidate_ingredient_search
+from api.viewer_state import bump_state
+from recipes.models import (
+    Favorite,
+    Ingredient,
+    Recipe,
+    RecipeIngredient,
+    ShoppingCart,
+    Tag,
+)
+from users.models import Subscription
+
+User = get_user_model()
+
+CREDENTIAL_FIELDS = ('password', 'is_active')
+
+
+@receiver(post_delete, sender=Token)
+def invalidate_deleted_token(
+    sender: type, instance: Token, **kwargs: any,
+) -> None:
+    """Сбрасывает токен из кэша при выходе пользователя из системы."""
+    token_cache.invalidate([instance.key])
+
+
+@receiver(pre_save, sender=User)
+def remember_user_credentials(
+    sender: type, instance: User, **kwargs: any,
+) -> None:
+    """Запоминает прежние пароль и активность изменяемого пользователя.
+    Сохранения, не затрагивающие эти поля (например, last_login при
+    входе), не читают базу данных.
+    """
+    update_fields = kwargs.get('update_fields')
+    instance._previous_credentials = (
+        User.objects.filter(pk=instance.pk)
+        .values_list(*CREDENTIAL_FIELDS)
+        .first()
+        if instance.pk
+        and not (
+            update_fields and not set(update_fields) & set(CREDENTIAL_FIELDS)
+        )
+        else None
+    )
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_user_tokens(
+    sender: type, instance: User, **kwargs: any,
+) -> None:
+    """Сбрасывает токены пользователя при смене пароля, деактивации или
+    удалении.
+    """
+    if kwargs['signal'] is post_save:
+        previous = getattr(instance, '_previous_credentials', None)
+        if previous is None or previous == tuple(
+            getattr(instance, field) for field in CREDENTIAL_FIELDS
+        ):
+            return
+    token_cache.invalidate_user(instance.pk)
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_save, sender=RecipeIngredient)
+@receiver(post_delete, sender=RecipeIngredient)
+@receiver(post_delete, sender=Recipe.tags.through)
+def rebuild_recipe_document(
+    sender: type, instance: any, **kwargs: any,
+) -> None:
+    """Перестраивает документ рецепта при изменении рецепта, его
+    ингредиентов или удалении связи с тэгом.
+    """
+    schedule_rebuild([getattr(instance, 'recipe_id', instance.pk)])
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def rebuild_tagged_recipe_documents(
+    sender: type,
+    instance: any,
+    action: str,
+    reverse: bool,
+    pk_set: Optional[Set[int]],
+    **kwargs: any,
+) -> None:
+    """Перестраивает документы рецептов при изменении их тэгов."""
+    if not reverse and action.startswith('post_'):
+        schedule_rebuild([instance.pk])
+    elif reverse and action in ('post_add', 'post_remove'):
+        schedule_rebuild(pk_set)
+    elif reverse and action == 'pre_clear':
+        schedule_rebuild(instance.tags.values_list('id', flat=True))
+
+
+@receiver(post_save, sender=Tag)
+@receiver(pre_delete, sender=Tag)
+def rebuild_tag_documents(sender: type, instance: Tag, **kwargs: any) -> None:
+    """Перестраивает документы рецептов с измененным тэгом."""
+    schedule_rebuild(instance.tags.values_list('id', flat=True))
+
+
+@receiver(post_save, sender=Ingredient)
+def rebuild_ingredient_documents(
+    sender: type, instance: Ingredient, **kwargs: any,
+) -> None:
+    """Перестраивает документы рецептов с измененным ингредиентом."""
+    if kwargs.get('created'):
+        return
+    schedule_rebuild(
+        instance.recipe_ingredients.values_list('recipe_id', flat=True),
+    )
+
+
+@receiver(post_save, sender=User)
+def rebuild_author_documents(
+    sender: type, instance: User, **kwargs: any,
+) -> None:
+    """Перестраивает документы рецептов автора при изменении его данных.
+    Сохранения, не затрагивающие поля автора в рецепте (например,
+    last_login при входе), пропускаются.
+    """
+    update_fields = kwargs.get('update_fields')
+    if kwargs.get('created') or (
+        update_fields and not set(update_fields) & set(AUTHOR_FIELDS)
+    ):
+        return
+    schedule_rebuild(instance.recipes.values_list('id', flat=True))
+
+
+@receiver(post_save, sender=Recipe)
+def fan_out_recipe(
+    sender: type, instance: Recipe, created: bool, **kwargs: any,
+) -> None:
+    """Рассылает новый рецепт в ленты подписчиков автора после фиксации
+    транзакции создания рецепта.
+    """
+    if created:
+        transaction.on_commit(
+            lambda: fan_out(instance.pk, instance.author_id),
+        )
+
+
+@receiver(pre_save, sender=Recipe)
+def remember_recipe_image(
+    sender: type, instance: Recipe, **kwargs: any,
+) -> None:
+    """Запоминает прежнее изображение изменяемого рецепта."""
+    instance._previous_image = (
+        Recipe.objects.filter(pk=instance.pk)
+        .values_list('image', flat=True)
+        .first()
+        if instance.pk
+        else None
+    )
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+def release_recipe_image(
+    sender: type, instance: Recipe, **kwargs: any,
+) -> None:
+    """Освобождает файл изображения при его замене или удалении рецепта:
+    файл удаляется, если на него не ссылаются другие рецепты.
+    """
+    previous = getattr(instance, '_previous_image', None)
+    if kwargs['signal'] is post_delete:
+        release_images([instance.image.name])
+    elif previous and previous != instance.image.name:
+        release_images([previous])
+
+
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def invalidate_ingredient_index(
+    sender: type, instance: Ingredient, **kwargs: any,
+) -> None:
+    """Помечает индекс поиска ингредиентов устаревшим."""
+    invalidate_ingredient_search()
+
+
+@receiver(pre_delete, sender=Recipe)
+def bump_recipe_viewers_state(
+    sender: type, instance: Recipe, **kwargs: any,
+) -> None:
+    """Увеличивает версию состояния пользователей, у которых удаляемый
+    рецепт есть в избранном или списке покупок.
+    """
+    bump_state(
+        [
+            *Favorite.objects.filter(recipe=instance).values_list(
+                'user_id', flat=True,
+            ),
+            *ShoppingCart.objects.filter(recipe=instance).values_list(
+                'user_id', flat=True,
+            ),
+        ],
+    )
+
+
+@receiver(pre_delete, sender=User)
+def bump_followers_state(
+    sender: type, instance: User, **kwargs: any,
+) -> None:
+    """Увеличивает версию состояния подписчиков удаляемого автора."""
+    bump_state(
+        Subscription.objects.filter(author=instance).values_list(
+            'user_id', flat=True,
+        ),
+    )
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+@receiver(post_delete, sender=Recipe.tags.through)
+def update_recipe_facets(sender: type, instance: any, **kwargs: any) -> None:
+    """Обновляет рецепт в индексе фасетов после изменения его автора,
+    времени приготовления или удаления связи с тэгом.
+    """
+    recipes_changed([getattr(instance, 'recipe_id', instance.pk)])
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def update_tagged_recipe_facets(
+    sender: type,
+    instance: any,
+    action: str,
+    reverse: bool,
+    pk_set: Optional[Set[int]],
+    **kwargs: any,
+) -> None:
+    """Обновляет рецепты в индексе фасетов при изменении их тэгов."""
+    if not reverse and action.startswith('post_'):
+        recipes_changed([instance.pk])
+    elif reverse and action in ('post_add', 'post_remove'):
+        recipes_changed(pk_set)
+    elif reverse and action == 'pre_clear':
+        recipes_changed(instance.tags.values_list('id', flat=True))
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def reset_tag_facets(sender: type, instance: Tag, **kwargs: any) -> None:
+    """Перестраивает индекс фасетов после изменения списка тэгов."""
+    tags_changed()
@@ -0,0 +1,289 @@
+import json
+import os
+import shutil
+import threading
+import time
+from datetime import datetime
+from itertools import chain
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from django.conf import settings
+from django.utils import timezone
+
+from recipes.models import Recipe, RecipeDocument, RecipeIngredient
+
+PERMUTATIONS = 128
+# 16 полос по 8 строк: рецепт становится кандидатом с вероятностью
+# 1 - (1 - s^8)^16, около 0.06 при коэффициенте Жаккара s = 0.5 и 0.95
+# при s = 0.8, поэтому в корзины попадают в основном похожие рецепты.
+BANDS = 16
+ROWS = PERMUTATIONS // BANDS
+PRIME = (1 << 31) - 1
+CHUNK_RECIPES = 4096
+MAX_BUCKET = 1000
+MANIFEST = 'current.json'
+MANIFEST_CHECK_SECONDS = 10
+ARRAYS = ('recipe_ids', 'signatures', 'band_keys', 'band_rows')
+
+_random = np.random.RandomState(20230830)
+HASH_A = _random.randint(1, PRIME, PERMUTATIONS).astype(np.uint64)
+HASH_B = _random.randint(0, PRIME, PERMUTATIONS).astype(np.uint64)
+SCRAMBLE = np.uint64(0x9E3779B97F4A7C15)
+BAND_MIX = _random.randint(1, 1 << 62, ROWS, dtype=np.int64).astype(
+    np.uint64,
+) | np.uint64(1)
+
+
+def compute_signatures(pairs: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Вычисляет MinHash подписи наборов ингредиентов рецептов.
+    pairs - массив пар (id рецепта, id ингредиента), упорядоченный по id
+    рецепта. Возвращает отсортированные id рецептов и матрицу подписей
+    (рецепт x PERMUTATIONS). Хэш-функции вида (a * x + b) mod PRIME
+    применяются ко всем ингредиентам пакета рецептов сразу, минимум по
+    каждому рецепту берется через np.minimum.reduceat.
+    """
+    if not len(pairs):
+        return (
+            np.empty(0, dtype=np.int64),
+            np.empty((0, PERMUTATIONS), dtype=np.uint32),
+        )
+    recipe_ids, starts = np.unique(pairs[:, 0], return_index=True)
+    ingredients = scramble(pairs[:, 1])
+    ends = np.append(starts[1:], len(pairs))
+    signatures = np.empty((len(recipe_ids), PERMUTATIONS), dtype=np.uint32)
+    for first in range(0, len(recipe_ids), CHUNK_RECIPES):
+        last = min(first + CHUNK_RECIPES, len(recipe_ids))
+        start, end = starts[first], ends[last - 1]
+        hashes = (ingredients[start:end, None] * HASH_A + HASH_B) % PRIME
+        signatures[first:last] = np.minimum.reduceat(
+            hashes, starts[first:last] - start, axis=0,
+        )
+    return recipe_ids, signatures
+
+
+def scramble(values: np.ndarray) -> np.ndarray:
+    """Перемешивает биты id перед линейными хэш-функциями: на подряд
+    идущих id хэши вида (a * x + b) mod PRIME заметно смещают оценку
+    коэффициента Жаккара. Возвращает значения меньше PRIME.
+    """
+    values = values.astype(np.uint64) * SCRAMBLE
+    values ^= values >> np.uint64(29)
+    return values % np.uint64(PRIME)
+
+
+def band_keys(signatures: np.ndarray) -> np.ndarray:
+    """Возвращает ключи LSH корзин (BANDS x рецепт): каждая полоса из
+    ROWS значений подписи сворачивается в одно 64-битное число.
+    """
+    bands = signatures.astype(np.uint64).reshape(-1, BANDS, ROWS)
+    return (bands * BAND_MIX).sum(axis=2, dtype=np.uint64).T
+
+
+def ingredient_pairs(recipe_ids: Optional[Iterable[int]] = None) -> np.ndarray:
+    """Читает пары (id рецепта, id ингредиента) из RecipeIngredient без
+    создания объектов моделей. Без recipe_ids читаются все рецепты.
+    """
+    queryset = RecipeIngredient.objects.order_by('recipe_id', 'ingredient_id')
+    if recipe_ids is not None:
+        queryset = queryset.filter(recipe_id__in=list(recipe_ids))
+    values = queryset.values_list('recipe_id', 'ingredient_id').iterator(
+        chunk_size=10000,
+    )
+    return np.fromiter(chain.from_iterable(values), dtype=np.int64).reshape(
+        -1, 2,
+    )
+
+
+class SimilarityIndex:
+    """Индекс похожих рецептов: MinHash подписи рецептов и LSH корзины.
+    Для каждой полосы хранятся отсортированные ключи корзин и номера
+    строк рецептов, поэтому кандидаты находятся двоичным поиском, без
+    сравнения со всеми рецептами. Массивы загружаются через mmap и
+    разделяются между воркерами через страничный кэш.
+    """
+
+    def __init__(
+        self,
+        recipe_ids: np.ndarray,
+        signatures: np.ndarray,
+        band_keys: np.ndarray,
+        band_rows: np.ndarray,
+    ) -> None:
+        self.recipe_ids = recipe_ids
+        self.signatures = signatures
+        self.band_keys = band_keys
+        self.band_rows = band_rows
+
+    @classmethod
+    def build(
+        cls: type, recipe_ids: np.ndarray, signatures: np.ndarray,
+    ) -> 'SimilarityIndex':
+        order = np.argsort(recipe_ids)
+        recipe_ids, signatures = recipe_ids[order], signatures[order]
+        keys = band_keys(signatures)
+        rows = np.argsort(keys, axis=1, kind='stable').astype(np.int32)
+        return cls(
+            recipe_ids,
+            signatures,
+            np.take_along_axis(keys, rows, axis=1),
+            rows,
+        )
+
+    @classmethod
+    def load(cls: type, directory: Path) -> 'SimilarityIndex':
+        return cls(
+            *(
+                np.load(directory / f'{name}.npy', mmap_mode='r')
+                for name in ARRAYS
+            ),
+        )
+
+    def save(self, directory: Path) -> None:
+        directory.mkdir(parents=True, exist_ok=True)
+        for name in ARRAYS:
+            np.save(directory / f'{name}.npy', getattr(self, name))
+
+    def query(
+        self, signature: np.ndarray, limit: int, exclude: int,
+    ) -> List[int]:
+        """Возвращает до limit id рецептов, отсортированных по убыванию
+        оценки коэффициента Жаккара с подписью signature. Из корзины
+        больше MAX_BUCKET рецептов берется случайная выборка, одинаковая
+        для одного ключа корзины, а не рецепты с наименьшими id.
+        """
+        if not len(self.recipe_ids):
+            return []
+        keys = band_keys(signature[None, :])[:, 0]
+        candidates = []
+        for band, key in enumerate(keys):
+            start = np.searchsorted(self.band_keys[band], key, side='left')
+            end = np.searchsorted(self.band_keys[band], key, side='right')
+            rows = self.band_rows[band, start:end]
+            if len(rows) > MAX_BUCKET:
+                rows = rows[
+                    np.random.default_rng(int(key)).choice(
+                        len(rows), MAX_BUCKET, replace=False,
+                    )
+                ]
+            candidates.append(rows)
+        rows = np.unique(np.concatenate(candidates))
+        rows = rows[self.recipe_ids[rows] != exclude]
+        if not len(rows):
+            return []
+        scores = (self.signatures[rows] == signature).mean(axis=1)
+        order = np.argsort(-scores, kind='stable')[:limit]
+        return self.recipe_ids[rows[order]].tolist()
+
+
+_index: Optional[SimilarityIndex] = None
+_loaded_version: Optional[str] = None
+_manifest: Optional[Dict] = None
+_checked_at: Optional[float] = None
+_lock = threading.Lock()
+
+
+def read_manifest() -> Optional[Dict]:
+    try:
+        with open(Path(settings.SIMILARITY_INDEX_DIR) / MANIFEST) as file:
+            return json.load(file)
+    except FileNotFoundError:
+        return None
+
+
+def get_index() -> Optional[SimilarityIndex]:
+    """Возвращает текущий индекс процесса. Манифест перечитывается не
+    чаще раза в MANIFEST_CHECK_SECONDS секунд; индекс перезагружается,
+    если команда build_similarity_index сохранила новую версию. Индекс с
+    другим числом полос не используется до пересборки.
+    """
+    global _index, _loaded_version, _manifest, _checked_at
+    now = time.monotonic()
+    if _checked_at is None or now - _checked_at >= MANIFEST_CHECK_SECONDS:
+        _manifest, _checked_at = read_manifest(), now
+    manifest = _manifest
+    if manifest is None or manifest.get('bands') != BANDS:
+        return None
+    if manifest['version'] != _loaded_version:
+        with _lock:
+            if manifest['version'] != _loaded_version:
+                _index = SimilarityIndex.load(
+                    Path(settings.SIMILARITY_INDEX_DIR) / manifest['version'],
+                )
+                _loaded_version = manifest['version']
+    return _index
+
+
+def similar_recipes(recipe_id: int, limit: int) -> List[int]:
+    """Возвращает id рецептов, похожих на рецепт recipe_id по набору
+    ингредиентов. Подпись самого рецепта вычисляется по текущим данным,
+    поэтому новые и измененные рецепты можно искать до обновления индекса.
+    """
+    index = get_index()
+    if index is None:
+        return []
+    _, signatures = compute_signatures(ingredient_pairs([recipe_id]))
+    if not len(signatures):
+        return []
+    return index.query(signatures[0], limit, exclude=recipe_id)
+
+
+def build_index(full: bool = False) -> Dict:
+    """Строит и сохраняет новую версию индекса. Без full пересчитываются
+    только новые рецепты и рецепты, документы которых обновлялись после
+    прошлой сборки, а удаленные рецепты исключаются. Версия публикуется
+    атомарной заменой файла current.json, прошлая версия сохраняется для
+    воркеров, которые еще ее используют.
+    """
+    global _checked_at
+    directory = Path(settings.SIMILARITY_INDEX_DIR)
+    started = timezone.now()
+    manifest = None if full else read_manifest()
+    if manifest is None:
+        recipe_ids, signatures = compute_signatures(ingredient_pairs())
+        changed = len(recipe_ids)
+    else:
+        previous = SimilarityIndex.load(directory / manifest['version'])
+        existing = set(Recipe.objects.values_list('id', flat=True))
+        indexed = set(previous.recipe_ids.tolist())
+        changed_ids = (existing - indexed) | set(
+            RecipeDocument.objects.filter(
+                updated__gte=datetime.fromisoformat(manifest['built_at']),
+            ).values_list('recipe_id', flat=True),
+        )
+        keep = np.isin(
+            previous.recipe_ids,
+            np.fromiter(existing - changed_ids, dtype=np.int64),
+        )
+        new_ids, new_signatures = compute_signatures(
+            ingredient_pairs(changed_ids),
+        )
+        recipe_ids = np.concatenate([previous.recipe_ids[keep], new_ids])
+        signatures = np.concatenate(
+            [previous.signatures[keep], new_signatures],
+        )
+        changed = len(changed_ids)
+    version = f'v{started.strftime("%Y%m%d%H%M%S%f")}'
+    SimilarityIndex.build(recipe_ids, signatures).save(directory / version)
+    temporary = directory / f'{MANIFEST}.tmp'
+    with open(temporary, 'w') as file:
+        json.dump(
+            {
+                'version': version,
+                'built_at': started.isoformat(),
+                'recipes': len(recipe_ids),
+                'bands': BANDS,
+            },
+            file,
+        )
+    os.replace(temporary, directory / MANIFEST)
+    _checked_at = None
+    stale = sorted(
+        path
+        for path in directory.iterdir()
+        if path.is_dir() and path.name != version
+    )
+    for path in stale[:-1]:
+        shutil.rmtree(path, ignore_errors=True)
+    return {'recipes': len(recipe_ids), 'changed': changed}
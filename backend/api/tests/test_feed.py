@@ -0,0 +1,82 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+
+from api.feed import backfill_all, fan_out, feed_recipe_ids
+from api.tests.test_toggles import create_recipes
+from recipes.models import FeedEntry
+from users.models import Subscription
+
+User = get_user_model()
+
+
+@override_settings(
+    FEED={'FANOUT_LIMIT': 2, 'BACKFILL': 50, 'HEAVY_AUTHORS_TTL': 300},
+)
+class FeedTests(TestCase):
+    def setUp(self) -> None:
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.author, *self.followers = [
+            User.objects.create_user(
+                username=f'user{number}',
+                email=f'user{number}@example.com',
+                password='secret',
+            )
+            for number in range(4)
+        ]
+        for follower in self.followers:
+            Subscription.objects.create(user=follower, author=self.author)
+
+    def publish(self) -> int:
+        recipe = create_recipes(self.author, 1)[0]
+        fan_out(recipe.id, self.author.id)
+        return recipe.id
+
+    def test_recipe_of_author_over_limit_is_merged_on_read(self) -> None:
+        recipe_id = self.publish()
+        self.assertFalse(FeedEntry.objects.exists())
+        self.assertEqual(
+            feed_recipe_ids(self.followers[0], None, 10), [recipe_id],
+        )
+
+    def test_unfanned_recipe_stays_after_followers_drop(self) -> None:
+        """Рецепт, опубликованный, пока у автора было больше
+        FANOUT_LIMIT подписчиков, не пропадает из ленты, когда
+        подписчиков становится не больше FANOUT_LIMIT // 2.
+        """
+        unfanned = self.publish()
+        Subscription.objects.filter(user__in=self.followers[1:]).delete()
+        cache.clear()
+        fanned = self.publish()
+        self.assertTrue(
+            FeedEntry.objects.filter(
+                user=self.followers[0], recipe_id=fanned,
+            ).exists(),
+        )
+        self.assertEqual(
+            feed_recipe_ids(self.followers[0], None, 10), [fanned, unfanned],
+        )
+        self.assertEqual(
+            feed_recipe_ids(self.followers[0], fanned, 10), [unfanned],
+        )
+
+    @override_settings(
+        FEED={'FANOUT_LIMIT': 6, 'BACKFILL': 2, 'HEAVY_AUTHORS_TTL': 300},
+    )
+    def test_backfill_all_fills_inboxes_of_imported_data(self) -> None:
+        """Рецепты, созданные в обход fan_out (import_data), попадают во
+        входящие подписчиков, повторный запуск не дублирует записи.
+        """
+        recipe_ids = [recipe.id for recipe in create_recipes(self.author, 3)]
+        self.assertEqual(feed_recipe_ids(self.followers[0], None, 10), [])
+        backfill_all()
+        backfill_all()
+        self.assertEqual(
+            FeedEntry.objects.count(), len(self.followers) * 2,
+        )
+        for follower in self.followers:
+            self.assertEqual(
+                feed_recipe_ids(follower, None, 10),
+                sorted(recipe_ids, reverse=True)[:2],
+            )
@@ -0,0 +1,109 @@
+from typing import List, Optional
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from api.documents import document_representations
+from api.renderers import FastJSONRenderer
+from api.representations import recipe_representations
+from api.serializers import RecipeGetSerializer
+from api.tests.test_toggles import create_recipes
+from recipes.models import (
+    Favorite,
+    Ingredient,
+    Recipe,
+    RecipeIngredient,
+    ShoppingCart,
+    Tag,
+)
+from users.models import Subscription
+
+User = get_user_model()
+
+
+class RepresentationTests(TestCase):
+    """Быстрый путь и сборка из документов рецептов выдают побайтно тот
+    же JSON, что RecipeGetSerializer со стандартным JSONRenderer.
+    """
+
+    @classmethod
+    def setUpTestData(cls: type) -> None:
+        cls.author, cls.viewer = [
+            User.objects.create_user(
+                username=name,
+                email=f'{name}@example.com',
+                password='secret',
+                first_name='Имя',
+                last_name='Фамилия',
+            )
+            for name in ('author', 'viewer')
+        ]
+        tags = [
+            Tag.objects.create(name=name, color=color, slug=slug)
+            for name, color, slug in (
+                ('Завтрак', '#E26C2D', 'breakfast'),
+                ('Ужин', '#49B64E', 'dinner'),
+            )
+        ]
+        ingredients = [
+            Ingredient.objects.create(name=name, measurement_unit='г')
+            for name in ('мука', 'ёжевика', 'соль')
+        ]
+        cls.recipes = create_recipes(cls.author, 3)
+        for number, recipe in enumerate(cls.recipes):
+            recipe.tags.set(tags[: number + 1])
+            RecipeIngredient.objects.bulk_create(
+                RecipeIngredient(
+                    recipe=recipe, ingredient=ingredient, amount=amount,
+                )
+                for amount, ingredient in enumerate(
+                    ingredients[number:], start=1,
+                )
+            )
+        Favorite.objects.create(user=cls.viewer, recipe=cls.recipes[0])
+        ShoppingCart.objects.create(user=cls.viewer, recipe=cls.recipes[1])
+        Subscription.objects.create(user=cls.viewer, author=cls.author)
+
+    def request(self, user: Optional[User]) -> Request:
+        request = APIRequestFactory().get('/api/recipes/')
+        if user is not None:
+            force_authenticate(request, user)
+        return Request(request)
+
+    def assert_same_bytes(self, user: Optional[User]) -> bytes:
+        recipe_ids: List[int] = [recipe.id for recipe in self.recipes][::-1]
+        request = self.request(user)
+        expected = JSONRenderer().render(
+            RecipeGetSerializer(
+                Recipe.objects.filter(id__in=recipe_ids).order_by('-id'),
+                many=True,
+                context={'request': request},
+            ).data,
+        )
+        for build in (recipe_representations, document_representations):
+            with self.subTest(build=build.__name__):
+                self.assertEqual(
+                    FastJSONRenderer().render(
+                        build(recipe_ids, self.request(user)),
+                    ),
+                    expected,
+                )
+        return expected
+
+    def test_anonymous_viewer(self) -> None:
+        self.assert_same_bytes(None)
+
+    def test_authenticated_viewer(self) -> None:
+        rendered = self.assert_same_bytes(self.viewer)
+        for flag in (
+            b'"is_favorited":true',
+            b'"is_in_shopping_cart":true',
+            b'"is_subscribed":true',
+        ):
+            self.assertIn(flag, rendered)
+
+    def test_author_without_favorites(self) -> None:
+        self.assert_same_bytes(self.author)
@@ -0,0 +1,137 @@
+import threading
+from collections import Counter
+from typing import Callable, List
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.db import connection, connections
+from django.test import Client, TestCase, TransactionTestCase
+from rest_framework.authtoken.models import Token
+
+from api import utils
+from recipes.models import Favorite, Recipe, ShoppingCart
+
+User = get_user_model()
+
+THREADS = 8
+
+
+def create_recipes(author: User, count: int) -> List[Recipe]:
+    return [
+        Recipe.objects.create(
+            author=author,
+            name=f'Рецепт {number}',
+            text='Описание',
+            cooking_time=10,
+            image='recipes_images/test.jpg',
+        )
+        for number in range(count)
+    ]
+
+
+class BulkLinkTests(TestCase):
+    def test_row_inserted_after_lookup_is_not_reported_created(self) -> None:
+        """Связь, вставленная другим запросом между выборкой
+        существующих связей и вставкой, получает статус exists.
+        """
+        user = User.objects.create_user(
+            username='cook', email='cook@example.com', password='secret',
+        )
+        first, second = create_recipes(user, 2)
+        insert = utils.insert_ignore_returning
+
+        def concurrent_insert(objs: List, column: str) -> set:
+            Favorite.objects.create(user=user, recipe=first)
+            return insert(objs, column)
+
+        with mock.patch.object(
+            utils, 'insert_ignore_returning', concurrent_insert,
+        ):
+            results = utils.bulk_link(
+                Favorite, Recipe, 'recipe', user, [first.id, second.id],
+            )
+        self.assertEqual(
+            results,
+            [
+                {'id': first.id, 'status': utils.EXISTS},
+                {'id': second.id, 'status': utils.CREATED},
+            ],
+        )
+
+
+class ConcurrentToggleTests(TransactionTestCase):
+    """Одновременные запросы на добавление одной связи создают ровно
+    одну строку и ровно один ответ created, без ошибок сервера.
+    """
+
+    def setUp(self) -> None:
+        if connection.vendor == 'sqlite' and connection.is_in_memory_db():
+            self.skipTest(
+                'SQLite в памяти не поддерживает одновременную запись из '
+                'потоков.',
+            )
+        self.user = User.objects.create_user(
+            username='cook', email='cook@example.com', password='secret',
+        )
+        self.token = Token.objects.create(user=self.user).key
+        self.recipes = create_recipes(self.user, 2)
+
+    def run_concurrently(self, request: Callable) -> List:
+        barrier = threading.Barrier(THREADS)
+        results, errors = [], []
+
+        def worker() -> None:
+            client = Client(
+                HTTP_HOST='localhost',
+                HTTP_AUTHORIZATION=f'Token {self.token}',
+            )
+            try:
+                barrier.wait()
+                results.append(request(client))
+            except Exception as error:
+                errors.append(error)
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=worker) for _ in range(THREADS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+        return results
+
+    def test_concurrent_favorite_creates_one_row(self) -> None:
+        recipe = self.recipes[0]
+        responses = self.run_concurrently(
+            lambda client: client.post(f'/api/recipes/{recipe.id}/favorite/'),
+        )
+        statuses = Counter(response.status_code for response in responses)
+        self.assertEqual(statuses, {201: 1, 400: THREADS - 1})
+        self.assertEqual(
+            Favorite.objects.filter(user=self.user, recipe=recipe).count(), 1,
+        )
+
+    def test_concurrent_bulk_shopping_cart_reports_one_creation(self) -> None:
+        ids = [recipe.id for recipe in self.recipes]
+        responses = self.run_concurrently(
+            lambda client: client.post(
+                '/api/recipes/bulk_shopping_cart/',
+                {'ids': ids},
+                content_type='application/json',
+            ),
+        )
+        self.assertEqual(
+            [response.status_code for response in responses],
+            [200] * THREADS,
+        )
+        created = Counter(
+            result['id']
+            for response in responses
+            for result in response.json()['results']
+            if result['status'] == 'created'
+        )
+        self.assertEqual(created, {pk: 1 for pk in ids})
+        self.assertEqual(
+            ShoppingCart.objects.filter(user=self.user).count(), len(ids),
+        )
@@ -0,0 +1,44 @@
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import update_last_login
+from django.test import TestCase
+
+from api.authentication import token_cache
+
+User = get_user_model()
+
+
+class UserTokenInvalidationTests(TestCase):
+    """Токены пользователя сбрасываются только при смене пароля,
+    деактивации или удалении.
+    """
+
+    def setUp(self) -> None:
+        self.user = User.objects.create_user(
+            username='cook', email='cook@example.com', password='secret',
+        )
+        patcher = mock.patch.object(token_cache, 'invalidate_user')
+        self.invalidate_user = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_unrelated_saves_keep_tokens(self) -> None:
+        update_last_login(None, self.user)
+        self.user.first_name = 'Имя'
+        self.user.save()
+        self.invalidate_user.assert_not_called()
+
+    def test_password_change_drops_tokens(self) -> None:
+        self.user.set_password('new-secret')
+        self.user.save()
+        self.invalidate_user.assert_called_once_with(self.user.pk)
+
+    def test_deactivation_drops_tokens(self) -> None:
+        self.user.is_active = False
+        self.user.save(update_fields=['is_active'])
+        self.invalidate_user.assert_called_once_with(self.user.pk)
+
+    def test_deletion_drops_tokens(self) -> None:
+        user_id = self.user.pk
+        self.user.delete()
+        self.invalidate_user.assert_called_once_with(user_id)
@@ -0,0 +1,46 @@
+import math
+from typing import List
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+
+from api.tests.test_toggles import create_recipes
+from api.trending import compact, update_scores, upsert_scores
+from recipes.models import Favorite, TrendingScore
+
+User = get_user_model()
+
+
+class TrendingScoreTests(TestCase):
+    def setUp(self) -> None:
+        self.user = User.objects.create_user(
+            username='cook', email='cook@example.com', password='secret',
+        )
+        self.recipes = create_recipes(self.user, 2)
+
+    def scores(self) -> List[float]:
+        return list(
+            TrendingScore.objects.order_by('recipe_id').values_list(
+                'score', flat=True,
+            ),
+        )
+
+    def test_python_fallback_matches_database_upsert(self) -> None:
+        recipe_ids = [recipe.id for recipe in self.recipes]
+        for add in (upsert_scores, update_scores):
+            with self.subTest(add=add.__name__):
+                TrendingScore.objects.all().delete()
+                add(recipe_ids[:1], 1.0)
+                add(recipe_ids, 1.0)
+                first, second = self.scores()
+                self.assertAlmostEqual(first, 1.0 + math.log(2))
+                self.assertAlmostEqual(second, 1.0)
+
+    def test_compact_replaces_scores_with_window_events(self) -> None:
+        upsert_scores([self.recipes[0].id], 5.0)
+        Favorite.objects.create(user=self.user, recipe=self.recipes[1])
+        self.assertEqual(compact(), {'recipes': 1, 'events': 1})
+        self.assertEqual(
+            list(TrendingScore.objects.values_list('recipe_id', flat=True)),
+            [self.recipes[1].id],
+        )
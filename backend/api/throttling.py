@@ -0,0 +1,141 @@
+import math
+import threading
+import time
+from collections import Counter, OrderedDict
+from typing import Dict, Optional, Tuple
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.request import Request
+from rest_framework.throttling import BaseThrottle
+
+from core import metrics
+
+DURATIONS: Dict[str, int] = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+CACHE_KEY = 'throttle:{}'
+
+
+def parse_rate(rate: str) -> Tuple[float, float]:
+    """Разбирает частоту вида '10/min' в (емкость ведра, токенов в
+    секунду). Емкость равна числу запросов за период.
+    """
+    number, period = rate.split('/')
+    capacity = float(number)
+    return capacity, capacity / DURATIONS[period[0]]
+
+
+class LocalBucketStore:
+    """Хранилище ведер в памяти воркера: без обращений к базе данных и
+    к сети, с ограниченным числом ключей.
+    """
+
+    def __init__(self, max_keys: int) -> None:
+        self.max_keys = max_keys
+        self._buckets: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def consume(
+        self, key: str, capacity: float, refill: float, cost: float,
+    ) -> float:
+        """Списывает cost токенов. Возвращает 0, если запрос разрешен,
+        иначе число секунд до накопления нужного количества токенов.
+        """
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.pop(key, (capacity, now))
+            tokens = min(capacity, tokens + (now - updated) * refill)
+            wait = 0.0
+            if tokens >= cost:
+                tokens -= cost
+            else:
+                wait = (cost - tokens) / refill
+            self._buckets[key] = (tokens, now)
+            if len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        return wait
+
+
+class CacheBucketStore:
+    """Хранилище ведер в общем кэше Django, общее для всех воркеров.
+    Чтение и запись не атомарны, поэтому при гонках возможен небольшой
+    перерасход лимита.
+    """
+
+    def consume(
+        self, key: str, capacity: float, refill: float, cost: float,
+    ) -> float:
+        now = time.time()
+        tokens, updated = cache.get(CACHE_KEY.format(key), (capacity, now))
+        tokens = min(capacity, tokens + (now - updated) * refill)
+        wait = 0.0
+        if tokens >= cost:
+            tokens -= cost
+        else:
+            wait = (cost - tokens) / refill
+        cache.set(
+            CACHE_KEY.format(key), (tokens, now), math.ceil(capacity / refill),
+        )
+        return wait
+
+
+bucket_store = (
+    CacheBucketStore()
+    if settings.THROTTLE_STORE == 'cache'
+    else LocalBucketStore(settings.THROTTLE_MAX_KEYS)
+)
+throttle_stats = Counter()
+metrics.register('throttling', lambda: dict(throttle_stats))
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """Ограничение частоты запросов алгоритмом token bucket.
+    Частота задается в THROTTLE_BUCKETS для throttle_scope представления
+    и его действия (view.action), с запасным значением 'default'.
+    Списки стоят тем больше токенов, чем больше запрошенный limit.
+    Ключ ведра - пользователь, а для анонимных запросов - IP адрес.
+    """
+
+    def allow_request(self, request: Request, view: any) -> bool:
+        rate = self.get_rate(view)
+        if rate is None:
+            return True
+        capacity, refill = parse_rate(rate)
+        user = request.user
+        ident = (
+            f'user:{user.pk}'
+            if user and user.is_authenticated
+            else f'ip:{self.get_ident(request)}'
+        )
+        key = f'{view.throttle_scope}:{view.action}:{ident}'
+        cost = min(capacity, self.get_cost(request, view))
+        self.retry_after = bucket_store.consume(key, capacity, refill, cost)
+        if self.retry_after:
+            throttle_stats[f'{view.throttle_scope}.{view.action}'] += 1
+            return False
+        return True
+
+    def get_rate(self, view: any) -> Optional[str]:
+        scope = getattr(view, 'throttle_scope', None)
+        rates = settings.THROTTLE_BUCKETS.get(scope, {})
+        return rates.get(getattr(view, 'action', None), rates.get('default'))
+
+    def get_cost(self, request: Request, view: any) -> float:
+        """Стоимость запроса в токенах: для списков - число страниц
+        по THROTTLE_PAGE_COST записей в выдаче, которую вернет пагинатор.
+        Список без пагинации стоит полное ведро.
+        """
+        if getattr(view, 'action', None) != 'list':
+            return 1
+        paginator = getattr(view, 'paginator', None)
+        if paginator is None:
+            return 1
+        if hasattr(paginator, 'get_page_size'):
+            rows = paginator.get_page_size(request)
+        else:
+            rows = paginator.get_limit(request)
+        if rows is None:
+            return math.inf
+        return max(1, math.ceil(rows / settings.THROTTLE_PAGE_COST))
+
+    def wait(self) -> Optional[float]:
+        return math.ceil(self.retry_after)
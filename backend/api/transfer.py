@@ -0,0 +1,331 @@
+import json
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from datetime import datetime
+from itertools import islice
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from django.contrib.auth import get_user_model
+from django.db import connection, transaction
+from django.utils.dateparse import parse_datetime
+
+from recipes.models import (
+    Favorite,
+    Ingredient,
+    Recipe,
+    RecipeIngredient,
+    ShoppingCart,
+    Tag,
+)
+from users.models import Subscription
+
+User = get_user_model()
+
+USER_FIELDS = (
+    'email',
+    'username',
+    'first_name',
+    'last_name',
+    'password',
+    'is_staff',
+    'is_superuser',
+    'is_active',
+    'date_joined',
+    'last_login',
+)
+DATETIME_FIELDS = ('date_joined', 'last_login', 'created')
+RECIPE_FIELDS = ('author', 'name', 'image', 'text', 'cooking_time')
+
+# Порядок выгрузки совпадает с порядком загрузки: записи ссылаются только
+# на записи предыдущих типов.
+NATURAL_KEYS = {
+    'user': (User, ('email',), USER_FIELDS),
+    'tag': (Tag, ('slug',), ('name', 'color', 'slug')),
+    'ingredient': (
+        Ingredient,
+        ('name', 'measurement_unit'),
+        ('name', 'measurement_unit'),
+    ),
+}
+RELATIONS = {
+    'favorite': (Favorite, ('user', 'recipe'), ('user', 'recipe')),
+    'shoppingcart': (ShoppingCart, ('user', 'recipe'), ('user', 'recipe')),
+    'subscription': (Subscription, ('user', 'author'), ('user', 'user')),
+}
+
+
+class Throughput:
+    """Счетчики записей и времени по типам для отчета команд."""
+
+    def __init__(self) -> None:
+        self.started = time.monotonic()
+        self.rows = Counter()
+        self.skipped = Counter()
+        self.seconds = defaultdict(float)
+
+    @contextmanager
+    def measure(self, kind: str) -> Iterator[None]:
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.seconds[kind] += time.monotonic() - started
+
+    def report(self) -> List[str]:
+        lines = []
+        for kind, seconds in self.seconds.items():
+            line = (
+                f'{kind}: {self.rows[kind]} за {seconds:.1f} с '
+                f'({self.rows[kind] / max(seconds, 1e-6):.0f} в секунду)'
+            )
+            if self.skipped[kind]:
+                line += f', пропущено {self.skipped[kind]}'
+            lines.append(line)
+        total = sum(self.rows.values())
+        elapsed = time.monotonic() - self.started
+        lines.append(
+            f'Всего: {total} за {elapsed:.1f} с '
+            f'({total / max(elapsed, 1e-6):.0f} в секунду)',
+        )
+        return lines
+
+
+def chunks(iterable: Iterable, size: int) -> Iterator[List]:
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def export_records(
+    batch_size: int, stats: Throughput,
+) -> Iterator[Dict]:
+    """Последовательно выгружает все данные как словари записей JSONL.
+    Строки читаются через iterator(), который в PostgreSQL использует
+    серверный курсор, поэтому в памяти одновременно находится не больше
+    batch_size строк. Ингредиенты и тэги рецептов читаются одним
+    запросом на пакет рецептов.
+    """
+    for kind, (model, _, fields) in NATURAL_KEYS.items():
+        with stats.measure(kind):
+            rows = model.objects.order_by('id').values('id', *fields)
+            for row in rows.iterator(chunk_size=batch_size):
+                stats.rows[kind] += 1
+                yield {'type': kind, **row}
+    with stats.measure('recipe'):
+        rows = (
+            Recipe.objects.order_by('id')
+            .values('id', *RECIPE_FIELDS)
+            .iterator(chunk_size=batch_size)
+        )
+        for chunk in chunks(rows, batch_size):
+            ids = [row['id'] for row in chunk]
+            ingredients = defaultdict(list)
+            for recipe_id, ingredient_id, amount in (
+                RecipeIngredient.objects.filter(recipe_id__in=ids)
+                .order_by('id')
+                .values_list('recipe_id', 'ingredient_id', 'amount')
+            ):
+                ingredients[recipe_id].append([ingredient_id, amount])
+            tags = defaultdict(list)
+            for recipe_id, tag_id in (
+                Recipe.tags.through.objects.filter(recipe_id__in=ids)
+                .order_by('id')
+                .values_list('recipe_id', 'tag_id')
+            ):
+                tags[recipe_id].append(tag_id)
+            for row in chunk:
+                stats.rows['recipe'] += 1
+                yield {
+                    'type': 'recipe',
+                    **row,
+                    'tags': tags[row['id']],
+                    'ingredients': ingredients[row['id']],
+                }
+    for kind, (model, fields, _) in RELATIONS.items():
+        if model is not Subscription:
+            fields += ('created',)
+        with stats.measure(kind):
+            rows = model.objects.order_by('id').values(*fields)
+            for row in rows.iterator(chunk_size=batch_size):
+                stats.rows[kind] += 1
+                yield {'type': kind, **row}
+
+
+def dump_records(records: Iterable[Dict]) -> Iterator[str]:
+    for record in records:
+        yield json.dumps(
+            record, default=datetime.isoformat, ensure_ascii=False,
+        ) + '\n'
+
+
+@contextmanager
+def preserved_timestamps() -> Iterator[None]:
+    """Отключает auto_now_add полей created на время загрузки, чтобы
+    сохранить даты добавления в избранное и список покупок.
+    """
+    fields = [
+        model._meta.get_field('created') for model in (Favorite, ShoppingCart)
+    ]
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field in fields:
+            field.auto_now_add = True
+
+
+class Importer:
+    """Загружает записи, выгруженные export_records, в текущую базу.
+    Записи одного типа накапливаются в пакеты по batch_size и
+    сохраняются через bulk_create в отдельной транзакции. Пользователи,
+    тэги и ингредиенты сопоставляются с существующими по естественным
+    ключам (email, slug, название и единица измерения), рецепты всегда
+    создаются заново. Ссылки на id исходной базы переводятся в id новой
+    базы, записи со ссылками на отсутствующие объекты пропускаются.
+    """
+
+    def __init__(self, batch_size: int, stats: Throughput) -> None:
+        self.batch_size = batch_size
+        self.stats = stats
+        self.ids: Dict[str, Dict[int, int]] = defaultdict(dict)
+
+    def load(self, lines: Iterable[str]) -> None:
+        kind, batch = None, []
+        with preserved_timestamps():
+            for line in lines:
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                if record['type'] != kind or len(batch) >= self.batch_size:
+                    self.flush(kind, batch)
+                    kind, batch = record['type'], []
+                batch.append(record)
+            self.flush(kind, batch)
+
+    def flush(self, kind: Optional[str], records: List[Dict]) -> None:
+        if not records:
+            return
+        if kind in NATURAL_KEYS:
+            handler = self.merge
+        elif kind == 'recipe':
+            handler = self.create_recipes
+        else:
+            handler = self.link
+        with self.stats.measure(kind), transaction.atomic():
+            handler(kind, records)
+
+    def merge(self, kind: str, records: List[Dict]) -> None:
+        """Сопоставляет записи с существующими объектами по естественному
+        ключу и создает недостающие.
+        """
+        model, keys, fields = NATURAL_KEYS[kind]
+        for record in records:
+            for field in DATETIME_FIELDS:
+                if record.get(field):
+                    record[field] = parse_datetime(record[field])
+        existing = self.existing(model, keys, records)
+        model.objects.bulk_create(
+            [
+                model(**{field: record[field] for field in fields})
+                for record in records
+                if natural_key(record, keys) not in existing
+            ],
+            ignore_conflicts=True,
+        )
+        existing = self.existing(model, keys, records)
+        for record in records:
+            new_id = existing.get(natural_key(record, keys))
+            if new_id is None:
+                self.stats.skipped[kind] += 1
+            else:
+                self.ids[kind][record['id']] = new_id
+                self.stats.rows[kind] += 1
+
+    @staticmethod
+    def existing(
+        model: type, keys: Tuple[str], records: List[Dict],
+    ) -> Dict[Tuple, int]:
+        rows = model.objects.filter(
+            **{f'{keys[0]}__in': {record[keys[0]] for record in records}},
+        ).values('id', *keys)
+        return {natural_key(row, keys): row['id'] for row in rows}
+
+    def create_recipes(self, kind: str, records: List[Dict]) -> None:
+        """Создает рецепты с их ингредиентами и тэгами. Изображения
+        переносятся ссылкой на файл в хранилище. На базах без RETURNING
+        в bulk_create (SQLite) рецепты сохраняются по одному.
+        """
+        recipes, sources = [], []
+        for record in records:
+            author_id = self.ids['user'].get(record['author'])
+            if author_id is None:
+                self.stats.skipped[kind] += 1
+                continue
+            recipes.append(
+                Recipe(
+                    author_id=author_id,
+                    **{
+                        field: record[field]
+                        for field in RECIPE_FIELDS
+                        if field != 'author'
+                    },
+                ),
+            )
+            sources.append(record)
+        if connection.features.can_return_rows_from_bulk_insert:
+            Recipe.objects.bulk_create(recipes)
+        else:
+            for recipe in recipes:
+                recipe.save(force_insert=True)
+        links, tags = [], []
+        for recipe, record in zip(recipes, sources):
+            self.ids[kind][record['id']] = recipe.pk
+            self.stats.rows[kind] += 1
+            for ingredient_id, amount in record['ingredients']:
+                ingredient_id = self.ids['ingredient'].get(ingredient_id)
+                if ingredient_id is not None:
+                    links.append(
+                        RecipeIngredient(
+                            recipe_id=recipe.pk,
+                            ingredient_id=ingredient_id,
+                            amount=amount,
+                        ),
+                    )
+            tags.extend(
+                Recipe.tags.through(
+                    recipe_id=recipe.pk, tag_id=self.ids['tag'][tag_id],
+                )
+                for tag_id in record['tags']
+                if tag_id in self.ids['tag']
+            )
+        RecipeIngredient.objects.bulk_create(links, batch_size=1000)
+        Recipe.tags.through.objects.bulk_create(tags, batch_size=1000)
+
+    def link(self, kind: str, records: List[Dict]) -> None:
+        """Создает связи избранного, списка покупок и подписок. Уже
+        существующие связи пропускаются ограничениями уникальности.
+        """
+        model, fields, targets = RELATIONS[kind]
+        objects = []
+        for record in records:
+            values = {
+                f'{field}_id': self.ids[target].get(record[field])
+                for field, target in zip(fields, targets)
+            }
+            if None in values.values():
+                self.stats.skipped[kind] += 1
+                continue
+            if record.get('created'):
+                values['created'] = parse_datetime(record['created'])
+            objects.append(model(**values))
+        model.objects.bulk_create(objects, ignore_conflicts=True)
+        self.stats.rows[kind] += len(objects)
+
+
+def natural_key(values: Dict, keys: Tuple[str]) -> Tuple:
+    return tuple(values[key] for key in keys)
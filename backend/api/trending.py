@@ -0,0 +1,160 @@
+import math
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional
+
+from django.conf import settings
+from django.db import DatabaseError, connection, transaction
+from django.db.models import Count
+from django.db.models.functions import TruncHour
+from django.utils import timezone
+
+from core import metrics
+from recipes.models import Favorite, ShoppingCart, TrendingScore
+
+SOURCES = (Favorite, ShoppingCart)
+UPSERT_VENDORS = ('postgresql', 'sqlite')
+
+stats = Counter()
+metrics.register('trending', lambda: dict(stats))
+
+
+def decay_rate() -> float:
+    """Скорость затухания в секунду по периоду полураспада."""
+    return math.log(2) / (settings.TRENDING['HALF_LIFE_HOURS'] * 3600)
+
+
+def event_weight(model: type, moment: Optional[datetime] = None) -> float:
+    """Натуральный логарифм веса добавления рецепта в model в момент
+    moment относительно TRENDING['EPOCH']. Вес удваивается каждые
+    HALF_LIFE_HOURS, что равносильно затуханию всех прошлых событий; в
+    логарифмах он растет линейно и не переполняется при любом периоде.
+    """
+    moment = moment or timezone.now()
+    epoch = datetime.fromisoformat(settings.TRENDING['EPOCH'])
+    return math.log(
+        settings.TRENDING['WEIGHTS'][model._meta.model_name],
+    ) + decay_rate() * (moment - epoch).total_seconds()
+
+
+def log_sum(weights: Iterable[float]) -> float:
+    """Логарифм суммы весов, заданных логарифмами."""
+    weights = list(weights)
+    top = max(weights)
+    return top + math.log(sum(math.exp(weight - top) for weight in weights))
+
+
+def record_events(model: type, recipe_ids: Iterable[int]) -> None:
+    """После фиксации транзакции увеличивает рейтинг рецептов recipe_ids
+    на вес добавления в model одним запросом INSERT ... ON CONFLICT DO
+    UPDATE: одновременные добавления одного рецепта не теряются. Ошибка
+    пересчета рейтинга не влияет на ответ уже выполненного запроса.
+    """
+    recipe_ids = sorted(set(recipe_ids))
+    if recipe_ids:
+        transaction.on_commit(lambda: add_scores(model, recipe_ids))
+
+
+def add_scores(model: type, recipe_ids: List[int]) -> None:
+    weight = event_weight(model)
+    try:
+        if connection.vendor in UPSERT_VENDORS:
+            upsert_scores(recipe_ids, weight)
+        else:
+            update_scores(recipe_ids, weight)
+    except DatabaseError:
+        stats['errors'] += 1
+
+
+def upsert_scores(recipe_ids: List[int], weight: float) -> None:
+    """Прибавляет вес к рейтингу в базе данных: LN и EXP есть в
+    PostgreSQL, в SQLite их регистрирует Django.
+    """
+    table = connection.ops.quote_name(TrendingScore._meta.db_table)
+    score = f'{table}.score'
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {table} (recipe_id, score) VALUES '
+            + ', '.join(['(%s, %s)'] * len(recipe_ids))
+            + ' ON CONFLICT (recipe_id) DO UPDATE SET score = CASE WHEN '
+            f'{score} > excluded.score THEN {score} ELSE excluded.score '
+            f'END + LN(1 + EXP(-ABS({score} - excluded.score)))',
+            [value for pk in recipe_ids for value in (pk, weight)],
+        )
+
+
+def update_scores(recipe_ids: List[int], weight: float) -> None:
+    """Прибавляет вес к рейтингу в Python под блокировкой строк для
+    остальных баз данных.
+    """
+    with transaction.atomic():
+        current = dict(
+            TrendingScore.objects.select_for_update()
+            .filter(recipe_id__in=recipe_ids)
+            .values_list('recipe_id', 'score'),
+        )
+        TrendingScore.objects.bulk_create(
+            [
+                TrendingScore(recipe_id=pk, score=weight)
+                for pk in recipe_ids
+                if pk not in current
+            ],
+        )
+        for pk, score in current.items():
+            TrendingScore.objects.filter(pk=pk).update(
+                score=log_sum([score, weight]),
+            )
+
+
+def compact() -> Dict[str, int]:
+    """Пересчитывает рейтинг по событиям за TRENDING['WINDOW_DAYS'] дней
+    и заменяет им таблицу TrendingScore. События группируются по часам
+    в базе данных, удаленные из избранного и списка покупок рецепты
+    перестают учитываться, а рецепты без событий в окне удаляются из
+    рейтинга. Таблица блокируется от add_scores до чтения событий:
+    события, записанные во время пересчета, не теряются и не вызывают
+    конфликта ключей при вставке.
+    """
+    since = timezone.now() - timedelta(days=settings.TRENDING['WINDOW_DAYS'])
+    scores = defaultdict(list)
+    events = 0
+    with transaction.atomic():
+        lock_scores()
+        TrendingScore.objects.all().delete()
+        for model in SOURCES:
+            buckets = (
+                model.objects.filter(created__gte=since)
+                .annotate(hour=TruncHour('created'))
+                .order_by()
+                .values('recipe_id', 'hour')
+                .annotate(count=Count('id'))
+            )
+            for bucket in buckets:
+                scores[bucket['recipe_id']].append(
+                    math.log(bucket['count'])
+                    + event_weight(
+                        model, bucket['hour'] + timedelta(minutes=30),
+                    ),
+                )
+                events += bucket['count']
+        TrendingScore.objects.bulk_create(
+            [
+                TrendingScore(recipe_id=recipe_id, score=log_sum(weights))
+                for recipe_id, weights in scores.items()
+            ],
+            batch_size=1000,
+        )
+    return {'recipes': len(scores), 'events': events}
+
+
+def lock_scores() -> None:
+    """Блокирует запись в TrendingScore до конца транзакции. В SQLite
+    запись и так блокируется первым изменением в транзакции (DELETE).
+    """
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'LOCK TABLE '
+                f'{connection.ops.quote_name(TrendingScore._meta.db_table)}'
+                ' IN SHARE ROW EXCLUSIVE MODE',
+            )
@@ -3,7 +3,13 @@ from django.conf.urls.static import static
 from django.urls import include, path
 from rest_framework.routers import DefaultRouter
 
-from api.views import IngredientViewSet, RecipeViewSet, TagViewSet, UserViewSet
+from api.views import (
+    IngredientViewSet,
+    RecipeViewSet,
+    TagViewSet,
+    UserViewSet,
+    metrics_view,
+)
 
 app_name = 'api'
 
@@ -15,10 +21,48 @@ router.register('users', UserViewSet, basename='users')
 
 urlpatterns = [
     path('auth/', include('djoser.urls.authtoken')),
+    path('metrics/', metrics_view, name='metrics'),
     path('', include(router.urls)),
     path('', include('djoser.urls')),
 ]
 
+if settings.ASYNC_READ_VIEWS:
+    from api.async_views import async_read_view
+
+    urlpatterns = [
+        path(
+            'tags/',
+            async_read_view(TagViewSet.as_view({'get': 'list'})),
+            name='tags-list',
+        ),
+        path(
+            'ingredients/',
+            async_read_view(IngredientViewSet.as_view({'get': 'list'})),
+            name='ingredients-list',
+        ),
+        path(
+            'recipes/',
+            async_read_view(
+                RecipeViewSet.as_view({'get': 'list', 'post': 'create'}),
+            ),
+            name='recipes-list',
+        ),
+        path(
+            'recipes/<int:pk>/',
+            async_read_view(
+                RecipeViewSet.as_view(
+                    {
+                        'get': 'retrieve',
+                        'put': 'update',
+                        'patch': 'partial_update',
+                        'delete': 'destroy',
+                    },
+                ),
+            ),
+            name='recipes-detail',
+        ),
+    ] + urlpatterns
+
 if settings.DEBUG:
     urlpatterns += static(
         settings.MEDIA_URL,
@@ -0,0 +1,145 @@
+from typing import Dict, Iterable, List, Set
+
+from django.contrib.auth import get_user_model
+from django.db import connections, router
+from django.db.models import Model
+from django.db.models.sql import InsertQuery
+from django.shortcuts import get_object_or_404
+from rest_framework import status
+from rest_framework.request import Request
+from rest_framework.response import Response
+
+User = get_user_model()
+
+CREATED = 'created'
+DELETED = 'deleted'
+EXISTS = 'exists'
+ABSENT = 'absent'
+NOT_FOUND = 'not_found'
+SELF = 'self'
+
+
+def bulk_link(
+    model: type,
+    target_model: type,
+    target_field: str,
+    user: User,
+    ids: Iterable[int],
+    delete: bool = False,
+    exclude: Iterable[int] = (),
+) -> List[Dict]:
+    """Добавляет (или удаляет при delete=True) связи пользователя user с
+    объектами target_model из списка ids через модель model за
+    постоянное число запросов: проверка существования объектов, выборка
+    уже существующих связей и один INSERT или DELETE. Статус created
+    получают только связи, которые вставил этот запрос, а не связи,
+    вставленные одновременным запросом после выборки.
+    Возвращает результат для каждого id в исходном порядке.
+    """
+    ids = list(dict.fromkeys(ids))
+    exclude = set(exclude)
+    found = set(
+        target_model.objects.filter(id__in=ids).values_list('id', flat=True),
+    ) - exclude
+    target_id = f'{target_field}_id'
+    linked = set(
+        model.objects.filter(
+            user=user, **{f'{target_id}__in': found},
+        ).values_list(target_id, flat=True),
+    )
+    if delete:
+        if linked:
+            model.objects.filter(
+                user=user, **{f'{target_id}__in': linked},
+            ).delete()
+        done, skipped, pending = DELETED, ABSENT, linked
+    else:
+        pending = insert_ignore_returning(
+            [model(user=user, **{target_id: pk}) for pk in found - linked],
+            target_id,
+        )
+        done, skipped = CREATED, EXISTS
+    results = []
+    for pk in ids:
+        if pk in exclude:
+            status = SELF
+        elif pk not in found:
+            status = NOT_FOUND
+        else:
+            status = done if pk in pending else skipped
+        results.append({'id': pk, 'status': status})
+    return results
+
+
+def insert_ignore_returning(objs: List[Model], column: str) -> Set:
+    """Вставляет объекты одним запросом INSERT ... ON CONFLICT DO
+    NOTHING RETURNING column и возвращает значения column только для
+    реально вставленных строк.
+    """
+    if not objs:
+        return set()
+    model = type(objs[0])
+    using = router.db_for_write(model)
+    connection = connections[using]
+    fields = [
+        field for field in model._meta.concrete_fields if not field.primary_key
+    ]
+    query = InsertQuery(model, ignore_conflicts=True)
+    query.insert_values(fields, objs)
+    returned = set()
+    with connection.cursor() as cursor:
+        for sql, params in query.get_compiler(using=using).as_sql():
+            cursor.execute(
+                f'{sql} RETURNING {connection.ops.quote_name(column)}', params,
+            )
+            returned.update(row[0] for row in cursor.fetchall())
+    return returned
+
+
+def insert_ignore(obj: Model) -> bool:
+    """Сохраняет новый объект одним запросом INSERT ... ON CONFLICT DO
+    NOTHING (INSERT OR IGNORE в SQLite). Возвращает False, если строка
+    не вставлена из-за нарушения уникальности, без IntegrityError.
+    """
+    return bool(insert_ignore_returning([obj], 'id'))
+
+
+def toggle_link(
+    request: Request,
+    model: type,
+    target_model: type,
+    target_field: str,
+    pk: any,
+    serializer_class: type,
+    exists_error: str,
+    absent_error: str,
+) -> Response:
+    """Общая логика действий добавления и удаления связи текущего
+    пользователя с объектом (избранное, список покупок, подписка).
+    POST вставляет связь одним запросом INSERT ... ON CONFLICT DO NOTHING
+    и по числу вставленных строк возвращает 201 или 400. DELETE удаляет
+    связь одним запросом DELETE и по числу удаленных строк возвращает 204
+    или 400. Отсутствующий объект дает 404. Одновременные повторные
+    запросы не приводят к IntegrityError.
+    """
+    user = request.user
+    if request.method == 'POST':
+        target = get_object_or_404(target_model, pk=pk)
+        if insert_ignore(model(user=user, **{target_field: target})):
+            serializer = serializer_class(target, context={'request': request})
+            return Response(
+                data=serializer.data,
+                status=status.HTTP_201_CREATED,
+            )
+        return Response(
+            {'error': exists_error}, status=status.HTTP_400_BAD_REQUEST,
+        )
+    deleted, _ = model.objects.filter(
+        user=user, **{f'{target_field}_id': pk},
+    ).delete()
+    if deleted:
+        return Response(status=status.HTTP_204_NO_CONTENT)
+    get_object_or_404(target_model, pk=pk)
+    return Response(
+        {'error': absent_error}, status=status.HTTP_400_BAD_REQUEST,
+    )
@@ -0,0 +1,58 @@
+from typing import Dict, Iterable
+
+from django.contrib.auth import get_user_model
+from django.db.models import F
+
+from recipes.models import Favorite, ShoppingCart
+from users.models import Subscription
+
+User = get_user_model()
+
+
+def bump_state(user_ids: Iterable[int]) -> None:
+    """Увеличивает версию состояния пользователей user_ids после
+    изменения их избранного, списка покупок или подписок. Версия хранится
+    в базе данных, поэтому одинакова для всех воркеров.
+    """
+    user_ids = set(user_ids)
+    if user_ids:
+        User.objects.filter(id__in=user_ids).update(
+            state_version=F('state_version') + 1,
+        )
+
+
+def state_version(user: User) -> int:
+    """Читает текущую версию из базы данных: объект пользователя запроса
+    может быть взят из кэша токенов.
+    """
+    return (
+        User.objects.filter(id=user.id)
+        .values_list('state_version', flat=True)
+        .get()
+    )
+
+
+def viewer_state(user: User, version: int) -> Dict:
+    """Возвращает отсортированные id рецептов в избранном и списке
+    покупок пользователя и id авторов, на которых он подписан. Версия
+    должна быть прочитана до списков: тогда ответ не может оказаться
+    старше своей версии.
+    """
+    return {
+        'version': version,
+        'favorites': list(
+            Favorite.objects.filter(user=user)
+            .order_by('recipe_id')
+            .values_list('recipe_id', flat=True),
+        ),
+        'shopping_cart': list(
+            ShoppingCart.objects.filter(user=user)
+            .order_by('recipe_id')
+            .values_list('recipe_id', flat=True),
+        ),
+        'subscriptions': list(
+            Subscription.objects.filter(user=user)
+            .order_by('author_id')
+            .values_list('author_id', flat=True),
+        ),
+    }
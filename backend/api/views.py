@@ -1,24 +1,42 @@
 import io
-from typing import Dict, List
+from typing import Dict, List, Optional, Tuple
 
+from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.db.models import Sum
+from django.db.models import QuerySet, Sum
 from django.http import FileResponse, HttpResponse
 from django.shortcuts import get_object_or_404
+from django.utils.http import parse_etags, quote_etag
 from django_filters.rest_framework import DjangoFilterBackend
 from djoser.views import UserViewSet as DjoserUserViewSet
 from rest_framework import permissions, status, viewsets
-from rest_framework.decorators import action
-from rest_framework.filters import OrderingFilter, SearchFilter
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.decorators import action, api_view, permission_classes
+from rest_framework.exceptions import ValidationError
+from rest_framework.pagination import BasePagination
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
 from rest_framework.request import Request
 from rest_framework.response import Response
 from rest_framework.serializers import Serializer
 
-from api.filters import RecipeFilter
-from api.paginations import CustomPagination
+from api.bundle import read_manifest
+from api.documents import document_representations
+from api.facets import recipe_facets
+from api.feed import backfill, cleanup, feed_recipe_ids
+from api.filters import (
+    TRENDING,
+    IngredientSearchFilter,
+    RecipeFilter,
+    RecipeOrderingFilter,
+)
+from api.paginations import (
+    CustomPagination,
+    FeedCursorPagination,
+    TrendingCursorPagination,
+)
 from api.permissions import IsAdminOwnerOrReadOnly
+from api.representations import RECIPE_COLUMNS, recipe_representations
 from api.serializers import (
+    BulkIdsSerializer,
     IngredientSerializer,
     RecipeCartFavoriteSerializer,
     RecipeGetSerializer,
@@ -27,6 +45,13 @@ from api.serializers import (
     UserSerializer,
     UserSubscriptionSerializer,
 )
+from api.similarity import similar_recipes
+from api.throttling import TokenBucketThrottle
+from api.trending import record_events
+from api.utils import CREATED, DELETED, bulk_link, toggle_link
+from api.viewer_state import bump_state, state_version, viewer_state
+from core import metrics
+from core.db.routers import ReplicaReadMixin
 from recipes.models import (
     Favorite,
     Ingredient,
@@ -40,7 +65,7 @@ from users.models import Subscription
 User = get_user_model()
 
 
-class TagViewSet(viewsets.ReadOnlyModelViewSet):
+class TagViewSet(ReplicaReadMixin, viewsets.ReadOnlyModelViewSet):
     """Viewset для работы с моделью Tag.
     Разрешены действия только для получения списка элементов list()
     и отдельного элемента retrieve() для получения одного модели Tag.
@@ -50,7 +75,9 @@ class TagViewSet(viewsets.ReadOnlyModelViewSet):
     serializer_class = TagSerializer
 
 
-class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
+class IngredientViewSet(
+    ReplicaReadMixin, viewsets.ReadOnlyModelViewSet,
+):
     """Viewset для работы с моделью Ingredient.
     Разрешены действия только для получения списка элементов list()
     и для получения отдельного элемента - retrieve() модели Ingredient.
@@ -58,15 +85,32 @@ class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
 
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
-    filter_backends = (SearchFilter,)
-    search_fields = ('^name',)
+    filter_backends = (IngredientSearchFilter,)
+
+    @action(detail=False)
+    def bundle(self, request: Request) -> Response:
+        """Определяет URL-путь для получения текущей версии статического
+        каталога ингредиентов.
+        Запрос к эндпоинту /bundle/. Возвращает версию, адрес файла
+        каталога, число ингредиентов и размер файла. Клиент загружает
+        каталог один раз и ищет ингредиенты у себя.
+        """
+        manifest = read_manifest()
+        if manifest is None:
+            return Response(
+                {'error': 'Каталог ингредиентов еще не собран.'},
+                status=status.HTTP_404_NOT_FOUND,
+            )
+        return Response(manifest, headers={'Cache-Control': 'max-age=60'})
 
 
-class UserViewSet(DjoserUserViewSet):
+class UserViewSet(ReplicaReadMixin, DjoserUserViewSet):
     """Viewset для работы с моделью User."""
 
     pagination_class = CustomPagination
     serializer_class = UserSerializer
+    throttle_classes = (TokenBucketThrottle,)
+    throttle_scope = 'users'
 
     @action(detail=False, permission_classes=(permissions.IsAuthenticated,))
     def subscriptions(self, request: Request) -> Response:
@@ -98,62 +142,215 @@ class UserViewSet(DjoserUserViewSet):
         текущего пользователя и DELETE запросы на удаление автора рецепта из
         подписок текущего пользователи.
         """
-        user = self.request.user
-        author = get_object_or_404(User, pk=id)
-        if request.method == 'POST':
-            if (
-                user != author
-                and not Subscription.objects.filter(
-                    user=user,
-                    author=author,
-                ).exists()
-            ):
-                Subscription.objects.create(
-                    user=user,
-                    author=author,
-                )
-                serializer = UserSubscriptionSerializer(
-                    author,
-                    context={'request': request},
-                )
-                return Response(
-                    data=serializer.data,
-                    status=status.HTTP_201_CREATED,
-                )
-            else:
-                message: Dict[str, str] = {
-                    'error': 'Вы уже подписаны на автора.',
-                }
-                return Response(message, status=status.HTTP_400_BAD_REQUEST)
+        if request.method == 'POST' and str(request.user.pk) == str(id):
+            message: Dict[str, str] = {
+                'error': 'Подписка на себя недопустима.',
+            }
+            return Response(message, status=status.HTTP_400_BAD_REQUEST)
+        response = toggle_link(
+            request,
+            Subscription,
+            User,
+            'author',
+            id,
+            UserSubscriptionSerializer,
+            exists_error='Вы уже подписаны на автора.',
+            absent_error='Вы не подписаны на автора.',
+        )
+        if response.status_code == status.HTTP_201_CREATED:
+            backfill(request.user, [int(id)])
+            bump_state([request.user.id])
+        elif response.status_code == status.HTTP_204_NO_CONTENT:
+            cleanup(request.user, [int(id)])
+            bump_state([request.user.id])
+        return response
 
+    @action(
+        methods=['post', 'delete'],
+        detail=False,
+        permission_classes=(permissions.IsAuthenticated,),
+    )
+    def bulk_subscribe(self, request: Request) -> Response:
+        """Определяет URL-путь для массовой подписки на авторов.
+        Запрос к эндпоинту /bulk_subscribe/ со списком id авторов в поле ids.
+        POST-запрос подписывает текущего пользователя на авторов, DELETE
+        запрос отменяет подписки. Возвращает результат для каждого id.
+        """
+        serializer = BulkIdsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        results = bulk_link(
+            Subscription,
+            User,
+            'author',
+            request.user,
+            serializer.validated_data['ids'],
+            delete=request.method == 'DELETE',
+            exclude=(request.user.id,),
+        )
+        changed = [
+            result['id']
+            for result in results
+            if result['status'] in (CREATED, DELETED)
+        ]
         if request.method == 'DELETE':
-            if Subscription.objects.filter(
-                user=user,
-                author=author,
-            ).exists():
-                follow = get_object_or_404(
-                    Subscription,
-                    user=user,
-                    author=author,
-                )
-                follow.delete()
-                return Response(status=status.HTTP_204_NO_CONTENT)
-            else:
-                message: Dict[str, str] = {
-                    'error': 'Вы не подписаны на автора.',
-                }
-                return Response(message, status=status.HTTP_400_BAD_REQUEST)
+            cleanup(request.user, changed)
+        else:
+            backfill(request.user, changed)
+        if changed:
+            bump_state([request.user.id])
+        return Response({'results': results})
+
+    @action(detail=False, permission_classes=(permissions.IsAuthenticated,))
+    def state(self, request: Request) -> Response:
+        """Определяет URL-путь для получения состояния текущего
+        пользователя: отсортированных id рецептов в избранном и списке
+        покупок и id авторов, на которых он подписан.
+        Запрос к эндпоинту /state/. Ответ содержит версию состояния,
+        которая увеличивается при каждом изменении, и ETag с ней; при
+        совпадении If-None-Match возвращается 304 без чтения списков.
+        """
+        version = state_version(request.user)
+        etag = quote_etag(str(version))
+        headers = {'ETag': etag, 'Cache-Control': 'private, no-cache'}
+        if etag in parse_etags(request.headers.get('If-None-Match', '')):
+            return Response(
+                status=status.HTTP_304_NOT_MODIFIED, headers=headers,
+            )
+        return Response(viewer_state(request.user, version), headers=headers)
 
 
-class RecipeViewSet(viewsets.ModelViewSet):
+class RecipeViewSet(ReplicaReadMixin, viewsets.ModelViewSet):
     """Viewset для работы с моделью Recipe."""
 
     queryset = Recipe.objects.all()
     permission_classes = (IsAdminOwnerOrReadOnly,)
     pagination_class = CustomPagination
-    filter_backends = (DjangoFilterBackend, OrderingFilter)
+    filter_backends = (DjangoFilterBackend, RecipeOrderingFilter)
     filterset_class = RecipeFilter
     ordering = ('-id',)
+    throttle_classes = (TokenBucketThrottle,)
+    throttle_scope = 'recipes'
+
+    @property
+    def paginator(self) -> Optional[BasePagination]:
+        """Для ?ordering=trending использует пагинацию по ключу."""
+        if not hasattr(self, '_paginator'):
+            trending = (
+                self.action == 'list'
+                and self.request.query_params.get('ordering') == TRENDING
+            )
+            self._paginator = (
+                TrendingCursorPagination()
+                if trending
+                else self.pagination_class()
+            )
+        return self._paginator
+
+    def get_fields(self) -> Optional[Tuple[str]]:
+        """Возвращает набор полей рецепта из параметра запроса fields
+        (например, ?fields=name,image) в порядке полей RecipeGetSerializer
+        или None, если параметр не передан. Поле id возвращается всегда.
+        """
+        value = self.request.query_params.get('fields')
+        if not value or self.action not in (
+            'list',
+            'retrieve',
+            'feed',
+            'similar',
+        ):
+            return None
+        requested = {name.strip() for name in value.split(',')} - {''}
+        unknown = requested - set(RecipeGetSerializer.Meta.fields)
+        if unknown:
+            raise ValidationError(
+                {'fields': f'Неизвестные поля: {", ".join(sorted(unknown))}.'},
+            )
+        return tuple(
+            name
+            for name in RecipeGetSerializer.Meta.fields
+            if name == 'id' or name in requested
+        )
+
+    def get_queryset(self) -> QuerySet:
+        """Для получения рецептов загружает только нужные столбцы и
+        связи: text и другие поля вне набора fields не читаются, а связи
+        автора, тэгов и ингредиентов подгружаются только если они нужны.
+        """
+        queryset = super().get_queryset()
+        if self.action not in ('list', 'retrieve') or (
+            self.action == 'list' and settings.RECIPE_FAST_PATH
+        ):
+            return queryset
+        fields = self.get_fields() or RecipeGetSerializer.Meta.fields
+        columns = ['id', *(name for name in fields if name in RECIPE_COLUMNS)]
+        if 'author' in fields:
+            queryset = queryset.select_related('author')
+            columns.append('author')
+        if 'tags' in fields:
+            queryset = queryset.prefetch_related('tags')
+        if 'ingredients' in fields:
+            queryset = queryset.prefetch_related(
+                'recipe_ingredients__ingredient',
+            )
+        return queryset.only(*columns)
+
+    def get_serializer_context(self) -> Dict:
+        context = super().get_serializer_context()
+        context['fields'] = self.get_fields()
+        return context
+
+    def list(self, request: Request, *args: any, **kwargs: any) -> Response:
+        """Возвращает список рецептов.
+        При включенном RECIPE_FAST_PATH представления рецептов страницы
+        строятся из строк .values() без ModelSerializer, а при включенном
+        RECIPE_DOCUMENTS - из сохраненных документов рецептов. С параметром
+        ?facets=1 к странице добавляется число рецептов по тэгам и времени
+        приготовления из индекса фасетов; список без пагинации при этом
+        возвращается в поле results.
+        """
+        response = self.list_page(request, *args, **kwargs)
+        if request.query_params.get('facets') in ('1', 'true', 'True'):
+            if isinstance(response.data, list):
+                response.data = {
+                    'count': len(response.data),
+                    'results': response.data,
+                }
+            response.data['facets'] = self.get_facets()
+        return response
+
+    def list_page(
+        self, request: Request, *args: any, **kwargs: any,
+    ) -> Response:
+        if not settings.RECIPE_FAST_PATH:
+            return super().list(request, *args, **kwargs)
+        represent = (
+            document_representations
+            if settings.RECIPE_DOCUMENTS
+            else recipe_representations
+        )
+        fields = self.get_fields()
+        queryset = self.filter_queryset(self.get_queryset()).values_list(
+            'id', flat=True,
+        )
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(
+                represent(page, request, fields),
+            )
+        return Response(represent(queryset, request, fields))
+
+    def get_facets(self) -> Dict:
+        """Фасеты для фильтров запроса. Параметры проверяются тем же
+        RecipeFilter, что и список, поэтому с ошибкой в параметрах ответ
+        списка не доходит до этого метода.
+        """
+        filterset = RecipeFilter(
+            self.request.query_params,
+            queryset=Recipe.objects.none(),
+            request=self.request,
+        )
+        filterset.is_valid()
+        return recipe_facets(self.request.user, filterset.form.cleaned_data)
 
     def perform_create(self, serializer: Serializer) -> None:
         serializer.save(author=self.request.user)
@@ -180,45 +377,24 @@ class RecipeViewSet(viewsets.ModelViewSet):
         Поддерживает только POST-запросы добавления рецепта в корзину и
         DELETE запросы на удаление рецепта из корзины покупок.
         """
-        user = request.user
-        recipe = get_object_or_404(Recipe, id=pk)
-        if request.method == 'POST':
-            if not ShoppingCart.objects.filter(
-                user=user,
-                recipe=recipe,
-            ).exists():
-                ShoppingCart.objects.create(user=user, recipe=recipe)
-                serializer = RecipeCartFavoriteSerializer(
-                    recipe,
-                    context={'request': request},
-                )
-                return Response(
-                    data=serializer.data,
-                    status=status.HTTP_201_CREATED,
-                )
-            else:
-                message: Dict[str, str] = {
-                    'error': 'Рецепт уже добавлен в список покупок.',
-                }
-                return Response(message, status=status.HTTP_400_BAD_REQUEST)
-
-        elif request.method == 'DELETE':
-            if not ShoppingCart.objects.filter(
-                user=user,
-                recipe=recipe,
-            ).exists():
-                message: Dict[str, str] = {
-                    'error': 'Рецепта нет в списке покупок.',
-                }
-                return Response(message, status=status.HTTP_400_BAD_REQUEST)
-            else:
-                shoppig_cart = get_object_or_404(
-                    ShoppingCart,
-                    user=user,
-                    recipe=recipe,
-                )
-                shoppig_cart.delete()
-                return Response(status=status.HTTP_204_NO_CONTENT)
+        response = toggle_link(
+            request,
+            ShoppingCart,
+            Recipe,
+            'recipe',
+            pk,
+            RecipeCartFavoriteSerializer,
+            exists_error='Рецепт уже добавлен в список покупок.',
+            absent_error='Рецепта нет в списке покупок.',
+        )
+        if response.status_code == status.HTTP_201_CREATED:
+            record_events(ShoppingCart, [pk])
+        if response.status_code in (
+            status.HTTP_201_CREATED,
+            status.HTTP_204_NO_CONTENT,
+        ):
+            bump_state([request.user.id])
+        return response
 
     @action(
         methods=('post', 'delete'),
@@ -237,37 +413,123 @@ class RecipeViewSet(viewsets.ModelViewSet):
         Поддерживает только POST-запросы добавления рецепта в избранное и
         DELETE запросы на удаление рецепта из избранного.
         """
-        recipe = get_object_or_404(Recipe, id=pk)
-        user = request.user
-        if request.method == 'POST':
-            if not Favorite.objects.filter(user=user, recipe=recipe).exists():
-                Favorite.objects.create(user=user, recipe=recipe)
-                serializer = RecipeCartFavoriteSerializer(
-                    recipe,
-                    context={'request': request},
-                )
-                return Response(
-                    data=serializer.data,
-                    status=status.HTTP_201_CREATED,
-                )
-            else:
-                message: Dict[str, str] = {
-                    'error': 'Рецепт уже добавлен в избранное.',
-                }
-                return Response(message, status=status.HTTP_400_BAD_REQUEST)
+        response = toggle_link(
+            request,
+            Favorite,
+            Recipe,
+            'recipe',
+            pk,
+            RecipeCartFavoriteSerializer,
+            exists_error='Рецепт уже добавлен в избранное.',
+            absent_error='Рецепта нет в избранном.',
+        )
+        if response.status_code == status.HTTP_201_CREATED:
+            record_events(Favorite, [pk])
+        if response.status_code in (
+            status.HTTP_201_CREATED,
+            status.HTTP_204_NO_CONTENT,
+        ):
+            bump_state([request.user.id])
+        return response
 
-        if request.method == 'DELETE':
-            if not Favorite.objects.filter(user=user, recipe=recipe).exists():
-                message: Dict[str, str] = {'error': 'Рецепта нет в избранном.'}
-                return Response(message, status=status.HTTP_400_BAD_REQUEST)
-            else:
-                favorite = get_object_or_404(
-                    Favorite,
-                    user=user,
-                    recipe=recipe,
-                )
-                favorite.delete()
-                return Response(status=status.HTTP_204_NO_CONTENT)
+    @action(detail=False, permission_classes=(IsAuthenticated,))
+    def feed(self, request: Request) -> Response:
+        """Определяет URL-путь для получения ленты рецептов авторов, на
+        которых подписан текущий пользователь.
+        Запрос к эндпоинту /feed/. Рецепты отдаются по убыванию id,
+        следующая страница доступна по ссылке next. Поддерживает
+        параметры limit и fields.
+        """
+        paginator = FeedCursorPagination()
+        recipe_ids = paginator.paginate_ids(
+            lambda before, limit: feed_recipe_ids(
+                request.user, before, limit,
+            ),
+            request,
+        )
+        represent = (
+            document_representations
+            if settings.RECIPE_DOCUMENTS
+            else recipe_representations
+        )
+        return paginator.get_paginated_response(
+            represent(recipe_ids, request, self.get_fields()),
+        )
+
+    @action(detail=True)
+    def similar(self, request: Request, pk: int = None) -> Response:
+        """Определяет URL-путь для получения рецептов, похожих на рецепт
+        по набору ингредиентов.
+        Запрос к эндпоинту /similar/, число рецептов задается параметром
+        limit (по умолчанию SIMILAR_RECIPES_LIMIT, не больше размера
+        страницы). Поддерживает параметр fields.
+        """
+        get_object_or_404(Recipe.objects.only('id'), pk=pk)
+        try:
+            limit = int(request.query_params['limit'])
+        except (KeyError, ValueError):
+            limit = settings.SIMILAR_RECIPES_LIMIT
+        limit = max(1, min(limit, self.paginator.max_page_size))
+        represent = (
+            document_representations
+            if settings.RECIPE_DOCUMENTS
+            else recipe_representations
+        )
+        return Response(
+            represent(
+                similar_recipes(int(pk), limit), request, self.get_fields(),
+            ),
+        )
+
+    def bulk_link_recipes(self, request: Request, model: type) -> Response:
+        serializer = BulkIdsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        results = bulk_link(
+            model,
+            Recipe,
+            'recipe',
+            request.user,
+            serializer.validated_data['ids'],
+            delete=request.method == 'DELETE',
+        )
+        record_events(
+            model,
+            [
+                result['id']
+                for result in results
+                if result['status'] == CREATED
+            ],
+        )
+        if any(result['status'] in (CREATED, DELETED) for result in results):
+            bump_state([request.user.id])
+        return Response({'results': results})
+
+    @action(
+        methods=('post', 'delete'),
+        detail=False,
+        permission_classes=(IsAuthenticated,),
+    )
+    def bulk_favorite(self, request: Request) -> Response:
+        """Определяет URL-путь для массового добавления рецептов в избранное.
+        Запрос к эндпоинту /bulk_favorite/ со списком id рецептов в поле ids.
+        POST-запрос добавляет рецепты в избранное, DELETE запрос удаляет их.
+        Возвращает результат для каждого id.
+        """
+        return self.bulk_link_recipes(request, Favorite)
+
+    @action(
+        methods=('post', 'delete'),
+        detail=False,
+        permission_classes=(IsAuthenticated,),
+    )
+    def bulk_shopping_cart(self, request: Request) -> Response:
+        """Определяет URL-путь для массового добавления рецептов в список
+        покупок.
+        Запрос к эндпоинту /bulk_shopping_cart/ со списком id рецептов в поле
+        ids. POST-запрос добавляет рецепты в список покупок, DELETE запрос
+        удаляет их. Возвращает результат для каждого id.
+        """
+        return self.bulk_link_recipes(request, ShoppingCart)
 
     @action(
         detail=False,
@@ -310,3 +572,12 @@ class RecipeViewSet(viewsets.ModelViewSet):
             f'attachment; filename="{request.user.username}_shopping_list.txt"'
         )
         return response
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def metrics_view(request: Request) -> Response:
+    """Возвращает метрики текущего процесса: статистику пула соединений,
+    кэшей и ограничителей нагрузки. Доступно только администраторам.
+    """
+    return Response(metrics.collect())
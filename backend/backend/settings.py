@@ -17,6 +17,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'django_filters',
     'rest_framework.authtoken',
     'rest_framework',
@@ -29,12 +30,14 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'core.middleware.LoadSheddingMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'core.middleware.ReadReplicaMiddleware',
 ]
 
 ROOT_URLCONF = 'backend.urls'
@@ -57,14 +60,69 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'backend.wsgi.application'
 
+SERVER_MODE = os.getenv('SERVER_MODE', 'wsgi')
+
+ASYNC_READ_VIEWS = SERVER_MODE == 'asgi'
+
+ASYNC_DB_THREADS = int(os.getenv('ASYNC_DB_THREADS', 10))
+
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.postgresql',
+        'ENGINE': (
+            'core.db.backends.postgresql_pool'
+            if os.getenv('DB_POOL', 'True') == 'True'
+            else 'django.db.backends.postgresql'
+        ),
         'NAME': os.getenv('POSTGRES_DB', 'django'),
         'USER': os.getenv('POSTGRES_USER', 'django'),
         'PASSWORD': os.getenv('POSTGRES_PASSWORD', 'django'),
         'HOST': os.getenv('DB_HOST', 'db'),
         'PORT': os.getenv('DB_PORT', 5432),
+        'POOL': {
+            'MIN_SIZE': int(os.getenv('DB_POOL_MIN_SIZE', 1)),
+            'MAX_SIZE': int(os.getenv('DB_POOL_MAX_SIZE', 10)),
+            'MAX_LIFETIME': int(os.getenv('DB_POOL_MAX_LIFETIME', 3600)),
+            'TIMEOUT': int(os.getenv('DB_POOL_TIMEOUT', 30)),
+            'CHECK_INTERVAL': int(os.getenv('DB_POOL_CHECK_INTERVAL', 30)),
+        },
+    },
+}
+
+DATABASE_REPLICAS = []
+
+for number, host in enumerate(
+    filter(None, os.getenv('DB_REPLICA_HOSTS', '').split(',')), start=1,
+):
+    alias = f'replica_{number}'
+    DATABASES[alias] = {
+        **DATABASES['default'],
+        'HOST': host.strip(),
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS.append(alias)
+
+DATABASE_ROUTERS = ['core.db.routers.ReplicaRouter']
+
+REPLICA_READ_ACTIONS = {
+    'RecipeViewSet': ('list', 'retrieve', 'feed', 'similar'),
+    'TagViewSet': ('list', 'retrieve'),
+    'IngredientViewSet': ('list', 'retrieve'),
+    'UserViewSet': ('list', 'retrieve', 'subscriptions'),
+}
+
+REPLICA_PIN_SECONDS = int(os.getenv('REPLICA_PIN_SECONDS', 5))
+
+REPLICA_RETRY_SECONDS = int(os.getenv('REPLICA_RETRY_SECONDS', 10))
+
+REPLICA_CHECK_SECONDS = int(os.getenv('REPLICA_CHECK_SECONDS', 5))
+
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND',
+            'django.core.cache.backends.locmem.LocMemCache',
+        ),
+        'LOCATION': os.getenv('CACHE_LOCATION', ''),
     },
 }
 
@@ -118,9 +176,113 @@ REST_FRAMEWORK = {
         'rest_framework.permissions.AllowAny',
     ],
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'api.authentication.CachedTokenAuthentication',
+    ],
+    'DEFAULT_RENDERER_CLASSES': [
+        'api.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
     ],
     'SEARCH_PARAM': 'name',
+    'NUM_PROXIES': 1,
+}
+
+BULK_MAX_ITEMS = 100
+
+ADMIN_COUNT_LIMIT = 10000
+
+IMAGE_ORPHAN_GRACE = int(os.getenv('IMAGE_ORPHAN_GRACE', 3600))
+
+INGREDIENT_BUNDLE = {
+    'DIR': os.getenv(
+        'INGREDIENT_BUNDLE_DIR', '/backend_static/static/ingredients',
+    ),
+    'URL': f'{STATIC_URL}ingredients/',
+}
+
+INGREDIENT_SEARCH = {
+    'BACKEND': os.getenv('INGREDIENT_SEARCH_BACKEND', 'memory'),
+    'LIMIT': 20,
+    'THRESHOLD': 0.3,
+    'BUDGET_MS': int(os.getenv('INGREDIENT_SEARCH_BUDGET_MS', 50)),
+    'TTL': 3600,
+}
+
+INVALIDATION = {
+    'BACKEND': os.getenv('INVALIDATION_BACKEND', 'postgres'),
+    'CHANNEL': 'cache_invalidation',
+    'PATH': os.getenv(
+        'INVALIDATION_PATH', BASE_DIR / 'invalidation' / 'messages.log',
+    ),
+    'POLL_INTERVAL': int(os.getenv('INVALIDATION_POLL_INTERVAL', 5)),
+}
+
+FACETS = {
+    'COOKING_TIME_BUCKETS': [15, 30, 60, 120],
+    'TTL': 3600,
+}
+
+THROTTLE_BUCKETS = {
+    'recipes': {
+        'default': '120/min',
+        'create': '20/min',
+        'update': '30/min',
+        'partial_update': '30/min',
+        'download_shopping_cart': '10/min',
+    },
+    'users': {
+        'default': '120/min',
+        'create': '10/min',
+        'set_password': '5/min',
+    },
+}
+
+THROTTLE_STORE = os.getenv('THROTTLE_STORE', 'local')
+
+THROTTLE_MAX_KEYS = 100000
+
+THROTTLE_PAGE_COST = 20
+
+RECIPE_FAST_PATH = os.getenv('RECIPE_FAST_PATH', 'True') == 'True'
+
+RECIPE_DOCUMENTS = os.getenv('RECIPE_DOCUMENTS', 'True') == 'True'
+
+SIMILARITY_INDEX_DIR = os.getenv(
+    'SIMILARITY_INDEX_DIR', BASE_DIR / 'similarity_index',
+)
+
+SIMILAR_RECIPES_LIMIT = 10
+
+FEED = {
+    'FANOUT_LIMIT': int(os.getenv('FEED_FANOUT_LIMIT', 1000)),
+    'BACKFILL': 50,
+    'HEAVY_AUTHORS_TTL': 300,
+}
+
+# Рейтинг хранится логарифмом и растет от EPOCH линейно, поэтому EPOCH
+# не нужно сдвигать.
+TRENDING = {
+    'HALF_LIFE_HOURS': float(os.getenv('TRENDING_HALF_LIFE_HOURS', 72)),
+    'WINDOW_DAYS': int(os.getenv('TRENDING_WINDOW_DAYS', 14)),
+    'EPOCH': '2023-01-01T00:00:00+00:00',
+    'WEIGHTS': {'favorite': 1.0, 'shoppingcart': 0.5},
+}
+
+TOKEN_CACHE = {
+    'MAX_SIZE': int(os.getenv('TOKEN_CACHE_MAX_SIZE', 10000)),
+    'TTL': int(os.getenv('TOKEN_CACHE_TTL', 300)),
+    'SHARED': os.getenv('TOKEN_CACHE_SHARED', 'False') == 'True',
+}
+
+LOAD_SHEDDING = {
+    'ENABLED': os.getenv('LOAD_SHEDDING', 'True') == 'True',
+    'INITIAL_LIMIT': int(os.getenv('LOAD_SHEDDING_INITIAL_LIMIT', 20)),
+    'MIN_LIMIT': 2,
+    'MAX_LIMIT': int(os.getenv('LOAD_SHEDDING_MAX_LIMIT', 200)),
+    'LATENCY_TOLERANCE': 2.0,
+    'MAX_QUEUE_SECONDS': float(
+        os.getenv('LOAD_SHEDDING_MAX_QUEUE_SECONDS', 5),
+    ),
+    'HEAVY_PATHS': ('/api/recipes/download_shopping_cart/',),
 }
 
 DJOSER = {
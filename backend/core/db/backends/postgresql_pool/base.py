@@ -0,0 +1,119 @@
+import os
+import threading
+from typing import Dict, Optional, Tuple
+
+import psycopg2.extras
+from django.db import connections
+from django.db.backends.postgresql import base, creation
+from django.utils.asyncio import async_unsafe
+
+from core import metrics
+from core.db.backends.postgresql_pool.pool import ConnectionPool
+
+_pools: Dict[str, Tuple[Dict, ConnectionPool]] = {}
+_pools_lock = threading.Lock()
+
+
+def close_pool(alias: str) -> None:
+    """Закрывает пул соединений псевдонима alias текущего процесса."""
+    with _pools_lock:
+        entry = _pools.pop(f'{os.getpid()}:{alias}', None)
+    if entry is not None:
+        entry[1].closeall()
+
+
+class DatabaseCreation(creation.DatabaseCreation):
+    def _destroy_test_db(
+        self, test_database_name: str, verbosity: int,
+    ) -> None:
+        close_pool(self.connection.alias)
+        super()._destroy_test_db(test_database_name, verbosity)
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """Бэкенд PostgreSQL, берущий соединения из общего для всех потоков
+    процесса пула вместо открытия нового соединения на каждый запрос.
+    Параметры пула задаются ключом POOL в настройках базы данных:
+    MIN_SIZE, MAX_SIZE, MAX_LIFETIME, TIMEOUT и CHECK_INTERVAL.
+    Пул пересоздается при изменении параметров подключения (например,
+    NAME тестовой базы), служебные соединения без базы данных
+    (_nodb_cursor) открываются в обход пула.
+    """
+
+    creation_class = DatabaseCreation
+    connection_pool: Optional[ConnectionPool] = None
+
+    @property
+    def pooled(self) -> bool:
+        """Служебные соединения _nodb_cursor создаются отдельными
+        обертками и в пул не попадают.
+        """
+        return (
+            self.alias in connections and connections[self.alias] is self
+        )
+
+    def get_pool(self, conn_params: Dict) -> ConnectionPool:
+        key = f'{os.getpid()}:{self.alias}'
+        entry = _pools.get(key)
+        if entry is None or entry[0] != conn_params:
+            with _pools_lock:
+                entry = _pools.get(key)
+                if entry is not None and entry[0] != conn_params:
+                    entry[1].closeall()
+                    entry = None
+                if entry is None:
+                    entry = _pools[key] = (
+                        conn_params,
+                        self.create_pool(conn_params),
+                    )
+                    metrics.register(
+                        f'db_pool.{self.alias}', entry[1].get_stats,
+                    )
+        return entry[1]
+
+    def create_pool(self, conn_params: Dict) -> ConnectionPool:
+        options = self.settings_dict.get('POOL', {})
+
+        def connect() -> base.Database.extensions.connection:
+            connection = base.Database.connect(**conn_params)
+            psycopg2.extras.register_default_jsonb(
+                conn_or_curs=connection, loads=lambda x: x,
+            )
+            return connection
+
+        return ConnectionPool(
+            minconn=options.get('MIN_SIZE', 1),
+            maxconn=options.get('MAX_SIZE', 10),
+            connect=connect,
+            max_lifetime=options.get('MAX_LIFETIME', 3600),
+            timeout=options.get('TIMEOUT', 30),
+            check_interval=options.get('CHECK_INTERVAL', 30),
+        )
+
+    @async_unsafe
+    def get_new_connection(
+        self, conn_params: Dict,
+    ) -> base.Database.extensions.connection:
+        if not self.pooled:
+            self.connection_pool = None
+            return super().get_new_connection(conn_params)
+        self.connection_pool = self.get_pool(conn_params)
+        connection = self.connection_pool.getconn()
+        options = self.settings_dict['OPTIONS']
+        try:
+            self.isolation_level = options['isolation_level']
+        except KeyError:
+            self.isolation_level = connection.isolation_level
+        else:
+            if self.isolation_level != connection.isolation_level:
+                connection.set_session(isolation_level=self.isolation_level)
+        return connection
+
+    def _close(self) -> None:
+        if self.connection is None:
+            return
+        if self.connection_pool is None:
+            super()._close()
+            return
+        with self.wrap_database_errors:
+            self.connection_pool.putconn(self.connection)
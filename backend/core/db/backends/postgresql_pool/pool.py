@@ -0,0 +1,209 @@
+import threading
+import time
+from collections import Counter
+from typing import Callable, Dict, Optional
+
+from psycopg2 import extensions
+from psycopg2.pool import AbstractConnectionPool, PoolError
+
+
+class PoolTimeout(PoolError):
+    """Свободное соединение не появилось за отведенное время."""
+
+
+class ConnectionPool(AbstractConnectionPool):
+    """Потокобезопасный пул соединений psycopg2.
+    В отличие от ThreadedConnectionPool ожидает освобождения соединения
+    до timeout секунд вместо немедленной ошибки, держит свободными до
+    maxconn соединений, закрывает соединения старше max_lifetime секунд
+    и проверяет запросом SELECT 1 соединения, простаивавшие дольше
+    check_interval секунд.
+    """
+
+    def __init__(
+        self,
+        minconn: int,
+        maxconn: int,
+        connect: Callable[[], extensions.connection],
+        max_lifetime: Optional[float] = None,
+        timeout: float = 30.0,
+        check_interval: float = 30.0,
+    ) -> None:
+        self._factory = connect
+        self.max_lifetime = max_lifetime
+        self.timeout = timeout
+        self.check_interval = check_interval
+        self._condition = threading.Condition(threading.Lock())
+        self._opened_at: Dict[int, float] = {}
+        self._returned_at: Dict[int, float] = {}
+        self._opening = 0
+        self.stats = Counter()
+        super().__init__(minconn, maxconn)
+
+    def _connect(self, key: Optional[int] = None) -> extensions.connection:
+        conn = self._factory()
+        self._opened_at[id(conn)] = self._returned_at[id(conn)] = (
+            time.monotonic()
+        )
+        self.stats['connections_opened'] += 1
+        if key is not None:
+            self._used[key] = conn
+            self._rused[id(conn)] = key
+        else:
+            self._pool.append(conn)
+        return conn
+
+    def _expired(self, conn: extensions.connection) -> bool:
+        return bool(
+            self.max_lifetime
+            and time.monotonic() - self._opened_at[id(conn)]
+            > self.max_lifetime,
+        )
+
+    def _discard(self, conn: extensions.connection) -> None:
+        self._opened_at.pop(id(conn), None)
+        self._returned_at.pop(id(conn), None)
+        self.stats['connections_closed'] += 1
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def _check(self, conn: extensions.connection) -> bool:
+        """Проверяет соединение, долго простаивавшее в пуле."""
+        if conn.closed:
+            return False
+        idle = time.monotonic() - self._returned_at[id(conn)]
+        if idle < self.check_interval:
+            return True
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute('SELECT 1')
+            status = conn.info.transaction_status
+            if status != extensions.TRANSACTION_STATUS_IDLE:
+                conn.rollback()
+        except Exception:
+            return False
+        return True
+
+    def getconn(self, key: Optional[int] = None) -> extensions.connection:
+        """Выдает соединение из пула, открывает новое, если пул не
+        заполнен, либо ждет освобождения соединения не дольше timeout.
+        """
+        deadline = time.monotonic() + self.timeout
+        while True:
+            with self._condition:
+                conn = self._acquire(deadline)
+                if conn is None:
+                    self._opening += 1
+            if conn is None:
+                try:
+                    conn = self._factory()
+                except Exception:
+                    with self._condition:
+                        self._opening -= 1
+                        self._condition.notify()
+                    raise
+                with self._condition:
+                    self._opening -= 1
+                    now = time.monotonic()
+                    self._opened_at[id(conn)] = now
+                    self._returned_at[id(conn)] = now
+                    self.stats['connections_opened'] += 1
+                    self.stats['checkouts'] += 1
+                    self._register(conn)
+                return conn
+            if self._check(conn):
+                with self._condition:
+                    self.stats['checkouts'] += 1
+                return conn
+            with self._condition:
+                self.stats['health_check_failures'] += 1
+                self._unregister(conn)
+                self._discard(conn)
+                self._condition.notify()
+
+    def _acquire(self, deadline: float) -> Optional[extensions.connection]:
+        """Под блокировкой берет свободное соединение. Возвращает None,
+        если вызывающий должен открыть новое соединение.
+        """
+        waited = False
+        while True:
+            if self.closed:
+                raise PoolError('connection pool is closed')
+            while self._pool:
+                conn = self._pool.pop()
+                if conn.closed or self._expired(conn):
+                    self._discard(conn)
+                    continue
+                self._register(conn)
+                return conn
+            if len(self._used) + self._opening < self.maxconn:
+                return None
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                self.stats['timeouts'] += 1
+                raise PoolTimeout(
+                    f'no free connection in pool after {self.timeout}s',
+                )
+            if not waited:
+                waited = True
+                self.stats['waits'] += 1
+            self._condition.wait(remaining)
+
+    def _register(self, conn: extensions.connection) -> None:
+        key = self._getkey()
+        self._used[key] = conn
+        self._rused[id(conn)] = key
+
+    def _unregister(self, conn: extensions.connection) -> None:
+        key = self._rused.pop(id(conn), None)
+        if key is None:
+            raise PoolError('trying to put unkeyed connection')
+        del self._used[key]
+
+    def putconn(
+        self,
+        conn: extensions.connection,
+        key: Optional[int] = None,
+        close: bool = False,
+    ) -> None:
+        """Возвращает соединение в пул, откатывая незавершенную
+        транзакцию, либо закрывает его, если оно неисправно или устарело.
+        """
+        if not close and not conn.closed:
+            status = conn.info.transaction_status
+            if status == extensions.TRANSACTION_STATUS_UNKNOWN:
+                close = True
+            elif status != extensions.TRANSACTION_STATUS_IDLE:
+                try:
+                    conn.rollback()
+                except Exception:
+                    close = True
+        with self._condition:
+            self._unregister(conn)
+            if close or conn.closed or self.closed or self._expired(conn):
+                self._discard(conn)
+            else:
+                self._returned_at[id(conn)] = time.monotonic()
+                self._pool.append(conn)
+            self._condition.notify()
+
+    def closeall(self) -> None:
+        """Закрывает свободные соединения и запрещает выдачу новых."""
+        with self._condition:
+            self.closed = True
+            while self._pool:
+                self._discard(self._pool.pop())
+            self._condition.notify_all()
+
+    def get_stats(self) -> Dict[str, int]:
+        """Возвращает счетчики и текущее состояние пула."""
+        with self._condition:
+            return {
+                **self.stats,
+                'idle': len(self._pool),
+                'in_use': len(self._used),
+                'min_size': self.minconn,
+                'max_size': self.maxconn,
+            }
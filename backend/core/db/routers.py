@@ -0,0 +1,128 @@
+import hashlib
+import itertools
+import threading
+import time
+from contextvars import ContextVar
+from typing import Dict, Optional
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DatabaseError, connections
+from django.http import HttpRequest
+from rest_framework.request import Request
+
+PIN_KEY = 'replica-pin:{}'
+PRIMARY_READ_MODELS = ('authtoken.Token',)
+
+_read_database: ContextVar[Optional[str]] = ContextVar(
+    'read_database', default=None,
+)
+_replica_cycle = itertools.cycle(settings.DATABASE_REPLICAS or [None])
+_replica_down_until: Dict[str, float] = {}
+_replica_up_until: Dict[str, float] = {}
+_lock = threading.Lock()
+
+
+def set_read_database(alias: Optional[str]) -> None:
+    """Задает базу данных для чтения в текущем контексте запроса."""
+    _read_database.set(alias)
+
+
+def choose_replica() -> Optional[str]:
+    """Выбирает реплику по кругу, пропуская недоступные. Возвращает None,
+    если ни одна реплика не доступна и читать нужно с основной базы.
+    Соединение с репликой проверяется не чаще раза в
+    REPLICA_CHECK_SECONDS секунд, недоступная реплика пропускается
+    REPLICA_RETRY_SECONDS секунд.
+    """
+    for _ in range(len(settings.DATABASE_REPLICAS)):
+        with _lock:
+            alias = next(_replica_cycle)
+        now = time.monotonic()
+        if _replica_down_until.get(alias, 0) > now:
+            continue
+        if _replica_up_until.get(alias, 0) > now:
+            return alias
+        try:
+            connections[alias].ensure_connection()
+        except DatabaseError:
+            _replica_down_until[alias] = now + settings.REPLICA_RETRY_SECONDS
+            continue
+        _replica_up_until[alias] = now + settings.REPLICA_CHECK_SECONDS
+        return alias
+    return None
+
+
+def _pin_key(authorization: Optional[str]) -> Optional[str]:
+    if not authorization:
+        return None
+    return PIN_KEY.format(hashlib.sha1(authorization.encode()).hexdigest())
+
+
+def pin_to_primary(request: HttpRequest, token: Optional[str] = None) -> None:
+    """Закрепляет клиента за основной базой данных на
+    REPLICA_PIN_SECONDS секунд после записи, чтобы он сразу видел свои
+    изменения, даже если реплики отстают. Клиент, получивший токен token
+    при входе, закрепляется и по новому токену.
+    """
+    authorizations = [request.META.get('HTTP_AUTHORIZATION')]
+    if token:
+        authorizations.append(f'Token {token}')
+    for authorization in authorizations:
+        key = _pin_key(authorization)
+        if key:
+            cache.set(key, True, settings.REPLICA_PIN_SECONDS)
+
+
+def is_pinned_to_primary(request: HttpRequest) -> bool:
+    key = _pin_key(request.META.get('HTTP_AUTHORIZATION'))
+    return bool(key and cache.get(key))
+
+
+class ReplicaReadMixin:
+    """Примесь DRF-представлений: GET-запросы к действиям из
+    REPLICA_READ_ACTIONS читают данные из реплики, если клиент не
+    закреплен за основной базой. Реплика выбирается в initial(), в потоке
+    выполнения представления: в режиме ASGI это поток db_executor, а не
+    синхронный поток промежуточного слоя.
+    """
+
+    def initial(self, request: Request, *args: any, **kwargs: any) -> None:
+        if self.reads_from_replica(request):
+            set_read_database(choose_replica())
+        super().initial(request, *args, **kwargs)
+
+    def reads_from_replica(self, request: Request) -> bool:
+        if not settings.DATABASE_REPLICAS or request.method not in (
+            'GET',
+            'HEAD',
+        ):
+            return False
+        allowed = settings.REPLICA_READ_ACTIONS.get(type(self).__name__, ())
+        return self.action in allowed and not is_pinned_to_primary(request)
+
+
+class ReplicaRouter:
+    """Роутер, направляющий чтение в реплику, выбранную для текущего
+    запроса ReplicaReadMixin, а запись всегда в основную базу.
+    Токены (PRIMARY_READ_MODELS) всегда читаются из основной базы:
+    только что выданный токен может еще не дойти до реплики.
+    """
+
+    def db_for_read(self, model: any, **hints: any) -> Optional[str]:
+        if model._meta.label in PRIMARY_READ_MODELS:
+            return None
+        return _read_database.get()
+
+    def db_for_write(self, model: any, **hints: any) -> str:
+        return 'default'
+
+    def allow_relation(self, obj1: any, obj2: any, **hints: any) -> bool:
+        return True
+
+    def allow_migrate(
+        self, db: str, app_label: str, **hints: any,
+    ) -> Optional[bool]:
+        if db in settings.DATABASE_REPLICAS:
+            return False
+        return None
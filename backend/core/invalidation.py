@@ -0,0 +1,383 @@
+import json
+import os
+import select
+import threading
+import time
+import uuid
+from collections import Counter, defaultdict
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Set
+
+import psycopg2
+from django.conf import settings
+from django.db import DatabaseError, connections, router, transaction
+from django.utils import timezone
+
+from core import metrics
+from core.models import InvalidationVersion
+
+MAX_PAYLOAD = 7900
+
+Handler = Callable[[Optional[List[str]]], None]
+
+_handlers: Dict[str, List[Handler]] = defaultdict(list)
+_origin = uuid.uuid4().hex
+_listener: Optional['Listener'] = None
+_lock = threading.Lock()
+stats = Counter()
+
+
+def subscribe(topic: str, handler: Handler) -> None:
+    """Регистрирует обработчик сообщений темы topic. Обработчик получает
+    список измененных ключей или None, если сбросить нужно все данные
+    темы, и вызывается в потоке слушателя, поэтому должен только помечать
+    данные устаревшими, не обращаясь к базе данных.
+    """
+    _handlers[topic].append(handler)
+
+
+class Batch:
+    """Ключи, опубликованные по темам в одной транзакции. После фиксации
+    транзакции по каждой теме рассылается одно сообщение.
+    """
+
+    def __init__(self) -> None:
+        self.topics: Dict[str, Optional[Set[str]]] = {}
+
+    def add(self, topic: str, keys: Optional[Set[str]]) -> None:
+        if topic in self.topics:
+            current = self.topics[topic]
+            keys = None if current is None or keys is None else current | keys
+        self.topics[topic] = keys
+
+    def __call__(self) -> None:
+        send(
+            {
+                topic: None if keys is None else sorted(keys)
+                for topic, keys in self.topics.items()
+            },
+        )
+
+
+def publish(topic: str, keys: Optional[Iterable] = None) -> None:
+    """После фиксации транзакции сбрасывает ключи keys темы topic (без
+    keys - все данные темы) в текущем процессе и рассылает сообщение
+    остальным воркерам и узлам. Ключи всех вызовов в одной транзакции
+    объединяются в одно сообщение на тему.
+    """
+    keys = None if keys is None else {str(key) for key in keys}
+    if keys == set():
+        return
+    connection = transaction.get_connection()
+    batch = next(
+        (
+            callback
+            for _, callback in connection.run_on_commit
+            if isinstance(callback, Batch)
+        ),
+        None,
+    )
+    if batch is not None:
+        batch.add(topic, keys)
+        return
+    batch = Batch()
+    batch.add(topic, keys)
+    transaction.on_commit(batch)
+
+
+def send(topics: Dict[str, Optional[List[str]]]) -> None:
+    for topic, keys in topics.items():
+        deliver(topic, keys)
+    using = router.db_for_write(InvalidationVersion)
+    try:
+        with transaction.atomic(using=using):
+            versions = bump(topics, using)
+            backend = get_backend()
+            for topic, keys in topics.items():
+                backend.send(encode(topic, keys, versions[topic]))
+    except DatabaseError:
+        stats['send_errors'] += 1
+        return
+    stats['sent'] += len(topics)
+    if _listener is not None:
+        for topic, version in versions.items():
+            _listener.mark(topic, version)
+
+
+def encode(topic: str, keys: Optional[List[str]], version: int) -> str:
+    """Сообщение темы; ключи, не помещающиеся в MAX_PAYLOAD байт,
+    заменяются сбросом всех данных темы.
+    """
+    payload = {'t': topic, 'k': keys, 'o': _origin, 'v': version}
+    message = json.dumps(payload, separators=(',', ':'))
+    if len(message.encode()) > MAX_PAYLOAD:
+        payload['k'] = None
+        message = json.dumps(payload, separators=(',', ':'))
+    return message
+
+
+def bump(topics: Iterable[str], using: str) -> Dict[str, int]:
+    """Увеличивает номера тем одним запросом INSERT ... ON CONFLICT DO
+    UPDATE ... RETURNING. Обновление блокирует строки тем до конца
+    транзакции, поэтому сообщения одной темы фиксируются и доставляются
+    в порядке номеров; темы обновляются в порядке имен, без взаимных
+    блокировок.
+    """
+    topics = sorted(topics)
+    connection = connections[using]
+    table = connection.ops.quote_name(InvalidationVersion._meta.db_table)
+    updated = connection.ops.adapt_datetimefield_value(timezone.now())
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {table} (topic, version, updated) VALUES '
+            + ', '.join(['(%s, 1, %s)'] * len(topics))
+            + f' ON CONFLICT (topic) DO UPDATE SET version = {table}.version'
+            ' + 1, updated = excluded.updated RETURNING topic, version',
+            [value for topic in topics for value in (topic, updated)],
+        )
+        return dict(cursor.fetchall())
+
+
+def deliver(topic: str, keys: Optional[List[str]]) -> None:
+    for handler in _handlers.get(topic, ()):
+        handler(keys)
+    stats['flushes' if keys is None else 'evictions'] += 1
+
+
+class PostgresBackend:
+    """Сообщения через LISTEN/NOTIFY PostgreSQL. NOTIFY выполняется в
+    транзакции увеличения номера темы и доставляется слушателям только
+    после ее фиксации. Слушатель держит отдельное соединение вне пула.
+    """
+
+    def __init__(self, channel: str) -> None:
+        self.channel = channel
+        self.connection = None
+
+    def send(self, message: str) -> None:
+        with connections['default'].cursor() as cursor:
+            cursor.execute('SELECT pg_notify(%s, %s)', [self.channel, message])
+
+    def wait(self, timeout: float) -> List[str]:
+        if self.connection is None:
+            self.connection = psycopg2.connect(
+                **connections['default'].get_connection_params(),
+            )
+            self.connection.autocommit = True
+            with self.connection.cursor() as cursor:
+                cursor.execute(f'LISTEN "{self.channel}"')
+        if select.select([self.connection], [], [], timeout)[0]:
+            self.connection.poll()
+        messages = [notify.payload for notify in self.connection.notifies]
+        self.connection.notifies.clear()
+        return messages
+
+    def close(self) -> None:
+        if self.connection is not None:
+            try:
+                self.connection.close()
+            finally:
+                self.connection = None
+
+
+class FileBackend:
+    """Сообщения строками в общем файле: замена LISTEN/NOTIFY для
+    разработки и тестов на одном узле и с другими базами данных. Строка
+    дописывается после фиксации транзакции одной записью в режиме
+    добавления, слушатели читают файл с позиции прошлого чтения.
+    """
+
+    interval = 0.1
+
+    def __init__(self, path: str) -> None:
+        self.path = Path(path)
+        self.position: Optional[int] = None
+
+    def send(self, message: str) -> None:
+        transaction.on_commit(lambda: self.write(message))
+
+    def write(self, message: str) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        descriptor = os.open(
+            self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644,
+        )
+        try:
+            os.write(descriptor, f'{message}\n'.encode())
+        finally:
+            os.close(descriptor)
+
+    def wait(self, timeout: float) -> List[str]:
+        deadline = time.monotonic() + timeout
+        while True:
+            messages = self.read()
+            if messages or time.monotonic() >= deadline:
+                return messages
+            time.sleep(self.interval)
+
+    def read(self) -> List[str]:
+        try:
+            size = self.path.stat().st_size
+        except FileNotFoundError:
+            size = 0
+        if self.position is None or size < self.position:
+            self.position = size if self.position is None else 0
+        if size == self.position:
+            return []
+        with open(self.path, 'rb') as file:
+            file.seek(self.position)
+            data = file.read(size - self.position)
+        complete = data.rfind(b'\n') + 1
+        self.position += complete
+        return data[:complete].decode().splitlines()
+
+    def close(self) -> None:
+        self.position = None
+
+
+class PollBackend:
+    """Без рассылки сообщений: другие воркеры узнают об изменениях только
+    при сверке номеров тем.
+    """
+
+    def send(self, message: str) -> None:
+        pass
+
+    def wait(self, timeout: float) -> List[str]:
+        time.sleep(timeout)
+        return []
+
+    def close(self) -> None:
+        pass
+
+
+_backend = None
+
+
+def get_backend() -> any:
+    global _backend
+    if _backend is None:
+        config = settings.INVALIDATION
+        _backend = {
+            'postgres': lambda: PostgresBackend(config['CHANNEL']),
+            'file': lambda: FileBackend(config['PATH']),
+            'poll': PollBackend,
+        }[config['BACKEND']]()
+    return _backend
+
+
+class Listener(threading.Thread):
+    """Поток воркера, получающий сообщения шины и вызывающий обработчики
+    тем. Раз в INVALIDATION['POLL_INTERVAL'] секунд сверяет номера тем в
+    базе данных с полученными: если номер сообщения не пришел и к
+    следующей сверке, сообщение считается потерянным и кэш темы
+    сбрасывается целиком. После ошибки соединения слушатель
+    переподключается и сверяет номера сразу.
+    """
+
+    def __init__(self, backend: any, interval: float) -> None:
+        super().__init__(name='invalidation-listener', daemon=True)
+        self.backend = backend
+        self.interval = interval
+        self.seen: Dict[str, int] = {}
+        self.ahead: Dict[str, Set[int]] = defaultdict(set)
+        self.suspect: Dict[str, int] = {}
+        self.lock = threading.Lock()
+        self.pid = os.getpid()
+
+    def run(self) -> None:
+        polled, resync, delay = 0.0, True, 1.0
+        while True:
+            try:
+                messages = self.backend.wait(self.interval)
+                for message in messages:
+                    self.receive(message)
+                if resync or time.monotonic() - polled >= self.interval:
+                    self.poll()
+                    polled, resync, delay = time.monotonic(), False, 1.0
+            except Exception:
+                stats['errors'] += 1
+                self.backend.close()
+                connections.close_all()
+                resync = True
+                time.sleep(delay)
+                delay = min(delay * 2, 60)
+
+    def receive(self, message: str) -> None:
+        try:
+            payload = json.loads(message)
+        except ValueError:
+            stats['malformed'] += 1
+            return
+        stats['received'] += 1
+        if payload['o'] != _origin:
+            deliver(payload['t'], payload['k'])
+        self.mark(payload['t'], payload['v'])
+
+    def mark(self, topic: str, version: int) -> None:
+        """Запоминает полученный номер темы. Для каждой темы хранится
+        наибольший номер, до которого получены все сообщения, и номера,
+        пришедшие раньше предыдущих.
+        """
+        with self.lock:
+            if topic not in self.seen:
+                return
+            ahead = self.ahead[topic]
+            ahead.add(version)
+            while self.seen[topic] + 1 in ahead:
+                self.seen[topic] += 1
+                ahead.discard(self.seen[topic])
+
+    def poll(self) -> None:
+        try:
+            versions = dict(
+                InvalidationVersion.objects.values_list('topic', 'version'),
+            )
+        finally:
+            connections.close_all()
+        for topic, version in versions.items():
+            with self.lock:
+                if topic not in self.seen:
+                    self.seen[topic] = version
+                    continue
+                missed = self.suspect.pop(topic, 0) > self.seen[topic]
+                if missed:
+                    self.seen[topic] = version
+                    self.ahead[topic] = {
+                        number for number in self.ahead[topic]
+                        if number > version
+                    }
+                elif version > self.seen[topic]:
+                    self.suspect[topic] = version
+            if missed:
+                stats['missed'] += 1
+                deliver(topic, None)
+
+
+def start() -> None:
+    """Запускает слушателя шины в текущем процессе. Команды управления
+    слушателя не запускают.
+    """
+    global _listener
+    with _lock:
+        if _listener is None or _listener.pid != os.getpid():
+            _listener = Listener(
+                get_backend(), settings.INVALIDATION['POLL_INTERVAL'],
+            )
+            _listener.start()
+
+
+def start_on_load() -> None:
+    """Запускает слушателя при загрузке приложения точками входа WSGI и
+    ASGI. Под gunicorn слушатель запускает хук post_fork в каждом
+    воркере: с preload_app приложение загружается в мастере, и поток
+    слушателя мастера в воркеры не копируется.
+    """
+    if os.getenv('INVALIDATION_START') != 'post_fork':
+        start()
+
+
+def get_stats() -> Dict[str, int]:
+    return dict(stats)
+
+
+metrics.register('invalidation', get_stats)
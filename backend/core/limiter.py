@@ -0,0 +1,116 @@
+import threading
+from collections import Counter
+from typing import Dict, List
+
+READ = 'read'
+WRITE = 'write'
+HEAVY = 'heavy'
+
+PRIORITY_SHARE: Dict[str, float] = {READ: 1.0, WRITE: 0.8, HEAVY: 0.5}
+
+
+class AdaptiveConcurrencyLimiter:
+    """Адаптивный лимит одновременных запросов воркера (AIMD).
+    Задержка сравнивается отдельно для каждого маршрута: у маршрута есть
+    короткое скользящее среднее задержки (около 10 запросов) и длинное
+    (около window запросов), которое служит базовой задержкой. Если
+    короткое среднее маршрута превышает базовое в tolerance раз или
+    запрос завершился ошибкой сервера, лимит умножается на backoff, но
+    не чаще раза за limit завершенных запросов. Иначе, пока лимит реально
+    используется, он растет на 1 за каждые limit запросов. Поэтому
+    медленные, но стабильные эндпоинты не считаются перегрузкой на фоне
+    быстрых. Дешевые чтения допускаются до полного лимита, запись - до
+    80%, а тяжелые эндпоинты - до 50% лимита, поэтому при перегрузке
+    первыми отбрасываются тяжелые запросы.
+    """
+
+    short_weight = 0.1
+    warmup = 20
+
+    def __init__(
+        self,
+        initial_limit: float,
+        min_limit: float,
+        max_limit: float,
+        tolerance: float = 2.0,
+        backoff: float = 0.9,
+        window: int = 500,
+    ) -> None:
+        self.limit = float(initial_limit)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.tolerance = tolerance
+        self.backoff = backoff
+        self.window = window
+        self.inflight = 0
+        self.latency = 0.0
+        self._routes: Dict[str, List[float]] = {}
+        self._since_backoff = 0
+        self._lock = threading.Lock()
+        self.stats = Counter()
+
+    def try_acquire(self, priority: str) -> bool:
+        """Занимает слот для запроса с приоритетом priority. Возвращает
+        False, если запрос нужно отбросить.
+        """
+        with self._lock:
+            if self.inflight >= max(
+                1, int(self.limit * PRIORITY_SHARE[priority]),
+            ):
+                self.stats[f'shed_{priority}'] += 1
+                return False
+            self.inflight += 1
+            self.stats[f'accepted_{priority}'] += 1
+            return True
+
+    def reject(self, reason: str) -> None:
+        """Учитывает запрос, отброшенный по причине reason до лимитера."""
+        with self._lock:
+            self.stats[f'shed_{reason}'] += 1
+
+    def release(
+        self, latency: float, failed: bool = False, route: str = '',
+    ) -> None:
+        """Освобождает слот и пересчитывает лимит по задержке запроса к
+        маршруту route.
+        """
+        with self._lock:
+            utilized = self.inflight >= self.limit / 2
+            self.inflight -= 1
+            self.latency = (
+                latency
+                if not self.latency
+                else 0.9 * self.latency + 0.1 * latency
+            )
+            baseline = self._routes.setdefault(route, [latency, latency, 0])
+            baseline[0] += (latency - baseline[0]) / self.window
+            baseline[1] += (latency - baseline[1]) * self.short_weight
+            baseline[2] += 1
+            congested = (
+                baseline[2] >= self.warmup
+                and baseline[1] > baseline[0] * self.tolerance
+            )
+            self._since_backoff += 1
+            if failed or congested:
+                if self._since_backoff >= self.limit:
+                    self.limit = max(
+                        self.min_limit, self.limit * self.backoff,
+                    )
+                    self._since_backoff = 0
+                    self.stats['backoffs'] += 1
+            elif utilized:
+                self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+
+    def retry_after(self) -> int:
+        """Рекомендуемая пауза перед повтором запроса в секундах."""
+        return max(1, round(self.latency * 2))
+
+    def get_stats(self) -> Dict[str, float]:
+        with self._lock:
+            return {
+                **self.stats,
+                'limit': round(self.limit, 2),
+                'inflight': self.inflight,
+                'latency_ewma': self.latency,
+                'routes': len(self._routes),
+            }
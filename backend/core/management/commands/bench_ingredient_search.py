@@ -0,0 +1,134 @@
+import csv
+import os
+import random
+import time
+from typing import List, Set, Tuple
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from api.search import TrigramIndex, trigrams
+
+
+class Command(BaseCommand):
+    """Команда для замера нечеткого поиска ингредиентов.
+    Строит в памяти каталог из --size названий на основе ingredients.csv,
+    индекс триграмм по нему и выполняет --queries запросов с опечатками и
+    переставленными словами. Выводит время построения индекса,
+    перцентили задержки поиска, долю запросов, нашедших исходный
+    ингредиент, и совпадение первых результатов с полным перебором
+    каталога для --check запросов. База данных не используется.
+    """
+
+    help = 'Замер нечеткого поиска ингредиентов на синтетическом каталоге'
+
+    def add_arguments(self, parser: any) -> None:
+        parser.add_argument('--size', type=int, default=100000)
+        parser.add_argument('--queries', type=int, default=1000)
+        parser.add_argument('--check', type=int, default=20)
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args: any, **options: any) -> None:
+        rng = random.Random(options['seed'])
+        config = settings.INGREDIENT_SEARCH
+        catalog = build_catalog(options['size'], rng)
+        started = time.perf_counter()
+        index = TrigramIndex(enumerate(catalog))
+        self.stdout.write(
+            f'Индекс: {len(index)} названий, {len(index.postings)} '
+            f'триграмм, построен за {time.perf_counter() - started:.2f} с',
+        )
+        queries = [
+            (row, misspell(catalog[row], rng))
+            for row in rng.sample(range(len(catalog)), options['queries'])
+        ]
+        timings, found = [], 0
+        for row, query in queries:
+            started = time.perf_counter()
+            result = index.search(
+                query, config['LIMIT'], config['THRESHOLD'],
+            )
+            timings.append(time.perf_counter() - started)
+            found += row in result
+        timings.sort()
+        self.stdout.write(
+            'Задержка: '
+            + ', '.join(
+                f'p{p} {timings[int(len(timings) * p / 100) - 1] * 1000:.2f}'
+                ' мс'
+                for p in (50, 95, 99, 100)
+            ),
+        )
+        self.stdout.write(
+            f'Исходный ингредиент найден: {found / len(queries):.1%}',
+        )
+        overlap = []
+        catalog_grams = [trigrams(name) for name in catalog]
+        for _, query in queries[: options['check']]:
+            expected = brute_force(
+                catalog_grams, query, config['LIMIT'], config['THRESHOLD'],
+            )
+            actual = index.search(
+                query, config['LIMIT'], config['THRESHOLD'],
+            )
+            common = set(actual) & set(expected)
+            overlap.append(len(common) / max(len(expected), 1))
+        if overlap:
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f'Совпадение с полным перебором: '
+                    f'{sum(overlap) / len(overlap):.1%}',
+                ),
+            )
+
+
+def build_catalog(size: int, rng: random.Random) -> List[str]:
+    """Возвращает size уникальных названий: названия из ingredients.csv
+    и их сочетания с уточняющими словами из того же файла.
+    """
+    path = os.path.join(
+        os.path.dirname(__file__), 'data', 'ingredients.csv',
+    )
+    with open(path, encoding='utf-8') as file:
+        names = [row[0] for row in csv.reader(file)]
+    words = sorted({word for name in names for word in name.split()})
+    catalog = dict.fromkeys(names)
+    while len(catalog) < size:
+        catalog.setdefault(f'{rng.choice(names)} {rng.choice(words)}')
+    return list(catalog)[:size]
+
+
+def misspell(name: str, rng: random.Random) -> str:
+    """Переставляет слова названия и вносит одну опечатку: пропуск,
+    замену или перестановку соседних букв.
+    """
+    words = name.split()
+    rng.shuffle(words)
+    text = list(' '.join(words))
+    position = rng.randrange(len(text) - 1)
+    kind = rng.randrange(3)
+    if kind == 0:
+        del text[position]
+    elif kind == 1:
+        text[position] = rng.choice('абвгдеиклмнопрст')
+    else:
+        text[position], text[position + 1] = (
+            text[position + 1],
+            text[position],
+        )
+    return ''.join(text)
+
+
+def brute_force(
+    catalog_grams: List[Set[str]], query: str, limit: int, threshold: float,
+) -> List[int]:
+    """Первые limit номеров каталога по сходству триграмм, вычисленному
+    для каждого названия.
+    """
+    grams = trigrams(query)
+    scored: List[Tuple[float, int]] = []
+    for row, other in enumerate(catalog_grams):
+        score = len(grams & other) / len(grams | other)
+        if score >= threshold:
+            scored.append((-score, row))
+    return [row for _, row in sorted(scored)[:limit]]
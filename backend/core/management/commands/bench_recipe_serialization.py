@@ -0,0 +1,102 @@
+import time
+from typing import Callable, List
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from api.documents import document_representations
+from api.renderers import FastJSONRenderer
+from api.representations import recipe_representations
+from api.serializers import RecipeGetSerializer
+from recipes.models import Recipe
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    """Команда для сравнения сериализации списка рецептов.
+    Проверяет, что быстрый путь (recipe_representations и
+    FastJSONRenderer) и сборка из документов рецептов выдают побайтно тот
+    же JSON, что RecipeGetSerializer со стандартным JSONRenderer, и
+    измеряет процессорное время всех вариантов на одной странице рецептов.
+    """
+
+    help = 'Проверка и замер быстрого пути сериализации рецептов'
+
+    def add_arguments(self, parser: any) -> None:
+        parser.add_argument('--page-size', type=int, default=50)
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument('--email', help='Пользователь-зритель')
+
+    def handle(self, *args: any, **options: any) -> None:
+        recipe_ids = list(
+            Recipe.objects.order_by('-id').values_list('id', flat=True)[
+                : options['page_size']
+            ],
+        )
+        if not recipe_ids:
+            raise CommandError('В базе данных нет рецептов')
+        django_request = APIRequestFactory().get('/api/recipes/')
+        if options['email']:
+            force_authenticate(
+                django_request, User.objects.get(email=options['email']),
+            )
+        request = Request(django_request)
+
+        def serializer_path() -> bytes:
+            recipes = Recipe.objects.filter(id__in=recipe_ids).order_by('-id')
+            data = RecipeGetSerializer(
+                recipes, many=True, context={'request': request},
+            ).data
+            return JSONRenderer().render(data)
+
+        def fast_path() -> bytes:
+            return FastJSONRenderer().render(
+                recipe_representations(recipe_ids, request),
+            )
+
+        def document_path() -> bytes:
+            return FastJSONRenderer().render(
+                document_representations(recipe_ids, request),
+            )
+
+        expected = serializer_path()
+        for name, func in (
+            ('быстрого пути', fast_path),
+            ('документов рецептов', document_path),
+        ):
+            actual = func()
+            if expected != actual:
+                raise CommandError(
+                    f'Вывод {name} отличается от RecipeGetSerializer:\n'
+                    f'{expected[:500]!r}\n{actual[:500]!r}',
+                )
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Вывод совпадает побайтно ({len(expected)} байт, '
+                f'{len(recipe_ids)} рецептов)',
+            ),
+        )
+        for name, func in (
+            ('RecipeGetSerializer', serializer_path),
+            ('быстрый путь', fast_path),
+            ('документы', document_path),
+        ):
+            cpu = measure(func, options['repeat'])
+            self.stdout.write(
+                f'{name:<20} CPU: {min(cpu) * 1000:.2f} мс (мин), '
+                f'{sum(cpu) / len(cpu) * 1000:.2f} мс (сред)',
+            )
+
+
+def measure(func: Callable, repeat: int) -> List[float]:
+    """Возвращает процессорное время каждого из repeat вызовов func."""
+    timings = []
+    for _ in range(repeat):
+        started = time.process_time()
+        func()
+        timings.append(time.process_time() - started)
+    return timings
@@ -0,0 +1,135 @@
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from core.management.commands.load_test import Command as LoadTestCommand
+from core.management.commands.load_test import percentile
+
+SERVER_MODES = ('wsgi', 'asgi')
+
+
+class Command(BaseCommand):
+    """Команда для сравнения режимов запуска сервера.
+    По очереди запускает gunicorn с синхронными WSGI воркерами и с
+    uvicorn воркерами в режиме ASGI, нагружает каждый одинаковым набором
+    запросов и выводит пропускную способность, задержки и потребление
+    памяти процессами сервера.
+    """
+
+    help = 'Сравнение пропускной способности и памяти WSGI и ASGI режимов'
+
+    def add_arguments(self, parser: any) -> None:
+        parser.add_argument('--requests', type=int, default=2000)
+        parser.add_argument('--concurrency', type=int, default=100)
+        parser.add_argument('--write-ratio', type=float, default=0.0)
+        parser.add_argument('--users', type=int, default=10)
+        parser.add_argument('--workers', type=int, default=2)
+        parser.add_argument('--port', type=int, default=8765)
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args: any, **options: any) -> None:
+        load = LoadTestCommand(stdout=self.stdout, stderr=self.stderr)
+        calls = load.prepare(options)
+        summaries = {}
+        for mode in SERVER_MODES:
+            self.stdout.write(f'Запуск сервера в режиме {mode}...')
+            server = self.start_server(mode, options)
+            try:
+                url = f'http://127.0.0.1:{options["port"]}'
+                started = time.perf_counter()
+                results = asyncio.run(
+                    load.run_clients(
+                        calls, load.http_sender(url), options['concurrency'],
+                    ),
+                )
+                elapsed = time.perf_counter() - started
+                summaries[mode] = summarize(results, elapsed)
+                summaries[mode]['rss'] = process_tree_rss(server.pid)
+            finally:
+                server.terminate()
+                server.wait(timeout=30)
+
+        self.stdout.write(
+            f'\n{"Режим":<6} {"запросов/с":>11} {"p50, мс":>9} '
+            f'{"p99, мс":>9} {"ошибки":>7} {"память, МБ":>11}',
+        )
+        for mode, summary in summaries.items():
+            self.stdout.write(
+                f'{mode:<6} {summary["rps"]:>11.1f} {summary["p50"]:>9.1f} '
+                f'{summary["p99"]:>9.1f} {summary["errors"]:>7} '
+                f'{summary["rss"] / 1024:>11.1f}',
+            )
+
+    def start_server(self, mode: str, options: Dict) -> subprocess.Popen:
+        """Запускает gunicorn в выбранном режиме и ждет, пока порт
+        начнет принимать соединения.
+        """
+        env = {
+            **os.environ,
+            'SERVER_MODE': mode,
+            'GUNICORN_BIND': f'127.0.0.1:{options["port"]}',
+            'GUNICORN_WORKERS': str(options['workers']),
+        }
+        server = subprocess.Popen(
+            [
+                sys.executable,
+                '-m',
+                'gunicorn',
+                '--config',
+                str(Path(settings.BASE_DIR) / 'gunicorn.conf.py'),
+            ],
+            cwd=settings.BASE_DIR,
+            env=env,
+        )
+        deadline = time.monotonic() + 30
+        while time.monotonic() < deadline:
+            if server.poll() is not None:
+                raise CommandError(f'Сервер в режиме {mode} не запустился')
+            try:
+                socket.create_connection(
+                    ('127.0.0.1', options['port']), timeout=1,
+                ).close()
+                return server
+            except OSError:
+                time.sleep(0.2)
+        server.terminate()
+        raise CommandError(f'Сервер в режиме {mode} не ответил за 30 секунд')
+
+
+def summarize(results: List, elapsed: float) -> Dict:
+    """Сводит результаты нагрузочного теста в основные метрики."""
+    latencies = sorted(latency for _, _, latency in results)
+    return {
+        'rps': len(results) / elapsed,
+        'p50': percentile(latencies, 50) * 1000,
+        'p99': percentile(latencies, 99) * 1000,
+        'errors': sum(
+            1 for _, status, _ in results if status == 0 or status >= 500
+        ),
+    }
+
+
+def process_tree_rss(pid: int) -> int:
+    """Возвращает суммарный RSS процесса и его потомков в килобайтах."""
+    total = 0
+    pending = [pid]
+    while pending:
+        current = pending.pop()
+        try:
+            with open(f'/proc/{current}/status') as status:
+                for line in status:
+                    if line.startswith('VmRSS:'):
+                        total += int(line.split()[1])
+            with open(f'/proc/{current}/task/{current}/children') as children:
+                pending.extend(int(child) for child in children.read().split())
+        except OSError:
+            continue
+    return total
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from api.bundle import build_bundle
+
+
+class Command(BaseCommand):
+    """Команда для сборки статического каталога ингредиентов.
+    Каталог сохраняется в INGREDIENT_BUNDLE['DIR'] под именем с хэшем
+    содержимого со сжатыми копиями, текущая версия доступна по
+    /api/ingredients/bundle/. Вызывается автоматически после import_csv
+    и import_data; после изменения ингредиентов в админке ее нужно
+    запустить вручную.
+    """
+
+    help = 'Сборка статического каталога ингредиентов для клиентов'
+
+    def handle(self, *args: any, **options: any) -> None:
+        manifest, changed = build_bundle()
+        status = 'собран' if changed else 'не изменился'
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Каталог ингредиентов {status}: '
+                f'версия {manifest["version"]}, '
+                f'{manifest["count"]} ингредиентов, {manifest["size"]} байт',
+            ),
+        )
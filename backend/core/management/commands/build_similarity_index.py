@@ -0,0 +1,27 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from api.similarity import build_index
+
+
+class Command(BaseCommand):
+    """Команда для сборки индекса похожих рецептов.
+    По умолчанию индекс обновляется инкрементально: пересчитываются
+    только новые и измененные рецепты. С --full индекс строится заново.
+    """
+
+    help = 'Сборка MinHash/LSH индекса похожих рецептов'
+
+    def add_arguments(self, parser: any) -> None:
+        parser.add_argument('--full', action='store_true')
+
+    def handle(self, *args: any, **options: any) -> None:
+        started = time.monotonic()
+        stats = build_index(full=options['full'])
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Индекс собран: {stats["recipes"]} рецептов, пересчитано '
+                f'{stats["changed"]}, за {time.monotonic() - started:.1f} с',
+            ),
+        )
@@ -0,0 +1,27 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from api.trending import compact
+
+
+class Command(BaseCommand):
+    """Команда для периодического пересчета рейтинга популярности.
+    Между запусками рейтинг обновляется инкрементально при добавлении
+    рецептов в избранное и список покупок, а команда пересчитывает его
+    по событиям окна TRENDING['WINDOW_DAYS'] и учитывает удаления.
+    Предназначена для запуска по расписанию (например, cron раз в час).
+    """
+
+    help = 'Пересчет рейтинга популярности рецептов'
+
+    def handle(self, *args: any, **options: any) -> None:
+        started = time.monotonic()
+        stats = compact()
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Рейтинг пересчитан: {stats["recipes"]} рецептов, '
+                f'{stats["events"]} событий, за '
+                f'{time.monotonic() - started:.1f} с',
+            ),
+        )
@@ -0,0 +1,328 @@
+import json
+import re
+from collections import OrderedDict
+from contextlib import ExitStack
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError, connections, transaction
+from django.db.models import Count
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from api.urls import router
+from recipes.models import Ingredient, Tag
+
+User = get_user_model()
+
+LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+\b")
+FILTER_COLUMNS = re.compile(
+    r'\(?\s*(?:\w+\.)?"?(\w+)"?\s*(?:=|<>|<=|>=|<|>|~~\*?|= ANY|IN\b)',
+)
+SQLITE_SCAN = re.compile(r'^SCAN (?:TABLE )?(\w+)(?!\w| USING)')
+
+
+class Command(BaseCommand):
+    """Команда для аудита планов выполнения SQL-запросов API.
+    Вызывает каждый GET-эндпоинт роутера API на текущей базе данных,
+    собирает все уникальные SELECT-запросы ко всем базам данных
+    (включая реплики), выполняет для них EXPLAIN (ANALYZE, BUFFERS) в
+    той базе, где они выполнялись, и выводит отчет о последовательном
+    сканировании больших таблиц, сортировках с выгрузкой на диск и
+    предложения по индексам.
+    """
+
+    help = 'Аудит планов выполнения запросов для всех эндпоинтов API'
+
+    def add_arguments(self, parser: any) -> None:
+        parser.add_argument(
+            '--email',
+            help='Пользователь, от имени которого выполняются запросы',
+        )
+        parser.add_argument(
+            '--large-table-rows',
+            type=int,
+            default=10000,
+            help='С какого числа строк таблица считается большой',
+        )
+
+    def handle(self, *args: any, **options: any) -> None:
+        self.large_table_rows = options['large_table_rows']
+        user = self.get_user(options['email'])
+        client = APIClient(
+            raise_request_exception=False, HTTP_HOST='localhost',
+        )
+        client.force_authenticate(user)
+        statements: Dict[Tuple[str, str], Tuple[str, str, Set[str]]] = (
+            OrderedDict()
+        )
+        aliases = self.available_aliases()
+        for endpoint in self.endpoints(user):
+            with ExitStack() as stack:
+                captured = {
+                    alias: stack.enter_context(
+                        CaptureQueriesContext(connections[alias]),
+                    )
+                    for alias in aliases
+                }
+                response = client.get(endpoint)
+            queries = [
+                (alias, query['sql'])
+                for alias, context in captured.items()
+                for query in context.captured_queries
+            ]
+            selects = [
+                (alias, sql)
+                for alias, sql in queries
+                if sql.lstrip().upper().startswith('SELECT')
+            ]
+            self.stdout.write(
+                f'{endpoint} -> {response.status_code}, '
+                f'запросов: {len(queries)}, SELECT: {len(selects)}',
+            )
+            for alias, sql in selects:
+                shape = (alias, LITERALS.sub('?', sql))
+                statements.setdefault(shape, (alias, sql, set()))[2].add(
+                    endpoint,
+                )
+
+        self.stdout.write(
+            f'\nУникальных запросов: {len(statements)}\n',
+        )
+        report = [
+            (self.explain(sql, alias), alias, sql, endpoints)
+            for alias, sql, endpoints in statements.values()
+        ]
+        report.sort(key=lambda item: item[0][0], reverse=True)
+        problems = 0
+        for (duration, issues), alias, sql, endpoints in report:
+            if not issues:
+                continue
+            problems += 1
+            self.stdout.write(
+                self.style.WARNING(f'[{duration:.2f} мс, {alias}] {sql}'),
+            )
+            self.stdout.write(f'  эндпоинты: {", ".join(sorted(endpoints))}')
+            for issue in issues:
+                self.stdout.write(f'  - {issue}')
+        if problems:
+            self.stdout.write(
+                self.style.WARNING(f'\nПроблемных запросов: {problems}'),
+            )
+        else:
+            self.stdout.write(self.style.SUCCESS('Проблем не найдено'))
+
+    def available_aliases(self) -> List[str]:
+        """Базы данных, запросы к которым собираются; недоступные
+        реплики пропускаются с предупреждением.
+        """
+        aliases = []
+        for alias in connections:
+            try:
+                connections[alias].ensure_connection()
+            except DatabaseError:
+                self.stdout.write(
+                    self.style.WARNING(f'База данных {alias} недоступна'),
+                )
+                continue
+            aliases.append(alias)
+        return aliases
+
+    def get_user(self, email: Optional[str]) -> User:
+        """Возвращает пользователя для аудита: указанного или того,
+        у кого больше всего рецептов в списке покупок.
+        """
+        if email:
+            try:
+                return User.objects.get(email=email)
+            except User.DoesNotExist:
+                raise CommandError(f'Пользователь {email} не найден')
+        user = (
+            User.objects.annotate(carts_count=Count('carts'))
+            .order_by('-carts_count', 'id')
+            .first()
+        )
+        if user is None:
+            raise CommandError('В базе данных нет пользователей')
+        return user
+
+    def endpoints(self, user: User) -> List[str]:
+        """Перечисляет GET-эндпоинты API: все маршруты роутера, включая
+        действия @action, и те же эндпоинты с типичными фильтрами,
+        сортировками и параметрами запроса.
+        """
+        pks = {
+            prefix: viewset.queryset.order_by('pk')
+            .values_list('pk', flat=True)
+            .first()
+            for prefix, viewset, _ in router.registry
+            if getattr(viewset, 'queryset', None) is not None
+        }
+        pks['users'] = user.id
+        endpoints = list(self.router_endpoints(pks))
+        ingredient = Ingredient.objects.first()
+        if ingredient:
+            endpoints.append(f'/api/ingredients/?name={ingredient.name[:2]}')
+        endpoints += [
+            '/api/recipes/?page=2&limit=6',
+            '/api/recipes/?is_favorited=1',
+            '/api/recipes/?is_in_shopping_cart=1',
+            f'/api/recipes/?author={user.id}',
+            '/api/recipes/?ordering=trending',
+            '/api/recipes/?facets=1',
+        ]
+        tags = '&'.join(
+            f'tags={slug}'
+            for slug in Tag.objects.values_list('slug', flat=True)[:3]
+        )
+        if tags:
+            endpoints += [
+                f'/api/recipes/?{tags}',
+                f'/api/recipes/?{tags}&facets=1',
+            ]
+        if pks.get('recipes'):
+            endpoints.append(
+                f'/api/recipes/{pks["recipes"]}/similar/?limit=6',
+            )
+        endpoints += [
+            '/api/recipes/feed/?limit=6',
+            '/api/users/subscriptions/?recipes_limit=3',
+        ]
+        return list(dict.fromkeys(endpoints))
+
+    def router_endpoints(self, pks: Dict[str, int]) -> Iterator[str]:
+        """Перечисляет GET-маршруты роутера API; в маршруты объекта
+        подставляется id из pks.
+        """
+        for prefix, viewset, _ in router.registry:
+            for route in router.get_routes(viewset):
+                mapping = router.get_method_map(viewset, route.mapping)
+                if 'get' not in mapping:
+                    continue
+                if route.detail and pks.get(prefix) is None:
+                    continue
+                url = route.url.format(
+                    prefix=prefix,
+                    lookup=pks.get(prefix),
+                    trailing_slash='/',
+                )
+                yield f'/api/{url.strip("^$")}'
+
+    def explain(self, sql: str, alias: str) -> Tuple[float, List[str]]:
+        """Выполняет EXPLAIN для запроса в базе данных alias и
+        возвращает время выполнения и список найденных проблем.
+        """
+        connection = connections[alias]
+        with transaction.atomic(using=alias), connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                cursor.execute(
+                    f'EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {sql}',
+                )
+                plan = cursor.fetchone()[0]
+                if isinstance(plan, str):
+                    plan = json.loads(plan)
+                result = self.analyze_postgres_plan(plan[0], alias)
+            elif connection.vendor == 'sqlite':
+                cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+                result = self.analyze_sqlite_plan(cursor.fetchall(), alias)
+            else:
+                raise CommandError(
+                    f'EXPLAIN для {connection.vendor} не поддерживается',
+                )
+            transaction.set_rollback(True, using=alias)
+        return result
+
+    def analyze_postgres_plan(
+        self, plan: Dict, alias: str,
+    ) -> Tuple[float, List[str]]:
+        """Ищет проблемные узлы в JSON-плане PostgreSQL."""
+        issues = []
+        for node in walk_plan(plan['Plan']):
+            node_type = node.get('Node Type')
+            if node_type == 'Seq Scan':
+                table = node['Relation Name']
+                rows = self.table_rows(table, alias)
+                if rows < self.large_table_rows:
+                    continue
+                issue = (
+                    f'Seq Scan по большой таблице {table} (~{rows} строк, '
+                    f'прочитано {node.get("Actual Rows", 0)} строк, '
+                    f'буферов: {node.get("Shared Read Blocks", 0)} с диска)'
+                )
+                columns = FILTER_COLUMNS.findall(node.get('Filter', ''))
+                if columns:
+                    issue += (
+                        '; кандидат на индекс: CREATE INDEX ON '
+                        f'{table} ({", ".join(dict.fromkeys(columns))})'
+                    )
+                issues.append(issue)
+            elif node_type in ('Sort', 'Incremental Sort') and (
+                node.get('Sort Space Type') == 'Disk'
+            ):
+                issues.append(
+                    f'Сортировка на диске ({node.get("Sort Method")}, '
+                    f'{node.get("Sort Space Used")} КБ) по ключу '
+                    f'{", ".join(node.get("Sort Key", []))}; увеличьте '
+                    'work_mem или добавьте индекс по ключу сортировки',
+                )
+            elif node_type == 'Hash' and node.get('Hash Batches', 1) > 1:
+                issues.append(
+                    f'Хеш-таблица выгружена на диск ({node["Hash Batches"]}'
+                    ' пакетов); увеличьте work_mem',
+                )
+        return plan.get('Execution Time', 0.0), issues
+
+    def analyze_sqlite_plan(
+        self, rows: List[Tuple], alias: str,
+    ) -> Tuple[float, List]:
+        """Ищет полное сканирование больших таблиц в плане SQLite."""
+        issues = []
+        for row in rows:
+            match = SQLITE_SCAN.match(row[-1])
+            if (
+                match
+                and self.table_rows(match[1], alias) >= self.large_table_rows
+            ):
+                issues.append(f'Полное сканирование таблицы {match[1]}')
+        return 0.0, issues
+
+    def table_rows(self, table: str, alias: str) -> int:
+        """Возвращает (оценочное) количество строк в таблице базы
+        данных alias.
+        """
+        connection = connections[alias]
+        if not hasattr(self, '_table_rows'):
+            self._table_rows = {}
+        if alias not in self._table_rows:
+            self._table_rows[alias] = dict.fromkeys(
+                connection.introspection.table_names(), None,
+            )
+        counts = self._table_rows[alias]
+        if table not in counts:
+            return 0
+        if counts[table] is None:
+            with connection.cursor() as cursor:
+                if connection.vendor == 'postgresql':
+                    cursor.execute(
+                        'SELECT reltuples::bigint FROM pg_class '
+                        'WHERE relname = %s',
+                        [table],
+                    )
+                else:
+                    cursor.execute(
+                        f'SELECT COUNT(*) FROM '
+                        f'{connection.ops.quote_name(table)}',
+                    )
+                row = cursor.fetchone()
+            counts[table] = int(row[0]) if row else 0
+        return counts[table]
+
+
+def walk_plan(node: Dict) -> Iterator[Dict]:
+    """Обходит все узлы плана выполнения."""
+    stack = [node]
+    while stack:
+        current = stack.pop()
+        yield current
+        stack.extend(current.get('Plans', []))
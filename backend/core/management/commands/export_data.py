@@ -0,0 +1,40 @@
+import gzip
+import sys
+from typing import IO
+
+from django.core.management.base import BaseCommand
+
+from api.transfer import Throughput, dump_records, export_records
+
+
+class Command(BaseCommand):
+    """Команда для потоковой выгрузки всех данных в JSONL.
+    Пользователи (вместе с хэшами паролей), тэги, ингредиенты, рецепты с
+    ингредиентами, тэгами и ссылками на изображения, избранное, списки
+    покупок и подписки выгружаются по одной записи в строке в порядке,
+    в котором их загружает import_data. Файлы с расширением .gz
+    сжимаются. Сами изображения копируются отдельно вместе с MEDIA_ROOT.
+    """
+
+    help = 'Потоковая выгрузка данных в JSONL для переноса между окружениями'
+
+    def add_arguments(self, parser: any) -> None:
+        parser.add_argument('path', help='Файл выгрузки или - для stdout')
+        parser.add_argument('--batch-size', type=int, default=2000)
+
+    def handle(self, *args: any, **options: any) -> None:
+        stats = Throughput()
+        with open_output(options['path']) as file:
+            file.writelines(
+                dump_records(export_records(options['batch_size'], stats)),
+            )
+        for line in stats.report():
+            self.stderr.write(line)
+
+
+def open_output(path: str) -> IO[str]:
+    if path == '-':
+        return open(sys.stdout.fileno(), 'w', encoding='utf-8', closefd=False)
+    if path.endswith('.gz'):
+        return gzip.open(path, 'wt', encoding='utf-8')
+    return open(path, 'w', encoding='utf-8')
@@ -1,7 +1,9 @@
 import csv
 import os
 
+from django.core.management import call_command
 from django.core.management.base import BaseCommand
+from django.db import transaction
 
 from recipes.models import Ingredient
 
@@ -26,11 +28,13 @@ class Command(BaseCommand):
                 'Процесс импорта начат, он будет выполнен примерно за 20'
                 ' секунд',
             )
-            for row in reader:
-                name = row[0]
-                measurement_unit = row[1]
-                Ingredient.objects.get_or_create(
-                    name=name,
-                    measurement_unit=measurement_unit,
-                )
+            with transaction.atomic():
+                for row in reader:
+                    name = row[0]
+                    measurement_unit = row[1]
+                    Ingredient.objects.get_or_create(
+                        name=name,
+                        measurement_unit=measurement_unit,
+                    )
             self.stdout.write(self.style.SUCCESS('Ингредиенты импортированы'))
+        call_command('build_ingredient_bundle', stdout=self.stdout)
@@ -0,0 +1,65 @@
+import gzip
+import sys
+from typing import IO
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+
+from api import facets, search
+from api.transfer import Importer, Throughput
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    """Команда для потоковой загрузки данных, выгруженных export_data.
+    Файл читается построчно, записи сохраняются пакетами по
+    --batch-size через bulk_create с переводом id исходной базы в id
+    новой. bulk_create не вызывает сигналы моделей, поэтому после
+    загрузки команда сама перестраивает документы рецептов, входящие
+    ленты подписчиков и статический каталог ингредиентов и сбрасывает
+    индексы фасетов и поиска ингредиентов во всех воркерах. Также стоит
+    выполнить compact_trending и build_similarity_index --full.
+    Рецепты всегда создаются заново, поэтому повторная загрузка
+    дублирует их: в базу с рецептами команда загружает данные только
+    с флагом --append.
+    """
+
+    help = (
+        'Потоковая загрузка данных из JSONL, выгруженного export_data. '
+        'Повторная загрузка дублирует рецепты, в базу с рецептами данные '
+        'загружаются только с --append'
+    )
+
+    def add_arguments(self, parser: any) -> None:
+        parser.add_argument('path', help='Файл выгрузки или - для stdin')
+        parser.add_argument('--batch-size', type=int, default=2000)
+        parser.add_argument(
+            '--append',
+            action='store_true',
+            help='Загрузить рецепты в базу, где рецепты уже есть',
+        )
+
+    def handle(self, *args: any, **options: any) -> None:
+        if not options['append'] and Recipe.objects.exists():
+            raise CommandError(
+                'В базе уже есть рецепты, повторная загрузка их '
+                'продублирует. Чтобы загрузить данные, укажите --append',
+            )
+        stats = Throughput()
+        with open_input(options['path']) as file:
+            Importer(options['batch_size'], stats).load(file)
+        for line in stats.report():
+            self.stdout.write(self.style.SUCCESS(line))
+        call_command('rebuild_recipe_documents', stdout=self.stdout)
+        call_command('rebuild_feed', stdout=self.stdout)
+        call_command('build_ingredient_bundle', stdout=self.stdout)
+        facets.invalidate()
+        search.invalidate()
+
+
+def open_input(path: str) -> IO[str]:
+    if path == '-':
+        return open(sys.stdin.fileno(), encoding='utf-8', closefd=False)
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rt', encoding='utf-8')
+    return open(path, encoding='utf-8')
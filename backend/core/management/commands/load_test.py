@@ -0,0 +1,369 @@
+import asyncio
+import random
+import resource
+import statistics
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import quote, urlsplit
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.authtoken.models import Token
+
+from recipes.models import Ingredient, Recipe
+
+User = get_user_model()
+
+LOAD_TEST_EMAIL = 'loadtest_{}@example.com'
+PERCENTILES: Tuple[int] = (50, 90, 95, 99)
+
+Call = Tuple[str, str, str, Optional[str]]
+
+
+class Command(BaseCommand):
+    """Команда для нагрузочного тестирования API.
+    Запускает множество конкурентных asyncio-клиентов, которые выполняют
+    смесь запросов на чтение и запись к ASGI или WSGI приложению в том же
+    процессе, либо к уже запущенному серверу по HTTP, и выводит
+    пропускную способность, распределение задержек и долю ошибок.
+    """
+
+    help = 'Нагрузочное тестирование API в процессе или по HTTP'
+
+    def add_arguments(self, parser: any) -> None:
+        parser.add_argument(
+            '--target',
+            choices=('asgi', 'wsgi', 'http'),
+            default='asgi',
+            help='Куда отправлять запросы',
+        )
+        parser.add_argument(
+            '--url',
+            default='http://127.0.0.1:8000',
+            help='Адрес сервера для --target=http',
+        )
+        parser.add_argument('--requests', type=int, default=1000)
+        parser.add_argument('--concurrency', type=int, default=50)
+        parser.add_argument(
+            '--write-ratio',
+            type=float,
+            default=0.1,
+            help='Доля запросов на запись (избранное, список покупок)',
+        )
+        parser.add_argument(
+            '--users',
+            type=int,
+            default=10,
+            help='Количество пользователей с токенами для клиентов',
+        )
+        parser.add_argument('--seed', type=int, default=None)
+
+    def handle(self, *args: any, **options: any) -> None:
+        if options['concurrency'] < 1 or options['requests'] < 1:
+            raise CommandError('--requests и --concurrency должны быть > 0')
+        calls = self.prepare(options)
+        if options['target'] == 'asgi':
+            from backend.asgi import application
+
+            send = self.asgi_sender(application)
+        elif options['target'] == 'wsgi':
+            from backend.wsgi import application
+
+            executor = ThreadPoolExecutor(options['concurrency'])
+            send = self.wsgi_sender(application, executor)
+        else:
+            send = self.http_sender(options['url'])
+
+        started = time.perf_counter()
+        results = asyncio.run(
+            self.run_clients(calls, send, options['concurrency']),
+        )
+        elapsed = time.perf_counter() - started
+        self.report(results, elapsed, options)
+
+    def prepare(self, options: Dict) -> List[Call]:
+        """Готовит пользователей, токены и список запросов для теста."""
+        self.random = random.Random(options['seed'])
+        self.tokens = self.prepare_tokens(options['users'])
+        self.recipe_ids = list(Recipe.objects.values_list('id', flat=True))
+        self.ingredient_prefixes = [
+            name[:2]
+            for name in Ingredient.objects.values_list('name', flat=True)[
+                :100
+            ]
+        ] or ['а']
+        return [
+            self.make_call(options['write_ratio'])
+            for _ in range(options['requests'])
+        ]
+
+    def prepare_tokens(self, count: int) -> List[str]:
+        """Создает (или переиспользует) пользователей для нагрузочного
+        теста и возвращает их токены.
+        """
+        tokens = []
+        for number in range(count):
+            user, created = User.objects.get_or_create(
+                email=LOAD_TEST_EMAIL.format(number),
+                defaults={
+                    'username': f'loadtest_{number}',
+                    'first_name': 'Load',
+                    'last_name': 'Test',
+                },
+            )
+            if created:
+                user.set_unusable_password()
+                user.save(update_fields=('password',))
+            token, _ = Token.objects.get_or_create(user=user)
+            tokens.append(token.key)
+        return tokens
+
+    def make_call(self, write_ratio: float) -> Call:
+        """Возвращает случайный запрос: (метка, метод, путь, токен)."""
+        token = self.random.choice(self.tokens) if self.tokens else None
+        if self.recipe_ids and self.random.random() < write_ratio:
+            recipe_id = self.random.choice(self.recipe_ids)
+            action = self.random.choice(('favorite', 'shopping_cart'))
+            method = self.random.choice(('POST', 'DELETE'))
+            return (
+                f'{method} {action}',
+                method,
+                f'/api/recipes/{recipe_id}/{action}/',
+                token,
+            )
+        reads = [
+            ('GET recipes', '/api/recipes/?limit=6'),
+            ('GET tags', '/api/tags/'),
+            (
+                'GET ingredients',
+                '/api/ingredients/?name='
+                + quote(self.random.choice(self.ingredient_prefixes)),
+            ),
+        ]
+        if self.recipe_ids:
+            reads.append(
+                (
+                    'GET recipe',
+                    f'/api/recipes/{self.random.choice(self.recipe_ids)}/',
+                ),
+            )
+        label, path = self.random.choice(reads)
+        return label, 'GET', path, token
+
+    async def run_clients(
+        self, calls: List[Call], send: any, concurrency: int,
+    ) -> List[Tuple[str, int, float]]:
+        """Раздает запросы конкурентным клиентам и собирает результаты."""
+        queue: asyncio.Queue = asyncio.Queue()
+        for call in calls:
+            queue.put_nowait(call)
+        results: List[Tuple[str, int, float]] = []
+        self.exceptions = Counter()
+
+        async def client() -> None:
+            while not queue.empty():
+                label, method, path, token = queue.get_nowait()
+                started = time.perf_counter()
+                try:
+                    status = await send(method, path, token)
+                except Exception as error:
+                    self.exceptions[type(error).__name__] += 1
+                    status = 0
+                results.append(
+                    (label, status, time.perf_counter() - started),
+                )
+
+        await asyncio.gather(*(client() for _ in range(concurrency)))
+        return results
+
+    def asgi_sender(self, application: any) -> any:
+        """Возвращает функцию, вызывающую ASGI приложение напрямую."""
+
+        async def send(method: str, path: str, token: Optional[str]) -> int:
+            path, _, query = path.partition('?')
+            headers = [(b'host', b'localhost')]
+            if token:
+                headers.append((b'authorization', f'Token {token}'.encode()))
+            scope = {
+                'type': 'http',
+                'asgi': {'version': '3.0'},
+                'http_version': '1.1',
+                'method': method,
+                'scheme': 'http',
+                'path': path,
+                'raw_path': path.encode(),
+                'query_string': query.encode(),
+                'root_path': '',
+                'headers': headers,
+                'client': ('127.0.0.1', 0),
+                'server': ('localhost', 80),
+            }
+            request_sent = False
+            status = 0
+
+            async def receive() -> Dict:
+                nonlocal request_sent
+                if not request_sent:
+                    request_sent = True
+                    return {'type': 'http.request', 'body': b''}
+                await asyncio.Event().wait()
+
+            async def respond(message: Dict) -> None:
+                nonlocal status
+                if message['type'] == 'http.response.start':
+                    status = message['status']
+
+            await application(scope, receive, respond)
+            return status
+
+        return send
+
+    def wsgi_sender(
+        self, application: any, executor: ThreadPoolExecutor,
+    ) -> any:
+        """Возвращает функцию, вызывающую WSGI приложение в пуле потоков,
+        как это делают потоковые воркеры gunicorn.
+        """
+
+        def call(method: str, path: str, token: Optional[str]) -> int:
+            path, _, query = path.partition('?')
+            environ = {
+                'REQUEST_METHOD': method,
+                'PATH_INFO': path,
+                'QUERY_STRING': query,
+                'SERVER_NAME': 'localhost',
+                'SERVER_PORT': '80',
+                'HTTP_HOST': 'localhost',
+                'SERVER_PROTOCOL': 'HTTP/1.1',
+                'wsgi.version': (1, 0),
+                'wsgi.url_scheme': 'http',
+                'wsgi.input': BytesIO(b''),
+                'wsgi.errors': BytesIO(),
+                'wsgi.multithread': True,
+                'wsgi.multiprocess': False,
+                'wsgi.run_once': False,
+            }
+            if token:
+                environ['HTTP_AUTHORIZATION'] = f'Token {token}'
+            status = []
+
+            def start_response(
+                status_line: str, headers: List, exc_info: any = None,
+            ) -> None:
+                status.append(int(status_line.split(' ', 1)[0]))
+
+            response = application(environ, start_response)
+            try:
+                for _ in response:
+                    pass
+            finally:
+                if hasattr(response, 'close'):
+                    response.close()
+            return status[0]
+
+        async def send(method: str, path: str, token: Optional[str]) -> int:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(
+                executor, call, method, path, token,
+            )
+
+        return send
+
+    def http_sender(self, url: str) -> any:
+        """Возвращает функцию, отправляющую запросы по HTTP/1.1."""
+        parts = urlsplit(url)
+        host = parts.hostname or '127.0.0.1'
+        port = parts.port or 80
+
+        async def send(method: str, path: str, token: Optional[str]) -> int:
+            reader, writer = await asyncio.open_connection(host, port)
+            lines = [
+                f'{method} {path} HTTP/1.1',
+                f'Host: {parts.netloc}',
+                'Connection: close',
+                'Content-Length: 0',
+            ]
+            if token:
+                lines.append(f'Authorization: Token {token}')
+            writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode())
+            await writer.drain()
+            status_line = await reader.readline()
+            await reader.read()
+            writer.close()
+            return int(status_line.split()[1])
+
+        return send
+
+    def report(
+        self,
+        results: List[Tuple[str, int, float]],
+        elapsed: float,
+        options: Dict,
+    ) -> None:
+        """Выводит сводку по результатам нагрузочного теста."""
+        latencies = defaultdict(list)
+        statuses = Counter()
+        errors = Counter()
+        for label, status, latency in results:
+            latencies[label].append(latency)
+            latencies['ВСЕГО'].append(latency)
+            statuses[status] += 1
+            if status == 0 or status >= 500:
+                errors[label] += 1
+        total = len(results)
+        self.stdout.write(
+            f'Цель: {options["target"]}, запросов: {total}, '
+            f'клиентов: {options["concurrency"]}',
+        )
+        self.stdout.write(
+            f'Время: {elapsed:.2f} с, пропускная способность: '
+            f'{total / elapsed:.1f} запросов/с',
+        )
+        self.stdout.write(
+            'Пиковая память процесса: '
+            f'{resource.getrusage(resource.RUSAGE_SELF).ru_maxrss // 1024}'
+            ' МБ',
+        )
+        header = ' '.join(f'p{p:<7}' for p in PERCENTILES)
+        self.stdout.write(f'\n{"Запрос":<22} {"кол-во":>7} {header} ошибки')
+        for label in sorted(latencies):
+            values = sorted(latencies[label])
+            row = ' '.join(
+                f'{percentile(values, p) * 1000:<8.1f}' for p in PERCENTILES
+            )
+            failed = (
+                sum(errors.values()) if label == 'ВСЕГО' else errors[label]
+            )
+            self.stdout.write(
+                f'{label:<22} {len(values):>7} {row} {failed}',
+            )
+        self.stdout.write(
+            '\nСтатусы ответов: '
+            + ', '.join(
+                f'{status or "ошибка"}: {count}'
+                for status, count in sorted(statuses.items())
+            ),
+        )
+        if self.exceptions:
+            self.stdout.write(
+                'Исключения клиентов: '
+                + ', '.join(
+                    f'{name}: {count}'
+                    for name, count in self.exceptions.most_common()
+                ),
+            )
+        failed = sum(errors.values())
+        self.stdout.write(
+            f'Доля ошибок: {failed / total:.2%}, '
+            f'средняя задержка: '
+            f'{statistics.mean(latencies["ВСЕГО"]) * 1000:.1f} мс',
+        )
+
+
+def percentile(values: List[float], percent: int) -> float:
+    """Возвращает перцентиль из отсортированного списка значений."""
+    index = min(len(values) - 1, int(len(values) * percent / 100))
+    return values[index]
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from api.feed import backfill_all
+
+
+class Command(BaseCommand):
+    """Команда для заполнения входящих лент подписчиков последними
+    рецептами авторов, на которых они подписаны. Нужна после загрузки
+    данных в обход сигналов: уже существующие записи не дублируются.
+    """
+
+    help = 'Заполнение входящих лент подписчиков'
+
+    def handle(self, *args: any, **options: any) -> None:
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Обработано записей лент: {backfill_all()}',
+            ),
+        )
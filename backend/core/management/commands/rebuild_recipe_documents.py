@@ -0,0 +1,55 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import List
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from api.documents import rebuild_documents
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    """Команда для перестройки документов всех рецептов.
+    Рецепты делятся на пакеты по --batch-size, которые параллельно
+    обрабатываются в --workers процессах. Документы удаленных рецептов
+    удаляются каскадно вместе с рецептами.
+    """
+
+    help = 'Перестройка сохраненных документов рецептов'
+
+    def add_arguments(self, parser: any) -> None:
+        parser.add_argument('--workers', type=int, default=os.cpu_count())
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args: any, **options: any) -> None:
+        started = time.monotonic()
+        recipe_ids = list(
+            Recipe.objects.order_by('id').values_list('id', flat=True),
+        )
+        size = options['batch_size']
+        batches = [
+            recipe_ids[start:start + size]
+            for start in range(0, len(recipe_ids), size)
+        ]
+        if options['workers'] > 1 and len(batches) > 1:
+            connections.close_all()
+            with ProcessPoolExecutor(options['workers']) as executor:
+                built = sum(executor.map(rebuild_batch, batches))
+        else:
+            built = sum(map(rebuild_documents, batches))
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Перестроено документов: {built} за '
+                f'{time.monotonic() - started:.1f} с',
+            ),
+        )
+
+
+def rebuild_batch(recipe_ids: List[int]) -> int:
+    """Перестраивает пакет документов в процессе-обработчике."""
+    try:
+        return rebuild_documents(recipe_ids)
+    finally:
+        connections.close_all()
@@ -0,0 +1,61 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from api.images import collect_orphans, legacy_images, rehash_image, storage
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    """Команда для переноса изображений рецептов на пути по содержимому.
+    Каждый файл, сохраненный под старым именем, хэшируется и
+    сохраняется заново в --workers потоках: чтение и хэширование файлов
+    не держат GIL. Рецепты с одинаковыми изображениями начинают
+    ссылаться на один файл, старые файлы удаляются. С --collect-orphans
+    также удаляются файлы, на которые не ссылается ни один рецепт.
+    """
+
+    help = 'Перенос изображений рецептов на пути по содержимому'
+
+    def add_arguments(self, parser: any) -> None:
+        parser.add_argument('--workers', type=int, default=os.cpu_count())
+        parser.add_argument('--collect-orphans', action='store_true')
+
+    def handle(self, *args: any, **options: any) -> None:
+        started = time.monotonic()
+        names = legacy_images()
+        with ThreadPoolExecutor(options['workers']) as executor:
+            results = list(executor.map(rehash_file, names))
+        for result in results:
+            if result['new_name'] is None:
+                self.stderr.write(f'Файл не найден: {result["name"]}')
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Перенесено файлов: '
+                f'{sum(bool(result["new_name"]) for result in results)}, '
+                f'рецептов: {sum(result["recipes"] for result in results)}, '
+                f'уникальных файлов: '
+                f'{len({result["new_name"] for result in results} - {None})}'
+                f', за {time.monotonic() - started:.1f} с',
+            ),
+        )
+        directory = Recipe._meta.get_field('image').upload_to.rstrip('/')
+        if options['collect_orphans'] and storage.exists(directory):
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f'Удалено неиспользуемых файлов: '
+                    f'{collect_orphans(directory)}',
+                ),
+            )
+
+
+def rehash_file(name: str) -> Dict:
+    """Переносит файл в потоке-обработчике."""
+    try:
+        return rehash_image(name)
+    finally:
+        connections.close_all()
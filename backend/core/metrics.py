@@ -0,0 +1,18 @@
+from threading import Lock
+from typing import Callable, Dict
+
+_providers: Dict[str, Callable[[], Dict]] = {}
+_lock = Lock()
+
+
+def register(name: str, provider: Callable[[], Dict]) -> None:
+    """Регистрирует источник метрик текущего процесса под именем name."""
+    with _lock:
+        _providers[name] = provider
+
+
+def collect() -> Dict[str, Dict]:
+    """Возвращает значения всех зарегистрированных метрик процесса."""
+    with _lock:
+        providers = list(_providers.items())
+    return {name: provider() for name, provider in providers}
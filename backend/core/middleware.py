@@ -0,0 +1,191 @@
+import asyncio
+import time
+from typing import Callable, Optional
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured, MiddlewareNotUsed
+from django.http import HttpRequest, HttpResponse, JsonResponse
+from rest_framework.permissions import SAFE_METHODS
+
+from core import metrics
+from core.db.routers import pin_to_primary, set_read_database
+from core.limiter import (
+    HEAVY,
+    PRIORITY_SHARE,
+    READ,
+    WRITE,
+    AdaptiveConcurrencyLimiter,
+)
+
+OVERLOADED = 'Сервер перегружен, повторите запрос позже.'
+PROCESS_LOCAL_CACHES = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+class ReadReplicaMiddleware:
+    """Закрепляет клиента за основной базой данных на
+    REPLICA_PIN_SECONDS секунд после успешного запроса на запись, после
+    входа - и по выданному токену, и сбрасывает выбранную для запроса
+    реплику (ее выбирает ReplicaReadMixin). Закрепление хранится в кэше
+    default, поэтому при репликах кэш должен быть общим для воркеров.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response: Callable) -> None:
+        if not settings.DATABASE_REPLICAS:
+            raise MiddlewareNotUsed
+        if settings.CACHES['default']['BACKEND'] in PROCESS_LOCAL_CACHES:
+            raise ImproperlyConfigured(
+                'С репликами базы данных (DB_REPLICA_HOSTS) нужен общий '
+                'для воркеров кэш (CACHE_BACKEND), иначе закрепление '
+                'клиента за основной базой не работает.',
+            )
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request: HttpRequest) -> HttpResponse:
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        try:
+            response = self.get_response(request)
+        finally:
+            set_read_database(None)
+        if should_pin(request, response):
+            pin_to_primary(request, issued_token(response))
+        return response
+
+    async def __acall__(self, request: HttpRequest) -> HttpResponse:
+        try:
+            response = await self.get_response(request)
+        finally:
+            set_read_database(None)
+        if should_pin(request, response):
+            await sync_to_async(pin_to_primary)(
+                request, issued_token(response),
+            )
+        return response
+
+
+def should_pin(request: HttpRequest, response: HttpResponse) -> bool:
+    return request.method not in SAFE_METHODS and response.status_code < 400
+
+
+def issued_token(response: HttpResponse) -> Optional[str]:
+    data = getattr(response, 'data', None)
+    return data.get('auth_token') if isinstance(data, dict) else None
+
+
+class LoadSheddingMiddleware:
+    """Сбрасывает избыточную нагрузку до обращения к базе данных.
+    Число одновременных запросов воркера ограничено адаптивным лимитом
+    (AdaptiveConcurrencyLimiter). Запросы сверх лимита, а также запросы,
+    прождавшие в очереди перед воркером дольше MAX_QUEUE_SECONDS (по
+    заголовку X-Request-Start от nginx), сразу получают 503 с
+    Retry-After. Тяжелые эндпоинты (HEAVY_PATHS) и запись отбрасываются
+    раньше дешевого чтения.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response: Callable) -> None:
+        config = settings.LOAD_SHEDDING
+        if not config['ENABLED']:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+        self.heavy_paths = tuple(config['HEAVY_PATHS'])
+        self.max_queue_seconds = config['MAX_QUEUE_SECONDS']
+        self.limiter = AdaptiveConcurrencyLimiter(
+            initial_limit=config['INITIAL_LIMIT'],
+            min_limit=config['MIN_LIMIT'],
+            max_limit=config['MAX_LIMIT'],
+            tolerance=config['LATENCY_TOLERANCE'],
+        )
+        metrics.register('load_shedding', self.limiter.get_stats)
+
+    def __call__(self, request: HttpRequest) -> HttpResponse:
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        response = self.admit(request)
+        if response is not None:
+            return response
+        started = time.monotonic()
+        failed = True
+        try:
+            response = self.get_response(request)
+            failed = response.status_code >= 500
+        finally:
+            self.limiter.release(
+                time.monotonic() - started, failed, route_key(request),
+            )
+        return response
+
+    async def __acall__(self, request: HttpRequest) -> HttpResponse:
+        response = self.admit(request)
+        if response is not None:
+            return response
+        started = time.monotonic()
+        failed = True
+        try:
+            response = await self.get_response(request)
+            failed = response.status_code >= 500
+        finally:
+            self.limiter.release(
+                time.monotonic() - started, failed, route_key(request),
+            )
+        return response
+
+    def get_priority(self, request: HttpRequest) -> str:
+        if request.path.startswith(self.heavy_paths):
+            return HEAVY
+        if request.method in SAFE_METHODS:
+            return READ
+        return WRITE
+
+    def admit(self, request: HttpRequest) -> Optional[HttpResponse]:
+        """Занимает слот лимитера или возвращает ответ 503."""
+        priority = self.get_priority(request)
+        waited = queue_time(request)
+        if waited is not None and waited > (
+            self.max_queue_seconds * PRIORITY_SHARE[priority]
+        ):
+            self.limiter.reject('queue')
+        elif self.limiter.try_acquire(priority):
+            return None
+        response = JsonResponse(
+            {'detail': OVERLOADED},
+            status=503,
+            json_dumps_params={'ensure_ascii': False},
+        )
+        response['Retry-After'] = str(self.limiter.retry_after())
+        return response
+
+
+def route_key(request: HttpRequest) -> str:
+    """Ключ маршрута запроса для базовой задержки лимитера: метод и
+    шаблон URL, а для запросов без маршрута - только метод.
+    """
+    match = getattr(request, 'resolver_match', None)
+    return f'{request.method} {match.route if match else ""}'
+
+
+def queue_time(request: HttpRequest) -> Optional[float]:
+    """Время ожидания запроса между nginx и воркером в секундах по
+    заголовку X-Request-Start вида 't=<unix time>'.
+    """
+    header = request.META.get('HTTP_X_REQUEST_START', '')
+    if header.startswith('t='):
+        header = header[2:]
+    try:
+        started = float(header)
+    except ValueError:
+        return None
+    return max(0.0, time.time() - started)
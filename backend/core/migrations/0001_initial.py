@@ -0,0 +1,26 @@
+# Generated by Django 3.2 on 2026-10-19 09:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InvalidationVersion',
+            fields=[
+                ('topic', models.CharField(max_length=64, primary_key=True, serialize=False, verbose_name='Тема')),
+                ('version', models.BigIntegerField(default=0, verbose_name='Версия')),
+                ('updated', models.DateTimeField(auto_now=True, verbose_name='Изменено')),
+            ],
+            options={
+                'verbose_name': 'версия кэша',
+                'verbose_name_plural': 'версии кэшей',
+            },
+        ),
+    ]
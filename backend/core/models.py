@@ -0,0 +1,19 @@
+from django.db import models
+
+
+class InvalidationVersion(models.Model):
+    """Номер последнего сообщения шины сброса кэшей по каждой теме.
+    Воркеры периодически сверяют номера со своими и сбрасывают кэши тем,
+    сообщения которых они пропустили.
+    """
+
+    topic = models.CharField('Тема', max_length=64, primary_key=True)
+    version = models.BigIntegerField('Версия', default=0)
+    updated = models.DateTimeField('Изменено', auto_now=True)
+
+    class Meta:
+        verbose_name: str = 'версия кэша'
+        verbose_name_plural: str = 'версии кэшей'
+
+    def __str__(self) -> str:
+        return f'{self.topic}: {self.version}'
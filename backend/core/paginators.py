@@ -0,0 +1,33 @@
+from django.conf import settings
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+
+
+class EstimatedCountPaginator(Paginator):
+    """Пагинатор для списков админки по большим таблицам.
+    Для списка без фильтров в PostgreSQL число строк берется из оценки
+    планировщика (pg_class.reltuples) вместо COUNT(*) по всей таблице.
+    Для списков с фильтрами и поиском подсчет ограничен
+    ADMIN_COUNT_LIMIT строками: дальние страницы большой выборки
+    недоступны, зато подсчет не читает всю выборку.
+    """
+
+    @cached_property
+    def count(self) -> int:
+        queryset = self.object_list
+        query = getattr(queryset, 'query', None)
+        if query is None:
+            return super().count
+        connection = connections[queryset.db]
+        if not query.where and connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    'SELECT reltuples::bigint FROM pg_class '
+                    'WHERE oid = %s::regclass',
+                    [queryset.model._meta.db_table],
+                )
+                row = cursor.fetchone()
+            if row and row[0] > settings.ADMIN_COUNT_LIMIT:
+                return int(row[0])
+        return queryset[: settings.ADMIN_COUNT_LIMIT].count()
@@ -0,0 +1,104 @@
+import hashlib
+import os
+import posixpath
+import re
+import tempfile
+import time
+from typing import Optional
+
+from django.conf import settings
+from django.core.files.base import File
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+HASHED_NAME = re.compile(
+    r'^(?:.*/)?[0-9a-f]{2}/[0-9a-f]{2}/[0-9a-f]{64}\.\w+$',
+)
+
+
+def content_name(name: str, content: File) -> str:
+    """Возвращает путь файла по SHA-256 его содержимого:
+    <каталог>/ab/cd/<хэш>.<расширение>. Каталог и расширение берутся из
+    имени, сформированного upload_to поля.
+    """
+    digest = hashlib.sha256()
+    content.seek(0)
+    for chunk in content.chunks():
+        digest.update(chunk)
+    content.seek(0)
+    hexdigest = digest.hexdigest()
+    ext = posixpath.splitext(name)[1].lower() or '.bin'
+    return posixpath.join(
+        posixpath.dirname(name),
+        hexdigest[:2],
+        hexdigest[2:4],
+        hexdigest + ext,
+    )
+
+
+def is_hashed(name: str) -> bool:
+    return bool(HASHED_NAME.match(name))
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """Файловое хранилище, в котором имя файла определяется его
+    содержимым. Одинаковые изображения разных рецептов хранятся одним
+    файлом, а файл по имени никогда не меняется, поэтому его можно
+    отдавать с Cache-Control: immutable.
+    """
+
+    def save(
+        self, name: str, content: File, max_length: Optional[int] = None,
+    ) -> str:
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        return super().save(content_name(name, content), content, max_length)
+
+    def get_available_name(
+        self, name: str, max_length: Optional[int] = None,
+    ) -> str:
+        """Имя уже уникально по содержимому: существующий файл с этим
+        именем совпадает с сохраняемым и не переименовывается.
+        """
+        return name
+
+    def _save(self, name: str, content: File) -> str:
+        """Записывает файл во временный файл того же каталога и атомарно
+        переносит его на место. Если файл уже есть, обновляется только
+        время его изменения, чтобы сборка неиспользуемых файлов не удалила
+        его до сохранения ссылки на него.
+        """
+        full_path = self.path(name)
+        if os.path.exists(full_path):
+            os.utime(full_path)
+            return name
+        directory = os.path.dirname(full_path)
+        os.makedirs(directory, exist_ok=True)
+        descriptor, temporary = tempfile.mkstemp(dir=directory)
+        try:
+            with os.fdopen(descriptor, 'wb') as file:
+                for chunk in content.chunks():
+                    file.write(chunk)
+            if self.file_permissions_mode is not None:
+                os.chmod(temporary, self.file_permissions_mode)
+            os.replace(temporary, full_path)
+        except BaseException:
+            if os.path.exists(temporary):
+                os.remove(temporary)
+            raise
+        return name
+
+    def delete_orphan(self, name: str) -> bool:
+        """Удаляет файл name, на который больше нет ссылок, если он не
+        изменялся последние IMAGE_ORPHAN_GRACE секунд. Недавно сохраненный
+        файл может быть нужен еще не завершенной транзакции; такие файлы
+        удаляет команда rehash_images. Возвращает True, если файл удален.
+        """
+        if not name or not self.exists(name):
+            return False
+        age = time.time() - os.path.getmtime(self.path(name))
+        if age < settings.IMAGE_ORPHAN_GRACE:
+            return False
+        self.delete(name)
+        return True
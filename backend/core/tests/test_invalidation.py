@@ -0,0 +1,172 @@
+import json
+import tempfile
+from pathlib import Path
+from typing import List, Optional
+from unittest import mock
+
+from django.db import transaction
+from django.test import TestCase, TransactionTestCase
+
+from core import invalidation
+from core.models import InvalidationVersion
+
+TOPIC = 'test-topic'
+OTHER = 'test-other'
+
+
+class RecordingBackend:
+    def __init__(self) -> None:
+        self.messages = []
+
+    def send(self, message: str) -> None:
+        self.messages.append(json.loads(message))
+
+
+class SubscribeMixin:
+    def subscribe(self, topic: str) -> List[Optional[List[str]]]:
+        received = []
+        invalidation.subscribe(topic, received.append)
+        self.addCleanup(invalidation._handlers.pop, topic, None)
+        return received
+
+
+class PublishTests(SubscribeMixin, TransactionTestCase):
+    def setUp(self) -> None:
+        self.backend = RecordingBackend()
+        patcher = mock.patch.object(invalidation, '_backend', self.backend)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_transaction_sends_one_message_per_topic(self) -> None:
+        received = self.subscribe(TOPIC)
+        with transaction.atomic():
+            invalidation.publish(TOPIC, [1, 2])
+            invalidation.publish(TOPIC, [2, 3])
+            invalidation.publish(OTHER, [4])
+            invalidation.publish(OTHER)
+            self.assertEqual(self.backend.messages, [])
+        self.assertEqual(
+            sorted(
+                (message['t'], message['k'], message['v'])
+                for message in self.backend.messages
+            ),
+            [(OTHER, None, 1), (TOPIC, ['1', '2', '3'], 1)],
+        )
+        self.assertEqual(received, [['1', '2', '3']])
+
+    def test_each_commit_bumps_topic_version_once(self) -> None:
+        for _ in range(2):
+            with transaction.atomic():
+                invalidation.publish(TOPIC, [1])
+                invalidation.publish(TOPIC, [2])
+        self.assertEqual(
+            [message['v'] for message in self.backend.messages], [1, 2],
+        )
+        self.assertEqual(
+            InvalidationVersion.objects.get(topic=TOPIC).version, 2,
+        )
+
+    def test_publish_outside_transaction_is_sent_at_once(self) -> None:
+        invalidation.publish(TOPIC, [1])
+        invalidation.publish(TOPIC, [])
+        self.assertEqual(
+            [message['k'] for message in self.backend.messages], [['1']],
+        )
+
+    def test_rolled_back_transaction_sends_nothing(self) -> None:
+        with transaction.atomic():
+            invalidation.publish(TOPIC, [1])
+            transaction.set_rollback(True)
+        with transaction.atomic():
+            invalidation.publish(TOPIC, [2])
+        self.assertEqual(
+            [
+                (message['k'], message['v'])
+                for message in self.backend.messages
+            ],
+            [(['2'], 1)],
+        )
+
+
+class ListenerTests(SubscribeMixin, TestCase):
+    """Сверка номеров тем слушателем, получающим сообщения из файла."""
+
+    def setUp(self) -> None:
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.backend = invalidation.FileBackend(
+            Path(directory.name) / 'messages.log',
+        )
+        self.backend.read()
+        self.received = self.subscribe(TOPIC)
+        InvalidationVersion.objects.create(topic=TOPIC, version=0)
+        self.listener = invalidation.Listener(self.backend, 60)
+        self.poll()
+
+    def poll(self) -> None:
+        """Сверка номеров без закрытия соединения тестовой транзакции."""
+        with mock.patch.object(invalidation.connections, 'close_all'):
+            self.listener.poll()
+
+    def commit(self, version: int) -> None:
+        """Номер темы, зафиксированный другим воркером."""
+        InvalidationVersion.objects.filter(topic=TOPIC).update(
+            version=version,
+        )
+
+    def deliver(self, version: int, keys: List[str]) -> None:
+        self.backend.write(
+            json.dumps({'t': TOPIC, 'k': keys, 'o': 'other', 'v': version}),
+        )
+        for message in self.backend.read():
+            self.listener.receive(message)
+
+    def test_lost_message_flushes_topic_at_next_poll(self) -> None:
+        missed = invalidation.stats['missed']
+        self.commit(3)
+        self.deliver(1, ['a'])
+        self.deliver(3, ['c'])
+        self.poll()
+        self.assertEqual(self.received, [['a'], ['c']])
+        self.poll()
+        self.assertEqual(self.received, [['a'], ['c'], None])
+        self.assertEqual(invalidation.stats['missed'], missed + 1)
+        self.assertEqual(self.listener.seen[TOPIC], 3)
+
+        self.commit(4)
+        self.deliver(4, ['d'])
+        self.poll()
+        self.poll()
+        self.assertEqual(self.received, [['a'], ['c'], None, ['d']])
+        self.assertEqual(self.listener.seen[TOPIC], 4)
+
+    def test_late_message_is_not_treated_as_lost(self) -> None:
+        self.commit(3)
+        self.deliver(1, ['a'])
+        self.deliver(3, ['c'])
+        self.poll()
+        self.deliver(2, ['b'])
+        self.poll()
+        self.assertEqual(self.received, [['a'], ['c'], ['b']])
+        self.assertEqual(self.listener.seen[TOPIC], 3)
+        self.assertEqual(self.listener.ahead[TOPIC], set())
+
+    def test_resync_keeps_messages_newer_than_database_version(self) -> None:
+        self.commit(2)
+        self.poll()
+        self.deliver(4, ['d'])
+        self.poll()
+        self.assertEqual(self.received, [['d'], None])
+        self.assertEqual(self.listener.seen[TOPIC], 2)
+        self.assertEqual(self.listener.ahead[TOPIC], {4})
+        self.deliver(3, ['c'])
+        self.assertEqual(self.listener.seen[TOPIC], 4)
+
+    def test_new_listener_starts_from_database_version(self) -> None:
+        self.commit(5)
+        listener = invalidation.Listener(self.backend, 60)
+        self.listener = listener
+        self.poll()
+        self.poll()
+        self.assertEqual(listener.seen[TOPIC], 5)
+        self.assertEqual(self.received, [])
@@ -0,0 +1,199 @@
+import threading
+import time
+from types import SimpleNamespace
+from unittest import mock
+
+from django.test import SimpleTestCase
+from psycopg2 import extensions
+
+from core.db.backends.postgresql_pool import base
+from core.db.backends.postgresql_pool.pool import ConnectionPool, PoolTimeout
+
+
+class FakeCursor:
+    def __init__(self, connection: 'FakeConnection') -> None:
+        self.connection = connection
+
+    def __enter__(self) -> 'FakeCursor':
+        return self
+
+    def __exit__(self, *args: any) -> None:
+        pass
+
+    def execute(self, sql: str) -> None:
+        if self.connection.broken:
+            raise extensions.QueryCanceledError('server closed the connection')
+
+
+class FakeConnection:
+    """Соединение psycopg2 с состоянием транзакции, достаточным пулу."""
+
+    def __init__(self) -> None:
+        self.closed = 0
+        self.isolation_level = extensions.ISOLATION_LEVEL_READ_COMMITTED
+        self.broken = False
+        self.rollbacks = 0
+        self.info = SimpleNamespace(
+            transaction_status=extensions.TRANSACTION_STATUS_IDLE,
+        )
+
+    def cursor(self) -> FakeCursor:
+        return FakeCursor(self)
+
+    def begin(self) -> None:
+        self.info.transaction_status = extensions.TRANSACTION_STATUS_INTRANS
+
+    def rollback(self) -> None:
+        self.rollbacks += 1
+        self.info.transaction_status = extensions.TRANSACTION_STATUS_IDLE
+
+    def close(self) -> None:
+        self.closed = 1
+
+
+class ConnectionPoolTests(SimpleTestCase):
+    def make_pool(self, maxconn: int, **options: any) -> ConnectionPool:
+        self.opened = []
+
+        def connect() -> FakeConnection:
+            connection = FakeConnection()
+            self.opened.append(connection)
+            return connection
+
+        return ConnectionPool(0, maxconn, connect, **options)
+
+    def test_concurrent_checkouts_wait_and_never_exceed_max_size(self) -> None:
+        pool = self.make_pool(4, timeout=10)
+        lock = threading.Lock()
+        state = {'in_use': 0, 'peak': 0}
+        dirty = []
+        errors = []
+
+        def worker() -> None:
+            try:
+                for _ in range(20):
+                    connection = pool.getconn()
+                    with lock:
+                        state['in_use'] += 1
+                        state['peak'] = max(state['peak'], state['in_use'])
+                    if connection.info.transaction_status != (
+                        extensions.TRANSACTION_STATUS_IDLE
+                    ):
+                        dirty.append(connection)
+                    connection.begin()
+                    time.sleep(0.001)
+                    with lock:
+                        state['in_use'] -= 1
+                    pool.putconn(connection)
+            except Exception as error:
+                errors.append(error)
+
+        threads = [threading.Thread(target=worker) for _ in range(16)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        self.assertLessEqual(state['peak'], 4)
+        self.assertLessEqual(len(self.opened), 4)
+        self.assertEqual(dirty, [])
+        stats = pool.get_stats()
+        self.assertEqual(stats['checkouts'], 16 * 20)
+        self.assertGreater(stats['waits'], 0)
+        self.assertEqual(stats['in_use'], 0)
+        self.assertEqual(
+            sum(connection.rollbacks for connection in self.opened), 16 * 20,
+        )
+
+    def test_checkout_times_out_when_pool_is_exhausted(self) -> None:
+        pool = self.make_pool(1, timeout=0.05)
+        held = pool.getconn()
+        with self.assertRaises(PoolTimeout):
+            pool.getconn()
+        pool.putconn(held)
+        self.assertIs(pool.getconn(), held)
+
+    def test_expired_connection_is_replaced(self) -> None:
+        pool = self.make_pool(1, max_lifetime=0.05)
+        first = pool.getconn()
+        pool.putconn(first)
+        time.sleep(0.06)
+        second = pool.getconn()
+        self.assertIsNot(second, first)
+        self.assertTrue(first.closed)
+
+    def test_closed_connection_is_replaced(self) -> None:
+        pool = self.make_pool(1)
+        first = pool.getconn()
+        pool.putconn(first)
+        first.close()
+        second = pool.getconn()
+        self.assertIsNot(second, first)
+
+    def test_broken_idle_connection_is_replaced(self) -> None:
+        pool = self.make_pool(1, check_interval=0)
+        first = pool.getconn()
+        pool.putconn(first)
+        first.broken = True
+        second = pool.getconn()
+        self.assertIsNot(second, first)
+        self.assertTrue(first.closed)
+        self.assertEqual(pool.get_stats()['health_check_failures'], 1)
+
+    def test_connection_in_unknown_state_is_closed_on_return(self) -> None:
+        pool = self.make_pool(1)
+        first = pool.getconn()
+        first.info.transaction_status = extensions.TRANSACTION_STATUS_UNKNOWN
+        pool.putconn(first)
+        self.assertTrue(first.closed)
+        self.assertIsNot(pool.getconn(), first)
+
+
+class DatabaseWrapperTests(SimpleTestCase):
+    alias = 'pool-test'
+
+    def setUp(self) -> None:
+        self.opened = []
+
+        def connect(**params: any) -> FakeConnection:
+            connection = FakeConnection()
+            self.opened.append(connection)
+            return connection
+
+        for patcher in (
+            mock.patch.object(base.base.Database, 'connect', connect),
+            mock.patch('psycopg2.extras.register_default_jsonb'),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.addCleanup(base.close_pool, self.alias)
+        self.wrapper = base.DatabaseWrapper(
+            {'NAME': 'foodgram', 'OPTIONS': {}}, alias=self.alias,
+        )
+
+    def test_pool_is_rebuilt_when_connection_params_change(self) -> None:
+        pool = self.wrapper.get_pool({'database': 'foodgram'})
+        pool.putconn(pool.getconn())
+        self.assertIs(self.wrapper.get_pool({'database': 'foodgram'}), pool)
+        test_pool = self.wrapper.get_pool({'database': 'test_foodgram'})
+        self.assertIsNot(test_pool, pool)
+        self.assertTrue(pool.closed)
+        self.assertTrue(self.opened[0].closed)
+
+    def test_close_pool_closes_idle_connections(self) -> None:
+        pool = self.wrapper.get_pool({'database': 'foodgram'})
+        pool.putconn(pool.getconn())
+        base.close_pool(self.alias)
+        self.assertTrue(self.opened[0].closed)
+        self.assertIsNot(
+            self.wrapper.get_pool({'database': 'foodgram'}), pool,
+        )
+
+    def test_unregistered_connection_bypasses_pool(self) -> None:
+        """Соединения _nodb_cursor не берутся из пула и закрываются."""
+        connection = self.wrapper.get_new_connection({'database': 'postgres'})
+        self.assertIsNone(self.wrapper.connection_pool)
+        self.wrapper.connection = connection
+        self.wrapper._close()
+        self.assertTrue(connection.closed)
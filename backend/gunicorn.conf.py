@@ -0,0 +1,24 @@
+import os
+
+bind = os.getenv('GUNICORN_BIND', '0.0.0.0:8000')
+workers = int(os.getenv('GUNICORN_WORKERS', 1))
+
+if os.getenv('SERVER_MODE', 'wsgi') == 'asgi':
+    wsgi_app = 'backend.asgi:application'
+    worker_class = 'uvicorn.workers.UvicornWorker'
+else:
+    wsgi_app = 'backend.wsgi:application'
+    threads = int(os.getenv('GUNICORN_THREADS', 1))
+
+os.environ['INVALIDATION_START'] = 'post_fork'
+
+
+def post_fork(server: any, worker: any) -> None:
+    """Запускает слушателя шины сброса кэшей в каждом воркере."""
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
+    import django
+
+    django.setup()
+    from core import invalidation
+
+    invalidation.start()
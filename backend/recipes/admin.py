@@ -1,7 +1,11 @@
 from typing import Tuple
 
 from django.contrib import admin
+from django.db.models import Count, IntegerField, OuterRef, QuerySet, Subquery
+from django.db.models.functions import Coalesce
+from django.http import HttpRequest
 
+from core.paginators import EstimatedCountPaginator
 from recipes.models import (
     Favorite,
     Ingredient,
@@ -14,6 +18,8 @@ from recipes.models import (
 
 class RecipeIngredientInline(admin.TabularInline):
     model = RecipeIngredient
+    autocomplete_fields: Tuple[str] = ('ingredient',)
+    extra = 1
 
 
 @admin.register(Tag)
@@ -35,36 +41,71 @@ class RecipeAdmin(admin.ModelAdmin):
         'added_to_favorites',
     )
     readonly_fields = ('added_to_favorites',)
-    list_filter: Tuple[str] = ('name', 'author', 'tags')
-    search_fields: Tuple[str] = ('name', 'author__username', 'tags__name')
+    list_filter: Tuple[str] = ('tags',)
+    list_select_related: Tuple[str] = ('author',)
+    search_fields: Tuple[str] = ('^name', '^author__username')
+    autocomplete_fields: Tuple[str] = ('author',)
     inlines: Tuple[RecipeIngredientInline] = (RecipeIngredientInline,)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
     empty_value_display = '-пусто-'
 
+    def get_queryset(self, request: HttpRequest) -> QuerySet:
+        """Добавляет число добавлений в избранное коррелированным
+        подзапросом, который вычисляется только для строк страницы.
+        """
+        favorites = (
+            Favorite.objects.filter(recipe=OuterRef('pk'))
+            .order_by()
+            .values('recipe')
+            .annotate(count=Count('id'))
+            .values('count')
+        )
+        return (
+            super()
+            .get_queryset(request)
+            .annotate(
+                favorites_count=Coalesce(
+                    Subquery(favorites, output_field=IntegerField()), 0,
+                ),
+            )
+        )
+
     def added_to_favorites(self, obj: Recipe) -> int:
-        return obj.favorites.count()
+        return obj.favorites_count
 
     added_to_favorites.short_description = 'Добавлено в избранное'
+    added_to_favorites.admin_order_field = 'favorites_count'
 
 
 @admin.register(Ingredient)
 class IngredientAdmin(admin.ModelAdmin):
     list_display: Tuple[str] = ('id', 'name', 'measurement_unit')
-    list_filter: Tuple[str] = ('name',)
-    search_fields: Tuple[str] = ('name',)
+    search_fields: Tuple[str] = ('^name',)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
     empty_value_display = '-пусто-'
 
 
 @admin.register(Favorite)
 class FavoriteAdmin(admin.ModelAdmin):
-    list_display: Tuple[str] = ('id', 'user', 'recipe')
-    list_filter: Tuple[str] = ('user', 'recipe')
-    search_fields: Tuple[str] = ('user__username', 'recipe__name')
+    list_display: Tuple[str] = ('id', 'user', 'recipe', 'created')
+    list_filter: Tuple[str] = ('created',)
+    list_select_related: Tuple[str] = ('user', 'recipe')
+    search_fields: Tuple[str] = ('^user__username', '^recipe__name')
+    autocomplete_fields: Tuple[str] = ('user', 'recipe')
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
     empty_value_display = '-пусто-'
 
 
 @admin.register(ShoppingCart)
-class ShoppingCart(admin.ModelAdmin):
-    list_display: Tuple[str] = ('id', 'user', 'recipe')
-    list_filter: Tuple[str] = ('user', 'recipe')
-    search_fields: Tuple[str] = ('user__username', 'recipe__name')
+class ShoppingCartAdmin(admin.ModelAdmin):
+    list_display: Tuple[str] = ('id', 'user', 'recipe', 'created')
+    list_filter: Tuple[str] = ('created',)
+    list_select_related: Tuple[str] = ('user', 'recipe')
+    search_fields: Tuple[str] = ('^user__username', '^recipe__name')
+    autocomplete_fields: Tuple[str] = ('user', 'recipe')
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
     empty_value_display = '-пусто-'
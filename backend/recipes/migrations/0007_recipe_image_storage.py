@@ -0,0 +1,19 @@
+# Generated by Django 3.2 on 2026-10-19 08:54
+
+import core.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0006_feedentry'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='recipe',
+            name='image',
+            field=models.ImageField(db_index=True, storage=core.storage.ContentAddressedStorage(), upload_to='recipes_images/', verbose_name='Изображение рецепта'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+from django.db import migrations
+from django.db.models.functions import Exp, Ln
+
+
+def to_log(apps: any, schema_editor: any) -> None:
+    TrendingScore = apps.get_model('recipes', 'TrendingScore')
+    TrendingScore.objects.filter(score__gt=0).update(score=Ln('score'))
+
+
+def from_log(apps: any, schema_editor: any) -> None:
+    TrendingScore = apps.get_model('recipes', 'TrendingScore')
+    TrendingScore.objects.update(score=Exp('score'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0008_ingredient_name_trigram'),
+    ]
+
+    operations = [
+        migrations.RunPython(to_log, from_log),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 3.2 on 2026-10-19 09:32
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def mark_heavy_authors(apps: any, schema_editor: any) -> None:
+    """Рецепты авторов, которые сейчас подмешиваются при чтении ленты,
+    могли не рассылаться подписчикам: помечаем их неразосланными.
+    """
+    Recipe = apps.get_model('recipes', 'Recipe')
+    Subscription = apps.get_model('users', 'Subscription')
+    heavy = (
+        Subscription.objects.order_by()
+        .values('author_id')
+        .annotate(followers=Count('id'))
+        .filter(followers__gt=settings.FEED['FANOUT_LIMIT'] // 2)
+        .values('author_id')
+    )
+    Recipe.objects.filter(author_id__in=heavy).update(fanned_out=False)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0009_trending_log_scores'),
+        ('users', '0002_user_state_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='fanned_out',
+            field=models.BooleanField(default=True, editable=False, verbose_name='Разослан в ленты подписчиков'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(condition=models.Q(fanned_out=False), fields=['author', '-id'], name='recipe_not_fanned_out'),
+        ),
+        migrations.RunPython(mark_heavy_authors, migrations.RunPython.noop),
+    ]
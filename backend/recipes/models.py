@@ -4,6 +4,8 @@ from django.contrib.auth import get_user_model
 from django.core.validators import MaxValueValidator, MinValueValidator
 from django.db import models
 
+from core.storage import ContentAddressedStorage
+
 User = get_user_model()
 
 TEXT_SYMBOLS: int = 20
@@ -85,7 +87,9 @@ class Recipe(models.Model):
     image = models.ImageField(
         'Изображение рецепта',
         upload_to='recipes_images/',
+        storage=ContentAddressedStorage(),
         blank=False,
+        db_index=True,
     )
     text = models.TextField(
         verbose_name='Описание рецепта',
@@ -116,11 +120,23 @@ class Recipe(models.Model):
             ),
         ],
     )
+    fanned_out = models.BooleanField(
+        'Разослан в ленты подписчиков',
+        default=True,
+        editable=False,
+    )
 
     class Meta:
         ordering: List[str] = ['-id']
         verbose_name: str = 'рецепт'
         verbose_name_plural: str = 'рецепты'
+        indexes = [
+            models.Index(
+                fields=['author', '-id'],
+                condition=models.Q(fanned_out=False),
+                name='recipe_not_fanned_out',
+            ),
+        ]
 
     def favorite_count(self) -> int:
         return self.favorites.count()
@@ -185,6 +201,11 @@ class CommonAbstact(models.Model):
         on_delete=models.CASCADE,
         verbose_name='рецепт',
     )
+    created = models.DateTimeField(
+        'Дата добавления',
+        auto_now_add=True,
+        db_index=True,
+    )
 
     class Meta:
         abstract = True
@@ -226,3 +247,98 @@ class ShoppingCart(CommonAbstact):
             ),
         ]
         default_related_name = 'carts'
+
+
+class RecipeDocument(models.Model):
+    """Модель предварительно построенного JSON представления рецепта.
+    Хранит представление без полей, зависящих от пользователя, в том же
+    виде и порядке ключей, что и RecipeGetSerializer.
+    """
+
+    recipe = models.OneToOneField(
+        Recipe,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='document',
+        verbose_name='Рецепт',
+    )
+    data = models.TextField('Представление рецепта в JSON')
+    updated = models.DateTimeField('Дата обновления', auto_now=True)
+
+    class Meta:
+        verbose_name: str = 'документ рецепта'
+        verbose_name_plural: str = 'документы рецептов'
+
+    def __str__(self) -> str:
+        return f'Документ рецепта {self.recipe_id}'
+
+
+class TrendingScore(models.Model):
+    """Модель рейтинга популярности рецептов.
+    Хранит натуральный логарифм суммы весов добавлений рецепта в
+    избранное и список покупок, каждое из которых взвешено
+    exp(ln 2 * (t - TRENDING['EPOCH']) / HALF_LIFE), поэтому порядок по
+    score совпадает с порядком по экспоненциально затухающей популярности
+    на любой момент времени, а сам score не переполняется.
+    """
+
+    recipe = models.OneToOneField(
+        Recipe,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='trending',
+        verbose_name='Рецепт',
+    )
+    score = models.FloatField('Рейтинг популярности', db_index=True)
+
+    class Meta:
+        verbose_name: str = 'рейтинг популярности'
+        verbose_name_plural: str = 'рейтинги популярности'
+
+    def __str__(self) -> str:
+        return f'Рейтинг рецепта {self.recipe_id}'
+
+
+class FeedEntry(models.Model):
+    """Модель ленты подписок: запись о рецепте автора во входящих
+    подписчика. Записи создаются при публикации рецепта и при подписке,
+    а удаляются при отписке.
+    """
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='feed_entries',
+        verbose_name='подписчик',
+    )
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='feed_entries',
+        verbose_name='рецепт',
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='автор',
+    )
+
+    class Meta:
+        verbose_name: str = 'запись ленты'
+        verbose_name_plural: str = 'записи ленты'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'recipe'],
+                name='unique_feed_entry',
+            ),
+        ]
+        indexes = [
+            models.Index(
+                fields=['user', 'author'],
+                name='feed_entry_user_author',
+            ),
+        ]
+
+    def __str__(self) -> str:
+        return f'{self.recipe_id} в ленте {self.user_id}'
@@ -3,6 +3,7 @@ from typing import Tuple
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
 
+from core.paginators import EstimatedCountPaginator
 from users.models import Subscription, User
 
 
@@ -21,16 +22,18 @@ class CustomUserAdmin(BaseUserAdmin):
         'first_name',
         'last_name',
     )
-    list_filter: Tuple[str] = (
-        'username',
-        'email',
-    )
+    list_filter: Tuple[str] = ('is_staff', 'is_active')
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
     empty_value_display = '-пусто-'
 
 
 @admin.register(Subscription)
 class SubscriptionAdmin(admin.ModelAdmin):
     list_display: Tuple[str] = ('user', 'author')
-    list_filter: Tuple[str] = ('user', 'author')
-    search_fields: Tuple[str] = ('user__username', 'author__username')
+    list_select_related: Tuple[str] = ('user', 'author')
+    search_fields: Tuple[str] = ('^user__username', '^author__username')
+    autocomplete_fields: Tuple[str] = ('user', 'author')
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
     empty_value_display: str = '-пусто-'
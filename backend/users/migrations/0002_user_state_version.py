@@ -0,0 +1,18 @@
+# Generated by Django 3.2 on 2026-10-19 09:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='state_version',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='версия избранного, списка покупок и подписок'),
+        ),
+    ]
@@ -27,6 +27,11 @@ class User(AbstractUser):
         null=False,
     )
     username = models.CharField(max_length=150, unique=True)
+    state_version = models.PositiveIntegerField(
+        'версия избранного, списка покупок и подписок',
+        default=0,
+        editable=False,
+    )
 
     REQUIRED_FIELDS = ['first_name', 'last_name', 'username']
 